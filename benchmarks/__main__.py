@@ -0,0 +1,50 @@
+# coding=utf-8
+# Copyright 2024 Vital Star Foundation. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import argparse
+import sys
+
+from benchmarks.harness import Benchmark, runBenchmarks, saveResults, loadResults, compareResults
+import benchmarks.bench_smallscript
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='SmallScript micro-benchmarks.')
+    parser.add_argument('patterns', nargs='*', help="glob patterns of benchmark names e.g. 'run.*'")
+    parser.add_argument('--list', action='store_true', help='list the benchmarks and exit')
+    parser.add_argument('--repeat', type=int, default=5, help='timed repeats per benchmark (default 5)')
+    parser.add_argument('--min-time', type=float, default=0.1, help='minimum seconds per repeat (default 0.1)')
+    parser.add_argument('--output', '-o', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', '-b', help='compare against the JSON results in this file')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='relative slowdown reported as regression (default 0.10)')
+    args = parser.parse_args(argv)
+
+    selected = Benchmark.select(args.patterns)
+    if args.list:
+        for bm in selected: print(f"{bm.name:<32} {bm.group}")
+        return 0
+    report = runBenchmarks(selected, args.repeat, args.min_time)
+    if args.output: saveResults(report, args.output)
+    if args.baseline:
+        print(f"\nCompared with {args.baseline}:")
+        regressions = compareResults(report, loadResults(args.baseline), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
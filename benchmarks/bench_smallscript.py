@@ -0,0 +1,247 @@
+# coding=utf-8
+# Copyright 2024 Vital Star Foundation. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import tempfile
+
+from smallscript.SObject import *
+from smallscript.Closure import Script, Closure
+from benchmarks.harness import Benchmark
+
+script = "| tmp | tmp := num + 1 * 2; scope getValue: #num | asString | len; [:e | tmp + e] value: 3"
+
+def newScope():
+    scope = sscontext.createScope()
+    scope['num'] = Number(7)
+    return scope
+
+#### Parse and interpret
+@Benchmark.register('parse', 'front')
+def benchParse():
+    return lambda: Script().parse(script)
+
+@Benchmark.register('interpret', 'front')
+def benchInterpret():
+    cache = sscontext.scriptCache()
+    def interpret():
+        cache.clear()
+        Closure().interpret(script)
+    return interpret
+
+@Benchmark.register('interpret.cached', 'front')
+def benchInterpretCached():
+    return lambda: Closure().interpret(script)
+
+#### Interpreted execution by message type
+def _runBench(ss):
+    closure = Closure().interpret(ss)
+    scope = newScope()
+    return lambda: closure(scope)
+
+@Benchmark.register('run.unary', 'interpreter')
+def benchRunUnary(): return _runBench("num asString len")
+
+@Benchmark.register('run.binary', 'interpreter')
+def benchRunBinary(): return _runBench("num + 2 - 3 * 4")
+
+@Benchmark.register('run.keyword', 'interpreter')
+def benchRunKeyword(): return _runBench("scope getValue: #num")
+
+@Benchmark.register('run.chain', 'interpreter')
+def benchRunChain(): return _runBench("num + 1 | * 2 | asString | len")
+
+@Benchmark.register('run.block', 'interpreter')
+def benchRunBlock(): return _runBench("[:e | num + e] value: 3")
+
+@Benchmark.register('block.value', 'interpreter')
+def benchBlockValue():
+    # A block called from Python e.g. as a sort key reuses its activation scope.
+    block = Closure().interpret("[:e | e * 2 + 1]")()
+    return lambda: block.value(3)
+
+@Benchmark.register('run.script', 'interpreter')
+def benchRunScript(): return _runBench(script)
+
+#### Bytecode VM execution
+def _vmBench(ss):
+    closure = Closure().assemble(ss)
+    scope = newScope()
+    return lambda: closure(scope)
+
+@Benchmark.register('vm.binary', 'vm')
+def benchVmBinary(): return _vmBench("num + 2 - 3 * 4")
+
+@Benchmark.register('vm.keyword', 'vm')
+def benchVmKeyword(): return _vmBench("scope getValue: #num")
+
+@Benchmark.register('vm.script', 'vm')
+def benchVmScript(): return _vmBench(script)
+
+@Benchmark.register('vm.assemble', 'vm')
+def benchVmAssemble():
+    cache = sscontext.scriptCache()
+    def assemble():
+        cache.clear()
+        Closure().assemble(script)
+    return assemble
+
+#### Tiered execution, compiled once hot
+@Benchmark.register('tiered.binary', 'tiered')
+def benchTieredBinary():
+    closure = sscontext.tiered("num + 2 - 3", 10)
+    scope = newScope()
+    return lambda: closure(scope)
+
+#### Compiled execution
+@Benchmark.register('pyfunc.binary', 'compiler')
+def benchPyfuncBinary():
+    closure = Closure().compile("num + 2 - 3 * 4")
+    scope = newScope()
+    return lambda: closure(scope)
+
+@Benchmark.register('pyfunc.script', 'compiler')
+def benchPyfuncScript():
+    closure = Closure().compile(script)
+    scope = newScope()
+    return lambda: closure(scope)
+
+def _pyfuncParams(optimize):
+    closure = Closure().optimize(optimize).compile(":a :b | | t | t := a + b; t * a - b + #(1 2 3) len")
+    scope = newScope()
+    return lambda: closure(scope, 3, 4)
+
+@Benchmark.register('pyfunc.params', 'compiler')
+def benchPyfuncParams(): return _pyfuncParams(false_)
+
+@Benchmark.register('pyfunc.params.optimized', 'compiler')
+def benchPyfuncParamsOptimized(): return _pyfuncParams(true_)
+
+#### Numbers
+@Benchmark.register('number.sum', 'number')
+def benchNumberSum():
+    column = [Integer(i) for i in range(100)]
+    def total():
+        res = Integer(0)
+        for value in column: res = res + value
+        return res
+    return total
+
+@Benchmark.register('number.mixed', 'number')
+def benchNumberMixed(): return _runBench("num + 1.5 * 2 - 3 / 4")
+
+def _vectorBench(ss):
+    import numpy
+    closure = Closure().interpret(ss)
+    scope = newScope()
+    scope['col'] = numpy.arange(10**6)
+    return lambda: closure(scope)
+
+@Benchmark.register('vector.binary', 'number')
+def benchVectorBinary(): return _vectorBench("col * 2 + 1")
+
+@Benchmark.register('vector.collect.inject', 'number')
+def benchVectorCollectInject():
+    return _vectorBench("col collect: [:e | e * 2 + 1] | inject: 0 into: [:a :e | a + e]")
+
+#### Collections
+def _collectionBench(ss):
+    closure = Closure().interpret(ss)
+    scope = newScope()
+    scope['items'] = List(range(1000))
+    return lambda: closure(scope)
+
+@Benchmark.register('list.pipeline', 'collection')
+def benchListPipeline():
+    return _collectionBench("items collect: [:e | e * 2] | select: [:e | e>=1000] | inject: 0 into: [:a :e | a + e]")
+
+@Benchmark.register('list.pipeline.lazy', 'collection')
+def benchListPipelineLazy():
+    return _collectionBench("items lazyCollect: [:e | e * 2] | lazySelect: [:e | e>=1000] | inject: 0 into: [:a :e | a + e]")
+
+#### SObject and Scope protocols
+@Benchmark.register('holder.descriptor', 'sobject')
+def benchHolderDescriptor():
+    closure = Closure()
+    return lambda: closure.params()
+
+@Benchmark.register('holder.getattr', 'sobject')
+def benchHolderGetattr():
+    # Attribute added to a metaclass is resolved by SObject.__getattr__().
+    context = Context().name('benchHolderGetattr')
+    context.loadPackage('smallscript')
+    meta = context.getOrNewPackage('benchpkg').createMetaclass('BenchObj')
+    meta.parentNames(['SObject'])
+    meta.addAttr('attr1', 'String')
+    obj = context.newInstance('BenchObj')
+    obj.attr1('value')
+    return lambda: obj.attr1()
+
+def _lookupBench(depth):
+    scope = newScope()
+    for _ in range(depth):
+        scope = scope.createScope()
+    return lambda: scope.lookup('num')
+
+@Benchmark.register('scope.lookup.1', 'scope')
+def benchLookup1(): return _lookupBench(1)
+
+@Benchmark.register('scope.lookup.8', 'scope')
+def benchLookup8(): return _lookupBench(8)
+
+@Benchmark.register('scope.lookup.32', 'scope')
+def benchLookup32(): return _lookupBench(32)
+
+@Benchmark.register('scope.run.16', 'scope')
+def benchScopeRun16():
+    # Variables found 16 parents up keep their resolution per reference.
+    scope = newScope()
+    for _ in range(16):
+        scope = scope.createScope()
+    closure = Closure().interpret("num + 1 + num")
+    return lambda: closure(scope)
+
+@Benchmark.register('context.createScope', 'scope')
+def benchCreateScope():
+    return lambda: sscontext.createScope()
+
+#### Package
+@Benchmark.register('package.load', 'package')
+def benchPackageLoad():
+    # Run from the repository root so not_a_pkg/testpkg is found through sys.path.
+    context = Context().name('benchPackageLoad')
+    context.loadPackage('smallscript')
+    pkg = context.getOrNewPackage('testpkg')
+    pkg.findPath('not_a_pkg/testpkg')
+    return lambda: pkg.load()
+
+@Benchmark.register('package.restore', 'package')
+def benchPackageRestore():
+    # Restoring smallscript from a snapshot, compare with context.load below. Snapshot a context of its own, not
+    # sscontext, so results do not depend on the benchmarks run before.
+    path = f"{tempfile.mkdtemp()}/context.snapshot"
+    context = Context().name('benchPackageRestore')
+    context.loadPackage('smallscript')
+    context.snapshot(path)
+    return lambda: Context().name('benchPackageRestore').restore(path)
+
+@Benchmark.register('context.load', 'package')
+def benchContextLoad():
+    return lambda: Context().name('benchContextLoad').loadPackage('smallscript')
+
+@Benchmark.register('package.index', 'package')
+def benchPackageIndex():
+    # Lazy loading only parses the sources for metanames, nothing is imported.
+    pkg = Package().name('smallscript').context(sscontext)
+    return lambda: pkg.indexSObjects()
@@ -0,0 +1,122 @@
+# coding=utf-8
+# Copyright 2024 Vital Star Foundation. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import fnmatch
+import json
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+class Benchmark:
+    """
+    A named benchmark. @setup prepares the state outside the timing and returns the zero-arg callable to be timed.
+    """
+    registry = {}
+
+    def __init__(self, name, setup, group=''):
+        self.name = name
+        self.setup = setup
+        self.group = group
+
+    @classmethod
+    def register(cls, name, group=''):
+        "Decorator registering a setup function as benchmark @name."
+        def decorator(setup):
+            cls.registry[name] = cls(name, setup, group)
+            return setup
+        return decorator
+
+    @classmethod
+    def select(cls, patterns=()):
+        "Benchmarks matching any of the glob @patterns, all if no pattern is given."
+        benchmarks = list(cls.registry.values())
+        if not patterns: return benchmarks
+        return [bm for bm in benchmarks if any(fnmatch.fnmatch(bm.name, p) for p in patterns)]
+
+    def calibrate(self, func, minTime):
+        "Number of calls per repeat so that one repeat takes at least @minTime seconds."
+        number = 1
+        while True:
+            elapsed = self.timeit(func, number)
+            if elapsed >= minTime or number >= 1_000_000: return number
+            number = number * 10 if elapsed < minTime / 10 else number * 2
+
+    def timeit(self, func, number):
+        start = time.perf_counter()
+        for _ in range(number): func()
+        return time.perf_counter() - start
+
+    def run(self, repeat=5, minTime=0.1):
+        "Return the timing per call in microseconds."
+        func = self.setup()
+        func()                                  # warm up caches before calibration
+        number = self.calibrate(func, minTime)
+        timings = [self.timeit(func, number) / number * 1e6 for _ in range(repeat)]
+        return dict(group=self.group, unit='us', number=number, repeat=repeat,
+                    min=min(timings), median=statistics.median(timings),
+                    mean=statistics.mean(timings),
+                    stdev=statistics.stdev(timings) if repeat > 1 else 0.0)
+
+def metadata():
+    from smallscript import __version__
+    return dict(smallscript=__version__,
+                python=platform.python_version(),
+                implementation=platform.python_implementation(),
+                platform=platform.platform(),
+                machine=platform.machine(),
+                timestamp=datetime.now(timezone.utc).isoformat(timespec='seconds'))
+
+def runBenchmarks(benchmarks, repeat=5, minTime=0.1, out=sys.stdout):
+    results = {}
+    for bm in benchmarks:
+        res = results[bm.name] = bm.run(repeat, minTime)
+        if out is not None:
+            print(f"{bm.name:<32} {res['median']:>12.3f} us  (min {res['min']:.3f}, "
+                  f"stdev {res['stdev']:.3f}, {res['number']}x{res['repeat']})", file=out)
+    return dict(metadata=metadata(), results=results)
+
+def loadResults(path):
+    with open(path) as f:
+        return json.load(f)
+
+def saveResults(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+def compareResults(report, baseline, threshold=0.10, out=sys.stdout):
+    """
+    Compare the medians of @report against @baseline. Return the names of benchmarks that are slower
+    than the baseline by more than @threshold e.g. 0.10 for 10%.
+    """
+    regressions = []
+    current = report['results']; previous = baseline['results']
+    for name, res in current.items():
+        if name not in previous:
+            if out is not None: print(f"{name:<32} {'new':>12}", file=out)
+            continue
+        ratio = res['median'] / previous[name]['median']
+        mark = ''
+        if ratio > 1 + threshold:
+            regressions.append(name); mark = 'REGRESSION'
+        elif ratio < 1 - threshold:
+            mark = 'improved'
+        if out is not None:
+            print(f"{name:<32} {previous[name]['median']:>12.3f} -> {res['median']:>12.3f} us  "
+                  f"x{ratio:.2f} {mark}", file=out)
+    return regressions
@@ -8,6 +8,9 @@ setup(
         'antlr4-python3-runtime',
         'graphviz'
     ],
+    extras_require={
+        'numpy': ['numpy'],     # Vector
+    },
     author='Man Chan',
     author_email='man.chan@gmail.com',
     description='smallscript',
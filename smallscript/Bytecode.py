@@ -0,0 +1,233 @@
+# coding=utf-8
+# Copyright 2024 Vital Star Foundation. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from array import array
+
+from smallscript.SObject import *
+from smallscript.Step import Step, BlockStep, RefStep, VarStep, AssignStep, ArrayStep, \
+                             UnaryHeadStep, BinHeadStep, KwHeadStep, ChainStep, _missing
+
+class Unassemblable(Exception):
+    "The closure IR has steps without bytecode e.g. primitives, the closure keeps running its steps."
+
+class Bytecode(SObject):
+    """
+    Stack bytecode of a closure, assembled from its ClosureStep IR. Code is an array('H') of (opcode, argument)
+    pairs, arguments index into constants or send sites. Messages are sent in Smalltalk order i.e. each argument
+    is evaluated right before its send.
+    """
+    PUSH, LOAD, STORE, UNARY, BINARY, KEYWORD, BLOCK, LIST, POP, RETURN = range(10)
+    opnames = ('push', 'load', 'store', 'unary', 'binary', 'keyword', 'block', 'list', 'pop', 'return')
+    maxArg = 0xFFFF     # arguments are packed in array('H')
+
+    def code(self): return self._getOrSet('code', '', nil)
+    def constants(self): return self._getOrSet('constants', '', nil)
+    def sites(self): return self._getOrSet('sites', '', nil)
+
+    def assemble(self, closureStep):
+        "Assemble @closureStep into code, raise Unassemblable if a step has no bytecode."
+        self._set('ss_code', array('H'))._set('ss_constants', [])._set('ss_sites', [])
+        exprs = closureStep.getStep('exprs')
+        if exprs.isNil(): raise Unassemblable('closure has no expression')
+        exprList = closureStep.flatten(exprs)
+        for index, expr in enumerate(exprList):
+            if index > 0: self.emit(self.POP)
+            self.emitStep(expr)
+        self.emit(self.RETURN)
+        self._set('ss_sites', [tuple(site) for site in self.sites()])   # end pcs are patched by now
+        return self
+
+    def emit(self, opcode, arg=0):
+        if arg > self.maxArg: raise Unassemblable(f"{self.opnames[opcode]} argument {arg} exceeds {self.maxArg}")
+        code = self.code()
+        code.append(opcode)
+        code.append(arg)
+        return self
+
+    def addConstant(self, value):
+        constants = self.constants()
+        constants.append(value)
+        return len(constants) - 1
+
+    def addSite(self, site):
+        sites = self.sites()
+        sites.append(site)
+        return len(sites) - 1
+
+    def emitStep(self, step):
+        if step.isConstant():
+            return self.emit(self.PUSH, self.addConstant(step.runtimeRes()))
+        if isinstance(step, VarStep):
+            return self.emit(self.LOAD, self.addSite(self._names(step.getStep('ref'))))
+        if isinstance(step, AssignStep):
+            self.emitStep(step.getStep('expr'))
+            return self.emit(self.STORE, self.addSite(self._names(step.getStep('ref'))))
+        if isinstance(step, BlockStep):
+            closure = step.compileRes().closure()
+            closure.assemble()
+            return self.emit(self.BLOCK, self.addConstant(closure))
+        if isinstance(step, ArrayStep) and step.getStep('litarrcnt').isNil():
+            return self._emitArray(step.getStep('operand'))
+        if isinstance(step, UnaryHeadStep):
+            self.emitStep(step.getStep('operand'))
+            return self._emitUnary(step.getStep('unarytail'))
+        if isinstance(step, BinHeadStep):
+            self.emitStep(step.getStep('unaryhead'))
+            return self._emitBinary(step, step.getStep('bintail'))
+        if isinstance(step, KwHeadStep):
+            self.emitStep(step.getStep('unaryhead'))
+            return self._emitKeyword(step, step.getStep('kwmsg'))
+        if isinstance(step, ChainStep):
+            return self._emitChain(step)
+        raise Unassemblable(f"no bytecode for {step.describe()}")
+
+    def _names(self, refStep):
+        if refStep.getStep('primitive').notNil(): raise Unassemblable('primitive reference')
+        varname = refStep.compileRes()
+        head = varname.split('.')[0]
+        return ((head, varname if '.' in varname else None, refStep.resolution()), refStep.name())
+
+    def _emitArray(self, steps):
+        if steps.isNil(): return self.emit(self.PUSH, self.addConstant(None))
+        if not isinstance(steps, List): steps = List().append(steps)
+        for step in steps:
+            if isinstance(step, Step): self.emitStep(step)
+            else: self._emitArray(step)
+        return self.emit(self.LIST, steps.len())
+
+    def _patchEnd(self, siteIndices):
+        "A failed send skips the rest of its message group, e.g. unarytail, and leaves nil."
+        end = len(self.code())
+        for index in siteIndices: self.sites()[index][-1] = end
+        return self
+
+    def _emitUnary(self, unarytail):
+        if unarytail.isNil(): return self
+        sends = UnaryHeadStep.linkTail(unarytail, nil)
+        siteIndices = []
+        for send, msg in sends:
+            siteIndices.append(self.addSite([msg, 0]))
+            self.emit(self.UNARY, siteIndices[-1])
+        return self._patchEnd(siteIndices)
+
+    def _emitBinary(self, step, bintail):
+        if bintail.isNil(): return self
+        siteIndices = []
+        for send, msg in step.linkTail(bintail, nil):
+            binop, argStep, cache, binStep = msg
+            self.emitStep(argStep)
+            siteIndices.append(self.addSite([(binop, -1, cache, binStep), 0]))
+            self.emit(self.BINARY, siteIndices[-1])
+        return self._patchEnd(siteIndices)
+
+    def _emitKeyword(self, step, kwmsg):
+        if kwmsg.isNil(): return self
+        kwpairs = kwmsg.children().head()
+        if not isinstance(kwpairs, List):
+            kwpairs = List().append(kwpairs)
+        kwSteps = Map()
+        for kwpair in kwpairs:
+            ptkey = kwpair.children()['ptkey'].compileRes()[:-1]
+            kwSteps[ptkey] = kwpair.children()['binhead']
+        for argStep in kwSteps.values(): self.emitStep(argStep)
+        prefix = kwSteps.keys().head()
+        fullname = prefix if kwSteps.len() == 1 else "".join([f"{key}__" for key in kwSteps.keys()])
+        nArgs = kwSteps.len()
+        argIndices = tuple(range(-nArgs, 0))
+        site = self.addSite([(prefix, fullname, argIndices, kwmsg, step), nArgs, 0])
+        return self.emit(self.KEYWORD, site)
+
+    def _emitChain(self, chain):
+        head = chain.getStep('kwhead')
+        if head.isNil(): head = chain.getStep('binhead')
+        self.emitStep(head)
+        msgs = chain.getStep('msg')
+        if not isinstance(msgs, List):
+            msgs = List().append(msgs)
+        for msg in msgs:
+            for tail in msg.children().values():
+                ruleName = tail.ruleName()
+                if ruleName == 'kwmsg':
+                    self._emitKeyword(KwHeadStep(), tail)
+                elif ruleName == 'bintail':
+                    self._emitBinary(BinHeadStep(), tail)
+                elif ruleName == 'unarytail':
+                    self._emitUnary(tail)
+        return self
+
+    def run(self, scope):
+        "Dispatch loop of the bytecode, return the result of the closure."
+        code = self._get('ss_code', None)
+        constants = self._get('ss_constants', None)
+        sites = self._get('ss_sites', None)
+        stack = []
+        push = stack.append
+        pc = 0
+        while True:
+            op = code[pc]
+            arg = code[pc + 1]
+            pc += 2
+            if op == 1:                         # LOAD
+                names, name = sites[arg]
+                push(RefStep.runLinked(scope, None, (), names).getValue(name))
+            elif op == 0 or op == 6:            # PUSH, BLOCK
+                push(constants[arg])
+            elif op == 4:                       # BINARY
+                msg, end = sites[arg]
+                res = BinHeadStep.send(scope, stack, stack[-2], msg)
+                del stack[-1]
+                if res is _missing:
+                    res = nil
+                    pc = end
+                stack[-1] = res
+            elif op == 3:                       # UNARY
+                msg, end = sites[arg]
+                res = UnaryHeadStep.send(scope, None, stack[-1], msg)
+                if res is _missing:
+                    res = nil
+                    pc = end
+                stack[-1] = res
+            elif op == 5:                       # KEYWORD
+                msg, nArgs, end = sites[arg]
+                res = KwHeadStep.send(scope, stack, stack[-nArgs - 1], msg)
+                del stack[-nArgs:]
+                stack[-1] = res
+            elif op == 2:                       # STORE
+                names, name = sites[arg]
+                refObj = RefStep.runLinked(scope, None, (), names)
+                refObj.setValue(name, stack[-1])
+            elif op == 8:                       # POP
+                stack.pop()
+            elif op == 7:                       # LIST
+                items = List(stack[len(stack) - arg:])
+                del stack[len(stack) - arg:]
+                push(items)
+            elif op == 9:                       # RETURN
+                return stack.pop()
+
+    def disassemble(self):
+        "Readable listing of the code e.g. for debugging."
+        listing = List()
+        code = self.code()
+        for pc in range(0, len(code), 2):
+            op, arg = code[pc], code[pc + 1]
+            opname = self.opnames[op]
+            if op in (self.PUSH, self.BLOCK): operand = self.constants()[arg]
+            elif op in (self.LOAD, self.STORE): operand = self.sites()[arg][1]
+            elif op in (self.UNARY, self.BINARY, self.KEYWORD): operand = self.sites()[arg][0][0]
+            elif op == self.LIST: operand = arg
+            else: operand = ''
+            listing.append(String(f"{pc // 2:4} {opname} {operand}".rstrip()))
+        return listing
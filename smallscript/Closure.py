@@ -14,17 +14,32 @@
 # limitations under the License.
 
 import re
+import hashlib
+import keyword
 import tempfile
+import marshal
+import importlib.util
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
 
 from antlr4 import InputStream, CommonTokenStream, ParseTreeWalker
 from antlr4.error.ErrorListener import ErrorListener
 
-from smallscript.antlr.SmallScriptLexer import SmallScriptLexer as Lexer
-from smallscript.antlr.SmallScriptParser import SmallScriptParser as Parser
-from smallscript.antlr.SmallScriptListener import SmallScriptListener as Listener
-from smallscript.Step import Step, StepVisitor, ClosureStep, TextBuffer
+from smallscript.SObject import profiling
+with profiling('module', 'smallscript.antlr'):
+    from smallscript.antlr.SmallScriptLexer import SmallScriptLexer as Lexer
+    from smallscript.antlr.SmallScriptParser import SmallScriptParser as Parser
+    from smallscript.antlr.SmallScriptListener import SmallScriptListener as Listener
+from smallscript.Step import Step, StepVisitor, ClosureStep, BlockStep, PrimitiveStep, RefStep, TextBuffer, Interpreter, \
+                             RuntimeStep, UnaryHeadStep, BinHeadStep, KwHeadStep, ChainStep, _missing
+from smallscript.Bytecode import Bytecode, Unassemblable
 from smallscript.SObject import *
 
+currentScope = contextvars.ContextVar('currentScope', default=nil)     # scope of the running closure, see Closure.run()
+
 class ScriptErrorListener(SObject, ErrorListener):
     errormsg = Holder().name('errormsg')
     def clear(self): return self.errormsg("")
@@ -141,6 +156,7 @@ class Script(SObject):
     parser = Holder().name('parser')
     errorHandler = Holder().name('errorHandler')
     smallscriptStep = Holder().name('smallscriptStep').type('SmallScriptStep')
+    transients = ('ss_parser',)     # ANTLR parser and its streams are not saved in snapshots
 
     def __init__(self): self.reset()
     def reset(self): return self.errorHandler(ScriptErrorListener())
@@ -222,6 +238,150 @@ class Script(SObject):
             text = f"smallscript: <no error>\n{self.text()}"
         return text
 
+class ScriptCache(SObject):
+    "Bounded LRU cache of interpreted smallscript keyed by its source hash. Closures from the same source share the IR."
+    maxSize = Holder().name('maxSize').type('Integer')
+
+    def __init__(self): self.maxSize(256)
+
+    def entries(self, entries=''):
+        entries = self._getOrSet('entries', entries, nil)
+        if entries is nil:
+            entries = OrderedDict()
+            self.setValue('entries', entries)
+        return entries
+
+    def stats(self, stats=''):
+        stats = self._getOrSet('stats', stats, nil)
+        if stats is nil:
+            stats = Map(hits=0, misses=0, evictions=0)
+            self.setValue('stats', stats)
+        return stats
+
+    def keyFor(self, closure, smallscript):
+        # nested closures are created from the initiating closure type e.g. DebugClosure.
+        return (type(closure), smallscript.sha256(64))
+
+    def lookup(self, key, smallscript):
+        entries = self.entries()
+        entry = entries.get(key, nil)
+        if entry is nil or entry['smallscript'] != smallscript:
+            self.stats()['misses'] += 1
+            return nil
+        entries.move_to_end(key)
+        self.stats()['hits'] += 1
+        return entry
+
+    def store(self, key, entry):
+        entries = self.entries()
+        entries[key] = entry
+        entries.move_to_end(key)
+        while len(entries) > self.maxSize():
+            entries.popitem(last=False)
+            self.stats()['evictions'] += 1
+        return self
+
+    def clear(self):
+        self.entries().clear()
+        return self
+
+    def info(self):
+        stats = self.stats()
+        return String(f"size={len(self.entries())}/{self.maxSize()} hits={stats['hits']} misses={stats['misses']} evictions={stats['evictions']}")
+
+class CodeCache(SObject):
+    """
+    Persistent cache of compiled closures like __pycache__, keyed by the hash of smallscript source, closure name,
+    type and optimize mode, FirstArg, smallscript version, code generator sources and Python magic number.
+    It is opt-in: set SS_CACHE_DIR, or enabled(true_) to use path() that defaults to ~/.cache/smallscript.
+    """
+    path = Holder().name('path').type('String')
+    enabled = Holder().name('enabled').type('False_')
+    codegenModules = ('smallscript.Closure', 'smallscript.Step')    # their sources generate the Python code
+    _codegenRevision = None
+
+    def __init__(self):
+        self.path(os.environ.get('SS_CACHE_DIR', str(Path.home() / '.cache' / 'smallscript')))
+        if os.environ.get('SS_CACHE_DIR'): self.enabled(true_)
+
+    def stats(self, stats=''):
+        stats = self._getOrSet('stats', stats, nil)
+        if stats is nil:
+            stats = Map(hits=0, misses=0, writes=0, errors=0)
+            self.setValue('stats', stats)
+        return stats
+
+    def header(self):
+        from smallscript import __version__
+        return f"smallscript {__version__} {importlib.util.MAGIC_NUMBER.hex()} {self.codegenRevision()}"
+
+    @classmethod
+    def codegenRevision(cls):
+        "Hash of the code generator sources, so a change under the same version doesn't serve stale code."
+        if cls._codegenRevision is None:
+            digest = hashlib.sha256()
+            for moduleName in cls.codegenModules:
+                origin = importlib.util.find_spec(moduleName).origin
+                digest.update(Path(origin).read_bytes() if origin and os.path.exists(origin) else moduleName.encode())
+            cls._codegenRevision = digest.hexdigest()[:16]
+        return cls._codegenRevision
+
+    def keyFor(self, closure, smallscript):
+        "Key of @closure compiled from @smallscript."
+        optimize = 'optimize' if closure.optimize() else ''
+        kind = f"{type(closure).__module__}.{type(closure).__qualname__}"
+        key = String(f"{self.header()}\0{closure.getContext().FirstArg()}\0{kind}\0{optimize}"
+                     f"\0{closure.name()}\0{smallscript}")
+        return key.sha256(32)
+
+    def filepath(self, key): return Path(self.path()) / f"{key}.ssc"
+
+    def load(self, key):
+        "Return the cached (code, name, params, tempvars, pysource), or nil if not found or corrupted."
+        if not self.enabled(): return nil
+        filepath = self.filepath(key)
+        try:
+            data = filepath.read_bytes()
+        except OSError:
+            self.stats()['misses'] += 1
+            return nil
+        try:
+            header, record = marshal.loads(data)
+            if header != self.header(): raise ValueError(f"unexpected header '{header}'")
+        except Exception as e:
+            self.log(f"Corrupted code cache '{filepath}' removed: {e}", Logger.LevelWarning)
+            self.stats()['errors'] += 1
+            filepath.unlink(missing_ok=True)
+            return nil
+        self.stats()['hits'] += 1
+        return record
+
+    def store(self, key, record):
+        "Atomically write the record, so a concurrent or interrupted write never leaves a partial file."
+        if not self.enabled(): return self
+        filepath = self.filepath(key)
+        tmpname = None
+        try:
+            filepath.parent.mkdir(parents=True, exist_ok=True)
+            data = marshal.dumps((self.header(), record))
+            with tempfile.NamedTemporaryFile(dir=filepath.parent, suffix='.tmp', delete=False) as tmpfile:
+                tmpname = tmpfile.name
+                tmpfile.write(data)
+                tmpfile.flush()
+                os.fsync(tmpfile.fileno())
+            os.replace(tmpname, filepath)
+            self.stats()['writes'] += 1
+        except Exception as e:
+            if tmpname is not None and os.path.exists(tmpname): os.remove(tmpname)
+            self.log(f"Fail to write code cache '{filepath}': {e}", Logger.LevelWarning)
+            self.stats()['errors'] += 1
+        return self
+
+    def clear(self):
+        for filepath in Path(self.path()).glob("*.ssc"):
+            filepath.unlink(missing_ok=True)
+        return self
+
 class SourceFile(SObject):
     filepath = Holder().name('filepath').type('String')
 
@@ -241,17 +401,54 @@ class Closure(SObject):
     pysource = Holder().name('pysource').type('String')
     pyfunc = Holder().name('pyfunc')
     pyerror = Holder().name('pyerror')
+    pycode = Holder().name('pycode')
+    optimize = Holder().name('optimize').type('False_')     # compile params and tempvars as Python locals
+    bytecode = Holder().name('bytecode')                    # set by assemble() to run on the bytecode VM
+    transients = ('ss_activations',)                        # per run state, not saved in snapshots
+
+    def value(self, *args):
+        """
+        Run this block with @args bound positionally to its params, under the running scope. The running scope
+        passed first beyond its params e.g. by a unary value send is not an argument.
+        """
+        parent = currentScope.get()
+        if args and args[0] is parent and parent is not nil and len(args) > len(self._get('ss_params', ())):
+            args = args[1:]
+        # The parent scope keeps one activation per block, without a parent the block keeps it. It is taken while
+        # running, so a reentrant or concurrent call creates its own and never rebinds a running one.
+        owner = self if parent is nil else parent
+        activations = vars(owner).get('ss_activations')
+        record = None if activations is None else activations.pop(id(self), None)
+        scope = record[1] if record is not None else self._newActivation(parent)
+        res = self.run(scope, *args)
+        if dict.keys(scope._get('ss_locals', {})) <= self._activationNames():
+            if activations is None: activations = vars(owner).setdefault('ss_activations', {})
+            activations[id(self)] = (self, scope)       # reusable, nothing else was defined in it
+        return res
 
-    @Holder()
-    def value(scope, *args, **kwargs):
-        arglst = List(args)
-        this = scope['self']
-        return this.run(scope, *arglst, **kwargs)
+    def _newActivation(self, parent):
+        "Scope of a block call under @parent, without Python globals nor an Execution."
+        scope = self.getContext().newScope() if parent is nil else parent.createScope()
+        scope.objs().append(self)
+        scope.locals().setValue('self', self)
+        scope.locals().setValue('closure', self)
+        return scope
+
+    def _activationNames(self):
+        "Names a reusable activation may define, cached until params or tempvars change."
+        params, tempvars = self._get('ss_params', ()), self._get('ss_tempvars', ())
+        cached = self._get('ss_activationNames', None)
+        if cached is None or cached[0] is not params or cached[1] is not tempvars:
+            cached = (params, tempvars, frozenset(('scope', 'self', 'closure', *params, *tempvars)))
+            self._set('ss_activationNames', cached)
+        return cached[2]
 
     def __call__(self, *args, **kwargs):
         arglst = List(args)
-        if arglst.isEmpty() or not isinstance(arglst.head(), Scope):
-            scope = self.getContext().createScope()
+        if arglst.notEmpty() and not isinstance(arglst.head(), Scope):
+            return self.value(*args)        # e.g. a Python callback
+        if arglst.isEmpty():
+            scope = self.getContext().newScope(globals())
         else:
             scope = arglst.head()
             arglst.pop(0)
@@ -259,42 +456,117 @@ class Closure(SObject):
         return self.run(scope, *arglst)
 
     def run(self, scope, *params):
-        if self.pyfunc() is nil:
-            res = self._runSteps(scope, *params)
-        else:
-            res = self._runPy(scope, *params)
+        token = currentScope.set(scope)
+        try:
+            instrumentation = Instrumentation.of(self) if Instrumentation.active else None
+            if instrumentation is not None:
+                res = instrumentation.runClosure(self, scope, params)
+            elif self._get('ss_pyfunc', nil) is not nil:     # raw state, run() is the hottest path
+                res = self._runPy(scope, *params)
+            else:
+                tier = self._get('ss_tier', None)
+                if tier is not None: tier.count(self)
+                if self._get('ss_bytecode', nil) is not nil:
+                    res = self._runBytecode(scope, *params)
+                else:
+                    res = self._runSteps(scope, *params)
+        finally:
+            currentScope.reset(token)
         return self.asSObj(res)
 
     def _runPy(self, scope, *params):
         "Using a compiled Python func to run this closure."
-        func = self.pyfunc()
+        func = self._get('ss_pyfunc', nil)
         try:
             res = func(scope, *params)
         except Exception as e:
+            if getattr(func, 'raises', False): raise    # guarded code raises as the steps do
             # exceptString = traceback.format_exception(type(e), e, None)
-            stackTrace = traceback.format_exc()
-            self.log(f"pyfunc() execution\n{stackTrace}", 3)
+            self.log(lambda: f"pyfunc() execution\n{traceback.format_exc()}", Logger.LevelError, error=repr(e))
             res = nil
         return res
 
-    def _runSteps(self, scope, *params):
-        "Use a precompiler instructions to run this closure."
+    def _runBytecode(self, scope, *params):
+        "Use the assembled bytecode to run this closure."
         for param, arg in zip(self.params(), params):
             scope[param] = arg
         for tmp in self.tempvars():
             scope[tmp] = nil
-        instructions = self.interpreter().instructions()
-        if instructions.isEmpty():
-            currentStep = self.interpreter().currentStep()
-            if currentStep.isNil(): return nil
-            res = currentStep.children().head()
-            if isinstance(res, Step) and res.hasKey('runtimeRes'):
-                res = res.runtimeRes()
-            return res
+        return self.bytecode().run(scope)
+
+    def _runSteps(self, scope, *params, instrumentation=None):
+        "Use a precompiler instructions to run this closure, calling the step and send hooks of @instrumentation."
+        for param, arg in zip(self._get('ss_params', ()), params):
+            scope[param] = arg
+        for tmp in self._get('ss_tempvars', ()):
+            scope[tmp] = nil
+        interpreter = self._get('ss_interpreter', None)
+        if interpreter is None: interpreter = self.interpreter()
+        linked = interpreter._get('ss_linked', nil)
+        if linked is nil:
+            if interpreter.instructions().isEmpty() and interpreter.resultStep().isNil():
+                currentStep = interpreter.currentStep()
+                if currentStep.isNil(): return nil
+                res = currentStep.children().head()
+                if isinstance(res, Step) and res.hasKey('runtimeRes'):
+                    res = res.runtimeRes()
+                return res
+            linked = interpreter.link()
+        records, template, resultIndex = linked
+        if instrumentation is not None: records = instrumentation.hookRecords(self, interpreter, records)
+        frame = template.copy()
         res = nil
-        for instruction in instructions:
-            res = instruction.run(scope)
-        return res
+        for index, (opcode, operands, constant) in enumerate(records):
+            res = frame[index] = opcode(scope, frame, operands, constant)
+        return res if resultIndex is None else frame[resultIndex]
+
+    def location(self):
+        "Closure name with the head of its source, to locate it in profiles."
+        source = self.smallscript().strip().split('\n')[0]
+        if len(source) > 40: source = f"{source[:37]}..."
+        return String(f"{self.name() or 'closure'} '{source}'")
+
+    arithmeticOps = {'+', '-', '*', '/', '\\', '%', '<', '>', '<=', '>='}
+
+    def isArithmetic(self):
+        "Whether this block is one binary arithmetic expression of variables and numbers e.g. [:e | e * 2 + 1]."
+        arithmetic = self._get('ss_arithmetic', None)
+        if arithmetic is None:
+            closureStep = self.interpreter().currentStep() if self.interpreter().notNil() else nil
+            arithmetic = closureStep.notNil() and closureStep.getStep('temps').isNil() and \
+                         self._isArithmeticStep(closureStep.getStep('exprs'))
+            self._set('ss_arithmetic', arithmetic)
+        return arithmetic
+
+    def _isArithmeticStep(self, step):
+        ruleName = step.ruleName()
+        if ruleName == 'binop': return step.compileRes() in self.arithmeticOps
+        if step.isConstant(): return isinstance(step.runtimeRes(), (int, float)) and not isinstance(step.runtimeRes(), bool)
+        if ruleName == 'ref': return step.getStep('primitive').isNil()
+        if ruleName not in ('binhead', 'bintail', 'binmsg', 'var'): return False
+        for child in step.children().values():
+            if not isinstance(child, Step) or not self._isArithmeticStep(child): return False
+        return True
+
+    def arithmetic(self, foldOp=nil):
+        "Classify this block as arithmetic with the fold @foldOp, for a pyfunc that has no steps, see isArithmetic()."
+        return self._set('ss_arithmetic', True)._set('ss_foldOp', foldOp)
+
+    def foldOp(self):
+        "Binary selector of a fold block [:a :b | a op b], nil otherwise."
+        foldOp = self._get('ss_foldOp', None)
+        if foldOp is not None: return foldOp
+        params = self.params()
+        if params.len() != 2 or not self.isArithmetic(): return nil
+        binhead = self.interpreter().currentStep().getStep('exprs')
+        if binhead.ruleName() != 'binhead': return nil
+        bintail = binhead.getStep('bintail')
+        if bintail.getStep('bintail').notNil(): return nil
+        binmsg = bintail.getStep('binmsg')
+        names = [step.getStep('ref').compileRes() if step.ruleName() == 'var' else nil
+                 for step in (binhead.getStep('unaryhead'), binmsg.getStep('unaryhead'))]
+        if names != list(params): return nil
+        return binmsg.getStep('binop').compileRes()
 
     def _getInterpreter(self): return self.interpreter()    # to be overridden
     def visit(self, visitor): return visitor.visitClosure(self)
@@ -306,6 +578,14 @@ class Closure(SObject):
         else:
             self.smallscript(smallscript)
         if smallscript.isEmpty(): return nil
+        useCache = not self.toDebug()
+        if useCache:
+            cache = self.getContext().scriptCache()
+            key = cache.keyFor(self, smallscript)
+            entry = cache.lookup(key, smallscript)
+            if entry.notNil(): return self._shareIR(entry)
+        # don't reuse script and interpreter as they might be shared through the cache.
+        self.script(Script()).interpreter(Interpreter())
         script = self.script().parse(smallscript)
         if script.hasError():
             self.log(script.prettyErrorMsg(), Logger.LevelError)
@@ -317,6 +597,18 @@ class Closure(SObject):
         if closureStep.notNil():
             closure = closureStep.closure()
             self.copyFrom(closure)
+            if useCache:
+                entry = Map(smallscript=smallscript, script=script, interpreter=self.interpreter(),
+                            params=List(self.params()), tempvars=List(self.tempvars()))
+                cache.store(key, entry)
+        return self
+
+    def _shareIR(self, entry):
+        "Take the parsed script and interpreted steps from a ScriptCache entry, with params and tempvars of its own."
+        self.script(entry['script'])
+        self.interpreter(entry['interpreter'])
+        self.params(List(entry['params']))
+        self.tempvars(List(entry['tempvars']))
         return self
 
     def compile(self, smallscript=""):
@@ -327,10 +619,57 @@ class Closure(SObject):
                 self.log("Info: smallscript() is empty and has nothing to compile.", Logger.LevelInfo)
                 return self
             smallscript = self.smallscript()
+        useCache = not self.toDebug()
+        if useCache:
+            smallscript = self.asSObj(smallscript)
+            codeCache = self.getContext().codeCache()
+            key = codeCache.keyFor(self, smallscript)
+            record = codeCache.load(key)
+            if record is not nil: return self._takeCode(smallscript, record)
         self.interpret(smallscript)
         if self.script().hasError(): return nil
         self.toPython()
-        return self._compile()
+        self._compile()
+        if useCache and self.pyerror().isNil():
+            record = (self.pycode(), str(self.name()), tuple(str(param) for param in self.params()),
+                      tuple(str(tmp) for tmp in self.tempvars()), str(self.pysource()))
+            codeCache.store(key, record)
+        return self
+
+    def assemble(self, smallscript=""):
+        "Assemble the closure IR into bytecode for the VM, or keep running the steps if it has no bytecode."
+        if smallscript != "" or self.interpreter().currentStep().isNil():
+            if self.interpret(smallscript) is nil: return nil
+        interpreter = self.interpreter()
+        bytecode = interpreter._get('ss_bytecode', nil)     # shared with closures of the same cached IR
+        if bytecode is nil:
+            try:
+                bytecode = Bytecode().assemble(interpreter.currentStep())
+            except Unassemblable as e:
+                self.log(f"Info: {e}, keep running steps.", Logger.LevelInfo)
+                return self
+            interpreter._set('ss_bytecode', bytecode)
+        self.bytecode(bytecode)
+        return self
+
+    def tiered(self, threshold=nil):
+        "Run interpreted until called @threshold times, then switch to a compiled pyfunc built in the background."
+        if threshold is nil: threshold = self.getContext().tierThreshold()
+        self._set('ss_tier', TierCounter().threshold(int(threshold)))
+        return self
+
+    def tierCounter(self): return self._get('ss_tier', nil)
+
+    def _takeCode(self, smallscript, record):
+        "Take a compiled record from CodeCache without parsing smallscript or compiling pysource."
+        code, name, params, tempvars, pysource = record
+        self.smallscript(smallscript).name(name).pysource(pysource)
+        self.params(List(params)).tempvars(List(tempvars))
+        self.pycode(code)
+        namespace = {}
+        exec(code, namespace)
+        self.pyfunc(namespace[name])
+        return self
 
     def _compile(self):
         try:
@@ -353,6 +692,7 @@ class Closure(SObject):
         namespace = {}
         exec(compiled_method, namespace)
         pyfunc = namespace[self.name()]
+        self.pycode(compiled_method)
         self.pyfunc(pyfunc)
         return self
 
@@ -385,9 +725,12 @@ class Closure(SObject):
         self.name(pyfunc.__name__)
         return self
 
-    def toPython(self):
+    def toPython(self, coder=nil):
         ""
-        coder = PythonCoder()
+        if self.interpreter().currentStep().isNil() and self.smallscript().notEmpty():
+            self.interpret()    # closure taken from CodeCache has no IR yet.
+        if coder is nil:
+            coder = PythonCoder().optimize(self.optimize())
         pythonscript = self.visit(coder)
         self.pysource(pythonscript)
         return pythonscript
@@ -432,16 +775,21 @@ class Closure(SObject):
         return name
 
     def getBody(self, padding, deindent=false_):
-        def removeHead(body, heading):
-            if body[0].lstrip().startswith(heading):
-                body.pop(0)
-
+        "Body of pysource without the method signature and decorator. The optimize preamble is moved into the body."
         source = self.pysource()
         if source.isNil() or source.isEmpty():
             return String("")
-        body = source.split('\n')
-        removeHead(body, "@Holder()")   # try to remove "@Holder()" descriptor
-        removeHead(body, "def ")        # remove the method signature
+        lines = source.split('\n')
+        signature = next((index for index, line in enumerate(lines) if line.lstrip().startswith("def ")), None)
+        if signature is None:
+            body = lines
+        else:
+            # e.g. import and hoisted constants, defined as locals so the body stands alone in a package source
+            preamble = [line for line in lines[:signature] if not line.lstrip().startswith("@Holder(")]
+            body = lines[signature + 1:]
+            if preamble and body:
+                indent = body[0][:len(body[0]) - len(body[0].lstrip())]
+                body = [f"{indent}{line}" for line in preamble] + body
         bodyText = "\n".join(body)
         if deindent:
             buffer = TextBuffer().writeString(bodyText)
@@ -452,6 +800,214 @@ class Closure(SObject):
         info = self.script().info()
         return info
 
+class TierCounter(SObject):
+    """
+    Invocation counter of a tiered closure. Once hot, the closure is compiled by a background worker and switched
+    to its pyfunc, only if compiled mode gives the same results e.g. no primitives, see eligible(). The pyfunc is
+    guarded: its sends answer nil when not understood and errors raise, as the steps do, see PythonCoder.guarded().
+    """
+    executor = None     # shared worker, created on first use
+    lock = threading.Lock()
+
+    def threshold(self, threshold=''): return self._getOrSet('threshold', threshold, 0)
+    def calls(self): return self._get('ss_calls', 0)
+    def state(self): return self._get('ss_state', 'interpreted')   # also compiling, compiled, ineligible, failed
+    def future(self): return self._get('ss_future', nil)
+
+    def count(self, closure):
+        calls = self._get('ss_calls', 0) + 1
+        self._set('ss_calls', calls)
+        if calls < self.threshold() or self.state() != 'interpreted': return self
+        with TierCounter.lock:
+            if self.state() != 'interpreted': return self
+            self._set('ss_state', 'compiling')
+            if TierCounter.executor is None:
+                TierCounter.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ss-tier')
+        self._set('ss_future', TierCounter.executor.submit(self.tierUp, closure))
+        return self
+
+    def wait(self, timeout=None):
+        "Wait for a pending background compile, mostly for tests and tuning."
+        future = self.future()
+        if future is not nil: future.result(timeout)
+        return self
+
+    def tierUp(self, closure):
+        closureStep = closure.interpreter().currentStep()
+        if closure.smallscript().isEmpty() or closureStep.isNil() or not self.eligible(closureStep):
+            self._set('ss_state', 'ineligible')
+            return self
+        compiled = closure.createEmpty()
+        try:
+            if compiled.interpret(closure.smallscript()) is not nil:
+                compiled.toPython(PythonCoder().optimize(closure.optimize()).guarded(true_))
+                compiled._compile()
+        except Exception as e:
+            compiled.pyerror(e)
+            closure.log(f"Tiered compile failed: {e}", Logger.LevelWarning)
+        if compiled.pyerror() is not nil or compiled.pyfunc() is nil:
+            self._set('ss_state', 'failed')
+            return self
+        closure.pysource(compiled.pysource()).pycode(compiled.pycode())
+        pyfunc, nParams = compiled.pyfunc(), compiled.params().len()
+        # Interpreted closures ignore extra params, so does the switched pyfunc. Running invocations finish interpreted.
+        def tieredFunc(scope, *params): return pyfunc(scope, *params[:nParams])
+        tieredFunc.raises = True
+        closure.pyfunc(tieredFunc)
+        self._set('ss_state', 'compiled')
+        return self
+
+    def eligible(self, step):
+        "Whether the compiled @step returns the same results as interpreted."
+        if isinstance(step, PrimitiveStep): return False
+        if isinstance(step, BlockStep): return self.eligible(step.compileRes())
+        if isinstance(step, (UnaryHeadStep, KwHeadStep)) and step.instrIndex() is not nil:
+            receiver = step.getStep('operand') if isinstance(step, UnaryHeadStep) else step.getStep('unaryhead')
+            if receiver.isConstant(): return False      # literals are raw Python objects in compiled mode
+        for child in step.children().values():
+            for childStep in (child if isinstance(child, List) else [child]):
+                if isinstance(childStep, Step) and not self.eligible(childStep): return False
+        return True
+
+class Instrumentation(SObject):
+    """
+    Execution hooks of a Context, see Context.instrumentation(). Hooks are called with
+      enter: (closure, scope, params)           exit: (closure, result, seconds)
+      step: (closure, step, result)             send: (receiver metaname, selector, seconds)
+    Step and send hooks see interpreted closures only, compiled closures send messages as Python calls.
+    Hooks see the closures of their context only. Without hooks, running a closure costs one check of
+    Instrumentation.active.
+    """
+    active = set()      # Instrumentations with hooks, checked by Closure.run()
+    events = ('enter', 'exit', 'step', 'send')
+
+    @classmethod
+    def of(cls, closure):
+        "Instrumentation of the context of @closure, None if it has no hooks."
+        context = closure.getContext()
+        instrumentation = None if context is nil else context._get('ss_instrumentation', None)
+        return instrumentation if instrumentation in cls.active else None
+
+    def hooks(self, event): return self._hookMap()[event]
+
+    def _hookMap(self):
+        hookMap = self._get('ss_hookMap', None)
+        if hookMap is None:
+            hookMap = {event: [] for event in self.events}
+            self._set('ss_hookMap', hookMap)
+        return hookMap
+
+    def addHook(self, event, callback):
+        self._hookMap()[event].append(callback)
+        Instrumentation.active.add(self)
+        return self
+
+    def removeHook(self, event, callback):
+        hooks = self._hookMap()[event]
+        if callback in hooks: hooks.remove(callback)
+        if not any(self._hookMap().values()): Instrumentation.active.discard(self)
+        return self
+
+    def runClosure(self, closure, scope, params):
+        hookMap = self._hookMap()
+        for hook in hookMap['enter']: hook(closure, scope, params)
+        start = time.perf_counter()
+        res = nil
+        try:
+            if closure.pyfunc() is not nil:
+                res = closure._runPy(scope, *params)
+            else:
+                tier = closure._get('ss_tier', None)
+                if tier is not None: tier.count(closure)
+                if (hookMap['step'] or hookMap['send']) and type(closure)._runSteps is Closure._runSteps:
+                    res = closure._runSteps(scope, *params, instrumentation=self)   # bytecode closures run steps
+                elif closure.bytecode().notNil():
+                    res = closure._runBytecode(scope, *params)
+                else:
+                    res = closure._runSteps(scope, *params)
+        finally:
+            elapsed = time.perf_counter() - start
+            for hook in hookMap['exit']: hook(closure, res, elapsed)
+        return res
+
+    def hookRecords(self, closure, interpreter, records):
+        "Linked @records of @closure, run by Closure._runSteps(), wrapped to call the step and send hooks."
+        hookMap = self._hookMap()
+        stepHooks = hookMap['step']
+        def hooked(opcode, instruction):
+            if opcode is RuntimeStep.runSends and hookMap['send']: opcode = self.runSends
+            def run(scope, frame, operands, constant):
+                res = opcode(scope, frame, operands, constant)
+                for hook in stepHooks: hook(closure, instruction, res)
+                return res
+            return run
+        instructions = interpreter.instructions()
+        return [(hooked(opcode, instructions[index]), operands, constant)
+                for index, (opcode, operands, constant) in enumerate(records)]
+
+    def runSends(self, scope, frame, operands, groups):
+        "RuntimeStep.runSends() timing each send for the send hooks."
+        sendHooks = self._hookMap()['send']
+        res = frame[operands[0]]
+        for group in groups:
+            for send, msg in group:
+                receiver = res.metaname() if isinstance(res, SObject) else type(res).__name__
+                start = time.perf_counter()
+                res = send(scope, frame, res, msg)
+                elapsed = time.perf_counter() - start
+                selector = msg[1] if send is KwHeadStep.send else msg[0]
+                for hook in sendHooks: hook(receiver, selector, elapsed)
+                if res is _missing:
+                    res = nil
+                    break
+        return res
+
+class SamplingProfiler(SObject):
+    """
+    Aggregate calls and time per selector i.e. receiver>>selector, and per closure location. Only one in @rate
+    events of a key is aggregated and scaled by @rate, to keep the overhead low in production.
+    """
+    def rate(self, rate=''): return self._getOrSet('rate', rate, 1)
+    def selectors(self): return self._getOrSet('selectors', '', nil)    # key -> [calls, seconds, events]
+    def closures(self): return self._getOrSet('closures', '', nil)
+
+    def start(self, context=nil):
+        "Install the hooks into the instrumentation of @context."
+        if context is nil: context = self.getContext()
+        self._set('ss_selectors', {})._set('ss_closures', {})
+        self._set('ss_instrumentation', context.instrumentation())
+        context.instrumentation().addHook('send', self.onSend).addHook('exit', self.onExit)
+        return self
+
+    def stop(self):
+        instrumentation = self._get('ss_instrumentation', None)
+        if instrumentation is not None:
+            instrumentation.removeHook('send', self.onSend).removeHook('exit', self.onExit)
+        return self
+
+    def _sample(self, table, key, seconds):
+        record = table.get(key)
+        if record is None: record = table[key] = [0, 0.0, 0]    # calls, seconds, events
+        record[2] += 1
+        rate = self.rate()
+        if record[2] % rate: return self
+        record[0] += rate
+        record[1] += seconds * rate
+        return self
+
+    def onSend(self, receiver, selector, seconds): self._sample(self.selectors(), f"{receiver}>>{selector}", seconds)
+    def onExit(self, closure, result, seconds): self._sample(self.closures(), closure.location(), seconds)
+
+    def report(self, limit=10):
+        "Report lines of the hottest selectors and closures by time."
+        lines = List()
+        for title, table in (('selector', self.selectors()), ('closure', self.closures())):
+            lines.append(String(f"{title:<60}{'calls':>8}{'ms':>10}"))
+            rows = sorted(table.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+            for key, (calls, seconds, events) in rows:
+                lines.append(String(f"{key:<60}{calls:>8}{seconds * 1000:>10.3f}"))
+        return lines
+
 class Execution(SObject):
     "Execution provides a context linking a sobject with a method i.e. function encapsulation."
     this = Holder().name('this')
@@ -478,9 +1034,12 @@ class Execution(SObject):
         return scope
 
     def prepareScope(self):
-        scopeVar = self._findScopeFromFrames()
+        if self.getContext().scopeFromFrames():
+            scopeVar = self._findScopeFromFrames()
+        else:
+            scopeVar = currentScope.get()
         if scopeVar is nil:
-            scope = self.getContext().createScope().context(self.context())
+            scope = self.getContext().newScope(globals()).context(self.context())
         else:
             scope = scopeVar.createScope()
         scope.objs().append(self.this())
@@ -500,10 +1059,79 @@ class Execution(SObject):
 class PythonCoder(SObject):
     delimiter = Holder().name('delimiter').type('String')
     methodsSource = Holder().name('methodsSource').type('TextBuffer')
+    optimize = Holder().name('optimize').type('False_')
+    localNames = Holder().name('localNames').type('List')   # params and tempvars compiled as Python locals
+    constants = Holder().name('constants').type('List')     # hoisted literal sources, shared with nested coders
+    isNested = Holder().name('isNested').type('False_')
+    guarded = Holder().name('guarded').type('False_')       # sends answer nil when not understood, see SendSite
 
     def firstArg(self, firstArg=''): return self.getContext().FirstArg()
     def visit(self, step): return step.visit(self)
 
+    def nestedCoder(self):
+        "Coder for a nested closure, sharing the hoisted constants of this coder."
+        return PythonCoder().optimize(self.optimize()).constants(self.constants()).isNested(true_). \
+                    guarded(self.guarded())
+
+    def freeVars(self, closureStep):
+        "Names referenced in @closureStep but not declared by it, or nil if primitives make it undecidable."
+        names = set()
+        nested = List()
+        if not self._collectRefs(closureStep, names, nested): return nil
+        for innerStep in nested:
+            free = self.freeVars(innerStep)
+            if free is nil: return nil
+            names |= free
+        closure = closureStep.closure()
+        return names - set(closure.params()) - set(closure.tempvars())
+
+    def _collectRefs(self, step, names, nested):
+        for child in step.children().values():
+            childSteps = child if isinstance(child, List) else [child]
+            for childStep in childSteps:
+                if not isinstance(childStep, Step): continue
+                if isinstance(childStep, PrimitiveStep): return False
+                if isinstance(childStep, BlockStep):
+                    nested.append(childStep.compileRes())
+                    continue
+                if isinstance(childStep, RefStep) and childStep.compileRes().notNil():
+                    names.add(childStep.compileRes().split('.')[0])
+                if not self._collectRefs(childStep, names, nested): return False
+        return True
+
+    def _promoteLocals(self, closure, closureStep):
+        "Params and tempvars not captured by nested blocks can live in Python locals instead of scope."
+        localNames = List()
+        if not self.optimize(): return localNames
+        captured = set()
+        nested = List()
+        if not self._collectRefs(closureStep, set(), nested): return localNames
+        for innerStep in nested:
+            free = self.freeVars(innerStep)
+            if free is nil: return localNames
+            captured |= free
+        firstArg = self.firstArg()
+        for name in closure.params() + closure.tempvars():
+            if name in captured or name in (firstArg, '_'): continue
+            if not name.isidentifier() or keyword.iskeyword(name): continue
+            localNames.append(name)
+        return localNames
+
+    def hoist(self, source):
+        "Hoist @source of a literal into a module level constant and return its name."
+        constants = self.constants()
+        name = f"_const{constants.len()}"
+        constants.append(f"{name} = {source}")
+        return name
+
+    def _literalSource(self, literal):
+        if isinstance(literal, Map):
+            items = ", ".join([f"{self._literalSource(k)}: {self._literalSource(v)}" for k, v in literal.items()])
+            return f"Map({{{items}}})"
+        if isinstance(literal, List):
+            return f"List([{', '.join([self._literalSource(e) for e in literal])}])"
+        return literal.visit(self)
+
     def visitStep(self, step):
         value = step.runtimeRes()
         if value.isNil():
@@ -515,18 +1143,24 @@ class PythonCoder(SObject):
         output = TextBuffer().delimiter("\n")
         output.skipFirstDelimiter()
 
+        closureStep = closure.interpreter().currentStep()
+        localNames = self._promoteLocals(closure, closureStep)
+        self.localNames(localNames)
         # params
         if closure.params().notEmpty():
             for param in closure.params():
+                if param in localNames: continue
                 output.writeLine(f"scope.locals()['{param}'] = {param}")
         # tempvars
         if closure.tempvars().notEmpty():
             output.writeLine()
             for tempVar in closure.tempvars():
-                output.writeString(f"scope.locals()['{tempVar}'] = ")
+                if tempVar in localNames:
+                    output.writeString(f"{tempVar} = ")
+                else:
+                    output.writeString(f"scope.locals()['{tempVar}'] = ")
             output.writeString(f"{self.firstArg()}['nil']")
         # expressions
-        closureStep = closure.interpreter().currentStep()
         exprs = closureStep.getStep('exprs')
         exprList = closureStep.flatten(exprs)
         for step in exprList[:-1]:
@@ -553,6 +1187,11 @@ class PythonCoder(SObject):
             closure.name(name)
         pySignature = closure.pySignature(name)
         source = String(f"{pySignature}{final}")
+        if self.constants().notEmpty() and not self.isNested():
+            imports = ["from smallscript.SObject import List, Map"]
+            if self.guarded(): imports.append("from smallscript.Step import SendSite")
+            preamble = "\n".join(imports + self.constants())
+            source = String(f"{preamble}\n{source}")
         return source
 
     def visitChain(self, chain):
@@ -566,22 +1205,27 @@ class PythonCoder(SObject):
         for msg in msgs:
             tails = msg.children().values()
             for tailStep in tails:
-                tail = ""
+                receiver = f"({output})"
                 ruleName = tailStep.ruleName()
                 if ruleName == 'kwmsg':
-                    tail = self._visitKwMsg(tailStep)
+                    output = self._visitKwMsg(tailStep, receiver)
                 elif ruleName == 'bintail':
-                    tail = self._visitBinTail(tailStep)
+                    output = self._visitBinTail(tailStep, receiver)
                 elif ruleName == 'unarytail':
-                    tail = self._visitUnaryTail(tailStep)
-                output = f"({output}){tail}"
+                    output = self._visitUnaryTail(tailStep, receiver)
+                else:
+                    output = receiver
         return output
 
     def visitBlock(self, block):
         closure = block.compileRes().closure()
-        source = closure.toPython()
+        source = closure.toPython(self.nestedCoder())
         self.methodsSource().delimiter("\n").writeLine(source)
+        if self.guarded(): self.methodsSource().writeLine(f"{closure.name()}.raises = True")
         res = String(f"{self.firstArg()}.newInstance('Closure').takePyFunc({closure.name()})")
+        if closure.isArithmetic():      # kept for Vector, a compiled block has no steps to classify
+            foldOp = closure.foldOp()
+            res = String(f"{res}.arithmetic({'' if foldOp is nil else repr(str(foldOp))})")
         return res
 
     def visitPrimitive(self, primitive):
@@ -595,8 +1239,8 @@ class PythonCoder(SObject):
         res = func(*resLst)
         return res
 
-    def _visitUnaryTail(self, unarytailStep):
-        output = TextBuffer()
+    def _visitUnaryTail(self, unarytailStep, receiver):
+        ops = List()
         while unarytailStep.notNil():
             if unarytailStep.ruleName() == "unarytail":
                 unarymsg = unarytailStep.getStep('unarymsg')
@@ -604,47 +1248,44 @@ class PythonCoder(SObject):
                 unarymsg = unarytailStep
             op = unarymsg.compileRes()
             if op.notNil():
-                output.writeString(f".{op}()")
+                ops.append(str(op))
             unarytailStep = unarytailStep.getStep('unarytail')
-        return output.text()
+        if self.guarded() and ops:
+            site = self.hoist(f"SendSite().unary({', '.join([repr(op) for op in ops])})")
+            return String(f"{site}.send({self.firstArg()}, {receiver})")
+        return String("".join([f"{receiver}"] + [f".{op}()" for op in ops]))
 
     def visitUnaryHead(self, unaryHead):
+        if unaryHead.isConstant(): return unaryHead.runtimeRes().visit(self)   # folded by Interpreter.optimize()
         operandStep = unaryHead.getStep('operand')
         operand = operandStep.visit(self)
         unarytailStep = unaryHead.getStep('unarytail')
         if unarytailStep.isNil(): return unaryHead
-        output = TextBuffer()
-        output.writeString(f"{operand}")
-        tail = self._visitUnaryTail(unarytailStep)
-        output.writeString(tail)
-        return output.text()
+        return self._visitUnaryTail(unarytailStep, operand)
 
-    def _visitBinTail(self, bintailStep):
-        output = TextBuffer()
+    def _visitBinTail(self, bintailStep, receiver):
+        binops, operands = List(), List()
         while bintailStep.notNil():
             binmsgStep = bintailStep.getStep('binmsg') \
                             if bintailStep.ruleName() == 'bintail' \
                             else bintailStep
-            binop = binmsgStep.getStep('binop').compileRes()
-            output.writeString(f" {binop}")
+            binops.append(str(binmsgStep.getStep('binop').compileRes()))
             operandStep = binmsgStep.getStep('unaryhead')
-            operand = operandStep.visit(self)
-            output.writeString(f" {operand}")
+            operands.append(f"{operandStep.visit(self)}")
             bintailStep = bintailStep.getStep('bintail')
-        return output.text()
+        if self.guarded():
+            site = self.hoist(f"SendSite().binary({', '.join([repr(binop) for binop in binops])})")
+            return String(f"{site}.send({', '.join([self.firstArg(), f'{receiver}'] + operands)})")
+        return String("".join([f"{receiver}"] + [f" {binop} {operand}" for binop, operand in zip(binops, operands)]))
 
     def visitBinHead(self, binhead):
         unaryHeadStep = binhead.getStep('unaryhead')
         unaryHead = unaryHeadStep.visit(self)
         bintailStep = binhead.getStep('bintail')
         if bintailStep.isNil(): return unaryHead
-        output = TextBuffer()
-        output.writeString(f"{unaryHead}")
-        tail = self._visitBinTail(bintailStep)
-        output.writeString(tail)
-        return output.text()
+        return self._visitBinTail(bintailStep, unaryHead)
 
-    def _visitKwMsg(self, kwmsg):
+    def _visitKwMsg(self, kwmsg, receiver):
         def _kwmsg(kwmsg):
             kwpairs = kwmsg.children().head()
             if not isinstance(kwpairs, List):
@@ -659,11 +1300,16 @@ class PythonCoder(SObject):
             return kwMap
 
         output = TextBuffer()
+        output.writeString(f"{receiver}")
         kwMap = _kwmsg(kwmsg)
         prefix = kwMap.keys().head()
         fullname = prefix
         if kwMap.len() > 1:
             fullname = "".join([f"{key}__" for key in kwMap.keys()])
+        if self.guarded():
+            site = self.hoist(f"SendSite().keyword({str(prefix)!r}, {str(fullname)!r}, {kwMap.len()})")
+            args = [self.firstArg(), f"{receiver}"] + [parameter.toString() for parameter in kwMap.values()]
+            return String(f"{site}.send({', '.join(args)})")
         kwOutput = TextBuffer().delimiter(", ").skipFirstDelimiter()
         kwOutput.writeString(f".{fullname}(")
         for parameter in kwMap.values():
@@ -688,17 +1334,14 @@ class PythonCoder(SObject):
         unaryheadStep = kwhead.getStep('unaryhead')
         unaryhead = unaryheadStep.visit(self)
         kwmsg = kwhead.getStep('kwmsg')
-
-        output = TextBuffer()
-        output.writeString(f"{unaryhead}")
-        msg = self._visitKwMsg(kwmsg)
-        output.writeString(msg)
-        return output.text()
+        return self._visitKwMsg(kwmsg, unaryhead)
 
     def visitArray(self, arrayStep):
         steps = arrayStep.getStep('litarrcnt') # litarr
         if steps.notNil():
             litarr = arrayStep.compileRes()
+            if self.optimize():     # hoisted as a factory, the array may be modified so each use takes a new one
+                return String(f"{self.hoist(f'lambda: {self._literalSource(litarr)}')}()")
             litarrSrc = litarr.visit(self)
             return litarrSrc
         steps = arrayStep.getStep('operand') # dynarr
@@ -729,10 +1372,11 @@ class PythonCoder(SObject):
             head = String(varnames[0])
             tail = varname.split('.', 1)[-1]
             last = varnames[-1]
+            obj = head if head in self.localNames() else f"{self.firstArg()}[{head.asString()}]"
             if varnames.len() == 1:
-                res = f"{self.firstArg()}[{head.asString()}]"
+                res = obj
             else:
-                res = f"{self.firstArg()}.newInstance('ObjAdapter').object({self.firstArg()}[{head.asString()}]).getRef('{tail}').{last}"
+                res = f"{self.firstArg()}.newInstance('ObjAdapter').object({obj}).getRef('{tail}').{last}"
         return String(res)
 
     def visitList(self, list):
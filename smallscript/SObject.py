@@ -14,6 +14,7 @@
 # limitations under the License.
 
 import io
+import re
 import sys
 import os
 import pkgutil
@@ -24,11 +25,20 @@ import hashlib
 import logging
 import traceback
 import types
+import time
+import contextlib
+import collections
+import itertools
+import threading
 from pathlib import Path
 
 logger = logging.getLogger('smallscript')
 # print(f"=== {logger.getEffectiveLevel()}")
 
+_startupProfiler = None    # StartupProfiler if enabled by SS_PROFILE_STARTUP or Context.profileStartup()
+_keyNames = {}          # attname -> keyname memo for SObject._keyName()
+_keyNamesLimit = 4096
+
 class SObject:
     """
     The base parent for all SObject. SObject setter always return self for chaining multiple updates together.
@@ -39,18 +49,13 @@ class SObject:
         if metaclass.isNil():
             return self.unimplemented(item)
 
-        # look for the holder with fullname e.g. first__last__
-        holder = metaclass.holderByName(item)
+        # look for the holder with fullname e.g. first__last__, then with partial name e.g. first
+        holder = metaclass.resolveHolder(item)
         if holder.notNil():
             return holder.__get__(self)
-
-        # look for the holder with partial name e.g. first
         partial = item.split('__')
         if len(partial) > 1:
             name = partial[0]
-            holder = metaclass.holderByName(name)
-            if holder.notNil():
-                return holder.__get__(self)
             if hasattr(self, name):
                 return getattr(self, name)
 
@@ -220,12 +225,17 @@ class SObject:
     def toDebug(self, toDebug=''): return self._getOrSet('toDebug', toDebug, false_)
 
     def logger(self, logger=''):
-        # logger at class level
-        metaattrs = self.metaclass().attrs()
+        # logger at class level, cached on the metaclass
+        metaclass = self.metaclass()
+        if logger == '':
+            cached = metaclass.__dict__.get('ss_loggerCache')
+            if cached is not None: return cached
+        metaattrs = metaclass.attrs()
         logger = metaattrs._getOrSet('logger', logger, nil)
         if logger.isNil():
             logger = Logger()
             metaattrs.setValue('logger', logger)
+        if metaclass is not nil: metaclass._set('ss_loggerCache', logger)
         return logger
 
     def loglevel(self, loglevel=''):
@@ -234,8 +244,9 @@ class SObject:
         self.logger().level(loglevel)
         return self
 
-    def log(self, msg, level=0):
-        self.logger().log(msg, level)
+    def log(self, msg, level=0, *args, **fields):
+        "Log @msg if @level is enabled. @msg can be a callable or a str.format() string of @args, built only then."
+        self.logger().log(msg, level, *args, **fields)
         return self
 
     #### Attributes accesses: these are Scope key-value access behavior.
@@ -244,23 +255,19 @@ class SObject:
     def __delitem__(self, attname): return self.delValue(attname)
 
     def keys(self):
-        masq = self._keyName('masquerade')
-        obj = self._get(masq, nil) if self._has(masq) else self
+        obj = self._get('ss_masquerade', self)
         return List([obj._varName(keyname) for keyname in obj._keys()])
 
     def hasKey(self, attname):
-        masq = self._keyName('masquerade')
-        obj = self._get(masq, nil) if self._has(masq) else self
+        obj = self._get('ss_masquerade', self)
         return obj._has(obj._keyName(attname))
 
     def delValue(self, attname):
-        masq = self._keyName('masquerade')
-        obj = self._get(masq, nil) if self._has(masq) else self
+        obj = self._get('ss_masquerade', self)
         return obj._del(obj._keyName(attname))
 
     def getValue(self, attname, default=None):
-        masq = self._keyName('masquerade')
-        obj = self._get(masq, nil) if self._has(masq) else self
+        obj = self._get('ss_masquerade', self)
         # need to do this as nil can't be used as default before nil is initialized.
         # nil at runtime in a call has already initialized.
         if default is None: default = nil
@@ -275,8 +282,7 @@ class SObject:
         return res
 
     def setValue(self, attname, value):
-        masq = self._keyName('masquerade')
-        obj = self._get(masq, nil) if self._has(masq) else self
+        obj = self._get('ss_masquerade', self)
         sobj = self.asSObj(value)
         return obj._set(obj._keyName(attname), sobj)
 
@@ -304,15 +310,13 @@ class SObject:
 
     def _getOrSet(self, attname, value ='', default =''):  # can't use nil as default
         "Low level SObject getOrSet behavior for initialization."
-        masq = self._keyName('masquerade')
-        obj = self._get(masq, nil) if self._has(masq) else self
+        obj = self._get('ss_masquerade', self)
         keyname = self._keyName(attname)
         return obj._get(keyname, default) if value == '' else obj._set(keyname, value)
 
     def _getOrSetDefault(self, attname, defaultType, value =''):
         "Low level SObject getOrSet behavior for initialization and Scope object."
-        masq = self._keyName('masquerade')
-        obj = self._get(masq, nil) if self._has(masq) else self
+        obj = self._get('ss_masquerade', self)
         keyname = self._keyName(attname)
         if value == '':
             if obj._has(keyname): return self._get(keyname, nil)
@@ -327,7 +331,11 @@ class SObject:
 
     def _keyName(self, attname):
         """Calculate the internals keyname from public facing attname."""
-        return attname if len(attname) > 3 and attname[0:3] == 'ss_' else f'ss_{attname}'
+        keyname = _keyNames.get(attname)
+        if keyname is None:
+            keyname = attname if len(attname) > 3 and attname[0:3] == 'ss_' else f'ss_{attname}'
+            if len(_keyNames) < _keyNamesLimit: _keyNames[attname] = keyname
+        return keyname
 
     #### Private helper methods
     def _defineHolders(self, holders):
@@ -493,7 +501,7 @@ class String(str, Primitive):
     def __eq__(self, val): return super().__eq__(val)
     def __hash__(self): return super().__hash__()
     def visit(self, visitor): return visitor.visitString(self)
-    def asNumber(self): return Number().fromString(self)
+    def asNumber(self): return Float(self) if '.' in self else Integer(self)
     def len(self): return len(self)
     def isEmpty(self): return self.len() == 0
     def sha256(self, digits=16): return hashlib.sha256(self.encode()).hexdigest()[0:digits]
@@ -571,7 +579,78 @@ class Undefined(SObject):
 
 undefined = Undefined()
 
-class List(list, Primitive):
+def _blockFunc(block):
+    "Function of a block argument, a Closure runs by value: as in SmallScript, any other callable is called as is."
+    return block.value if isinstance(block, SObject) else block
+
+def _blockTest(block):
+    "Predicate of a block argument, only true answers true e.g. nil is not, unlike Python truthiness."
+    func = _blockFunc(block)
+    return lambda item: _isTrue(func(item))
+
+def _isTrue(value): return value is true_ or value is True
+
+class Collection(Primitive):
+    """
+    Smalltalk collection protocol over the elements of a collection e.g. list items or map values. Blocks are
+    interpreted or compiled closures, or Python callables. lazyCollect: and lazySelect: answer a Stream.
+    """
+    def elements(self): return iter(self)
+
+    def do(self, block):
+        "Evaluate @block with each element."
+        func = _blockFunc(block)
+        for item in self.elements(): func(item)
+        return self
+
+    def collect(self, block): return List(map(_blockFunc(block), self.elements()))
+    def select(self, block): return List(filter(_blockTest(block), self.elements()))
+
+    def reject(self, block):
+        test = _blockTest(block)
+        return List(item for item in self.elements() if not test(item))
+
+    def detect(self, block):
+        "First element for which @block is true, nil if none."
+        return next(filter(_blockTest(block), self.elements()), nil)
+
+    def inject__into__(self, initial, block):
+        "Fold the elements into @initial by @block i.e. [:acc :e | ...]."
+        func = _blockFunc(block)
+        res = initial
+        for item in self.elements(): res = func(res, item)
+        return res
+
+    def stream(self): return Stream(self)
+    def lazyCollect(self, block): return self.stream().lazyCollect(block)
+    def lazySelect(self, block): return self.stream().lazySelect(block)
+
+class Stream(Collection):
+    """
+    Lazy elements of a collection. lazyCollect: and lazySelect: stack generator stages without materializing them,
+    the elements are computed when iterated e.g. by do:, collect: or inject:into:. It streams its source again
+    on each iteration, a one-shot source e.g. a Python generator streams once.
+    """
+    def __init__(self, source=None):
+        self._set('ss_source', List() if source is None else source)._set('ss_stages', ())
+
+    def elements(self):
+        items = iter(self._get('ss_source', None))
+        for stage, func in self._get('ss_stages', ()): items = stage(func, items)
+        return items
+
+    def _addStage(self, stage, block):
+        stream = Stream(self._get('ss_source', None))
+        return stream._set('ss_stages', self._get('ss_stages', ()) + ((stage, _blockFunc(block)),))
+
+    def __iter__(self): return self.elements()
+    def stream(self): return self
+    def lazyCollect(self, block): return self._addStage(map, block)
+    def lazySelect(self, block): return self._addStage(filter, _blockTest(block))
+    def first(self, count=1): return List(itertools.islice(self.elements(), int(count)))
+    def asList(self): return List(self.elements())
+
+class List(list, Collection):
     """SObject list class."""
     def __init__(self, *args):
         list.__init__(self, *args)
@@ -588,7 +667,7 @@ class List(list, Primitive):
     def includes(self, aList):
         return all(item in self for item in aList)
 
-class Map(dict, Primitive):
+class Map(dict, Collection):
     """SObject map class."""
     def __init__(self, *args, **kwargs):
         super(Map, self).__init__(*args, **kwargs)
@@ -609,6 +688,129 @@ class Map(dict, Primitive):
         if self.hasKey(name): del self[name]
         return self
 
+    def elements(self): return iter(super().values())
+    def stream(self): return Stream(super().values())
+    def collect(self, block):
+        func = _blockFunc(block)
+        return Map({key: func(value) for key, value in self.items()})
+    def select(self, block):
+        test = _blockTest(block)
+        return Map({key: value for key, value in self.items() if test(value)})
+    def reject(self, block):
+        test = _blockTest(block)
+        return Map({key: value for key, value in self.items() if not test(value)})
+    def keysAndValuesDo(self, block):
+        "Evaluate @block with each key and value."
+        func = _blockFunc(block)
+        for key, value in list(self.items()): func(key, value)
+        return self
+
+class Vector(Collection):
+    """
+    SObject of a NumPy array. Binary messages e.g. + - * / < > = broadcast over the whole array, and collect:,
+    select: and inject:into: run an arithmetic block once on the array instead of once per element.
+    Dividing by zero raises ZeroDivisionError like Integer, rather than answering inf or nan.
+    """
+    ufuncs = {'+': 'add', '-': 'subtract', '*': 'multiply', '/': 'true_divide', '\\': 'floor_divide', '%': 'remainder'}
+
+    def __init__(self, values=None):
+        import numpy    # optional dependency, needed by vectors only
+        if isinstance(values, (list, tuple)):
+            values = [value.value() if isinstance(value, Number) else value for value in values]
+        self._set('ss_array', numpy.asarray([] if values is None else values))
+
+    def array(self): return self._get('ss_array', None)
+    def _new(self, array):
+        vector = Vector.__new__(Vector)
+        vector._set('ss_array', array)
+        return vector
+
+    def _operand(self, val):
+        if isinstance(val, Vector): return val.array()
+        if isinstance(val, Number): return val.value()
+        return val
+
+    def _divisor(self, val):
+        import numpy
+        divisor = self._operand(val)
+        if not numpy.all(divisor): raise ZeroDivisionError("Vector division by zero")
+        return divisor
+
+    def __add__(self, val): return self._new(self.array() + self._operand(val))
+    def __sub__(self, val): return self._new(self.array() - self._operand(val))
+    def __mul__(self, val): return self._new(self.array() * self._operand(val))
+    def __truediv__(self, val): return self._new(self.array() / self._divisor(val))
+    def __floordiv__(self, val): return self._new(self.array() // self._divisor(val))
+    def __mod__(self, val): return self._new(self.array() % self._divisor(val))
+    def __gt__(self, val): return self._new(self.array() > self._operand(val))
+    def __lt__(self, val): return self._new(self.array() < self._operand(val))
+    def __ge__(self, val): return self._new(self.array() >= self._operand(val))
+    def __le__(self, val): return self._new(self.array() <= self._operand(val))
+    def __eq__(self, val):
+        if not isinstance(val, (Vector, Number, int, float)): return NotImplemented    # e.g. '' defaults, by identity
+        return self._new(self.array() == self._operand(val))
+    def __ne__(self, val):
+        if not isinstance(val, (Vector, Number, int, float)): return NotImplemented
+        return self._new(self.array() != self._operand(val))
+    __hash__ = SObject.__hash__     # by identity, as = broadcasts
+    def __radd__(self, val): return self._new(self._operand(val) + self.array())
+    def __rsub__(self, val): return self._new(self._operand(val) - self.array())
+    def __rmul__(self, val): return self._new(self._operand(val) * self.array())
+    def __rtruediv__(self, val): return self._new(self._operand(val) / self._divisor(self))
+    def __rfloordiv__(self, val): return self._new(self._operand(val) // self._divisor(self))
+    def __rmod__(self, val): return self._new(self._operand(val) % self._divisor(self))
+    def __neg__(self): return self._new(-self.array())
+    def __len__(self): return len(self.array())
+    def __iter__(self): return (asNumeric(item) for item in self.array().tolist())
+
+    def len(self): return len(self.array())
+    def isEmpty(self): return self.len() == 0
+    def notEmpty(self): return not self.isEmpty()
+    def at(self, index): return self._item(self.array()[int(index)])
+    def _item(self, value): return asNumeric(value.item()) if hasattr(value, 'item') else value
+    def sum(self): return self._item(self.array().sum())
+    def mean(self): return self._item(self.array().mean())
+    def min(self): return self._item(self.array().min())
+    def max(self): return self._item(self.array().max())
+    def asList(self): return List(self)
+    def toString(self): return String(f"{self.array()}")
+    def asString(self): return self.toString()
+    def describe(self): return String(f"Vector {self.array().dtype} {self.array()}")
+
+    def _isArithmetic(self, block, nParams):
+        "Whether @block is an arithmetic closure of @nParams params, to run once on the whole array."
+        from smallscript.Closure import Closure
+        return isinstance(block, Closure) and block.params().len() == nParams and block.isArithmetic()
+
+    def collect(self, block):
+        "New vector of @block results for each element."
+        import numpy
+        if self._isArithmetic(block, 1):
+            res = block.value(self)
+            return res if isinstance(res, Vector) else self._new(numpy.full(self.len(), self._operand(res)))
+        func = _blockFunc(block)
+        return Vector([func(item) for item in self])
+
+    def select(self, block):
+        "New vector of the elements for which @block is true."
+        if self._isArithmetic(block, 1):
+            mask = block.value(self)
+            if isinstance(mask, Vector) and mask.array().dtype == bool: return self._new(self.array()[mask.array()])
+        test = _blockTest(block)
+        return self._new(self.array()[[test(item) for item in self]])
+
+    def inject__into__(self, initial, block):
+        "Fold the elements into @initial by @block i.e. [:acc :e | ...]."
+        import numpy
+        binop = block.foldOp() if self._isArithmetic(block, 2) else nil
+        if binop in self.ufuncs:
+            if binop in ('/', '\\', '%'): self._divisor(self)
+            ufunc = getattr(numpy, self.ufuncs[binop])
+            return self._item(ufunc.reduce(self.array(), initial=self._operand(initial)))
+        res, func = initial, _blockFunc(block)
+        for item in self: res = func(res, item)
+        return res
+
 class Metaclass(SObject):
     "Metaclass defines a SObject structure."
     context = Holder().name('context').type('Context')
@@ -616,9 +818,21 @@ class Metaclass(SObject):
     factory = Holder().name('factory').type('Nil')
     holders = Holder().name('holders').type('Map')
     parentNames = Holder().name('parentNames').type('List')
+    holderVersion = 0   # bumped by invalidateHolders() to expire all resolved holders.
 
     def __call__(self): return self.createEmpty()
 
+    def setValue(self, attname, value):
+        # holders and parentNames determine how holders are resolved.
+        if attname == 'holders' or attname == 'parentNames': Metaclass.invalidateHolders()
+        return super().setValue(attname, value)
+
+    @classmethod
+    def invalidateHolders(cls):
+        "Expire resolved holders of all metaclasses, as a change may affect its subclasses."
+        Metaclass.holderVersion += 1
+        return cls
+
     def attrs(self):
         keyname = self._keyName('attrs')
         if not self._has(keyname):
@@ -643,6 +857,7 @@ class Metaclass(SObject):
         holder = Holder().name(attrname).type(typeHint)
         if classType: holder.asClassType()
         holders[attrname] = holder
+        self.invalidateHolders()
         return self
 
     def addMethod(self, name, closure, classType=false_):
@@ -654,12 +869,14 @@ class Metaclass(SObject):
         # holders[fullname] = holder  # fullname
         holders[ssname] = holder    # Smallscript protocol
         holders[name] = holder      # prefix for python protocol
+        self.invalidateHolders()
         return self
 
     def importFrom(self, sClass):
         self._importHolders(sClass)
         self._importMetanames(sClass)
         self._createFactory(sClass)
+        self.invalidateHolders()
         return self
 
     def _importHolders(self, sClass):
@@ -702,6 +919,38 @@ class Metaclass(SObject):
     def _getHolder(self, name): return self.holders()[name] if name in self.holders() else nil
 
     def holderByName(self, name):
+        "Find the holder from this metaclass or its parents. Result is cached until invalidateHolders()."
+        resolved = self._resolvedHolders()
+        holder = resolved.get(name)
+        if holder is None:
+            holder = self._holderByName(name)
+            resolved[name] = holder
+        return holder
+
+    def resolveHolder(self, name):
+        "Find the holder by fullname e.g. first__last__, or by its partial name e.g. first."
+        resolved = self._resolvedHolders()
+        key = (name,)               # tuple key to separate from holderByName() entries.
+        holder = resolved.get(key)
+        if holder is None:
+            holder = self.holderByName(name)
+            if holder.isNil():
+                partial = name.split('__')
+                if len(partial) > 1:
+                    holder = self.holderByName(partial[0])
+            resolved[key] = holder
+        return holder
+
+    def _resolvedHolders(self):
+        "Return the resolved holders cache, recreated whenever holderVersion changed."
+        keyname = 'ss_resolvedHolders'
+        cache = self._get(keyname, None)
+        if cache is None or cache[0] != Metaclass.holderVersion:
+            cache = (Metaclass.holderVersion, {})
+            self._set(keyname, cache)
+        return cache[1]
+
+    def _holderByName(self, name):
         holders = self.holders()
         if name in holders:
             return holders[name]
@@ -788,7 +1037,7 @@ class Package(SObject):
         # from importSObjects()
         metaname = self._metaname(sClass)
         metaclass = self.createMetaclass(metaname)
-        metaclass.importFrom(sClass)
+        with profiling('importFrom', metaname): metaclass.importFrom(sClass)
 
         # from importMethods()
         for holder in metaclass.holders().values():
@@ -803,7 +1052,7 @@ class Package(SObject):
         if holder.isNil(): return self
         method = holder.method()
         exeContext = metaclass.attrs().runThis(method)
-        res = exeContext()
+        with profiling('metaInit', metaname): res = exeContext()
         return self
 
     def listSObjects(self):
@@ -815,25 +1064,26 @@ class Package(SObject):
             if module_name in sys.modules:
                 module = sys.modules[module_name]
             else:
-                module = importlib.import_module(module_name)
+                with profiling('module', module_name): module = importlib.import_module(module_name)
             for name, pyClass in inspect.getmembers(module, inspect.isclass):
                 # filter those class defined in this module, not imported within the module.
                 if pyClass.__module__ == module.__name__ and issubclass(pyClass, SObject):
                     sobjs.append(pyClass)
         return sobjs
 
-    def importSObjects(self):
+    def importSObjects(self, sClasses=nil):
         "Import SObject definitions from Python package."
-        sClasses = self.listSObjects()
+        if sClasses is nil: sClasses = self.listSObjects()
         for sClass in sClasses:
             metaname = self._metaname(sClass)
             metaclass = self.createMetaclass(metaname)
-            metaclass.importFrom(sClass)
+            with profiling('importFrom', metaname): metaclass.importFrom(sClass)
         return self
 
-    def importMethods(self):
+    def importMethods(self, metaclasses=nil):
         "Import Method definitions from SObject class."
-        for metaclass in self.metaclasses().values():
+        if metaclasses is nil: metaclasses = self.metaclasses().values()
+        for metaclass in metaclasses:
             for holder in metaclass.holders().values():
                 if holder.type() == 'Closure' and holder.pyfunc() is not nil:
                     method = self.context().newInstance('Closure')
@@ -842,15 +1092,16 @@ class Package(SObject):
                     method.takePyFunc(pyfunc)
         return self
 
-    def initClasses(self):
+    def initClasses(self, metaclasses=nil):
         "Invoke all ss_metaInit() if defined."
-        for metaclass in self.metaclasses().values():
+        if metaclasses is nil: metaclasses = self.metaclasses().values()
+        for metaclass in metaclasses:
             holder = metaclass.holderByName('metaInit')
             if holder.isNil(): continue
             method = holder.method()
             exeContext = metaclass.attrs().runThis(method)
             scope = nil # defined here to stop Execution._findScopeFromFrames() beyond this point.
-            res = exeContext()
+            with profiling('metaInit', metaclass.name()): res = exeContext()
         return self
 
     def createMetaclass(self, metaname):
@@ -876,14 +1127,107 @@ class Package(SObject):
                         setValue('context', context).\
                         factory(SObject())          # default factory, will be rewritten _createFactory()
         metaclasses[metaname] = metaclass
+        if context.notNil(): context.reindexMetaclasses([metaname])
+        Metaclass.invalidateHolders()
         return metaclass
 
     def metaclassByName(self, metaname):
         "Lookup metaclass in this package."
         classes = self.getValue('metaclasses', Map())
         res = classes.get(metaname, nil)
+        if res is nil and self._get('ss_lazyIndex', {}):
+            with Package.loadLock:          # another thread may be loading the module, wait and look again
+                res = self.getValue('metaclasses', Map()).get(metaname, nil)
+                if res is nil and metaname in self._get('ss_lazyIndex', {}):
+                    for moduleName in list(self._get('ss_lazyIndex', {}).get(metaname, [])):
+                        self._loadModule(moduleName)     # in package order, a later module overrides like eager loading
+                    res = self.getValue('metaclasses', Map()).get(metaname, nil)
         return res
 
+    def metaclassNames(self):
+        names = List() if not self.hasKey('metaclasses') else self.metaclasses().keys()
+        for name in self._get('ss_lazyIndex', {}):
+            if name not in names: names.append(name)
+        return names
+
+    #### Lazy loading: index metanames to modules, import a module on first lookup of its metaclasses.
+    loadLock = threading.RLock()    # reentrant, importFrom() and metaInit() may look up other lazy metaclasses
+
+    def lazyIndex(self): return self._get('ss_lazyIndex', {})
+
+    def indexSObjects(self):
+        "Index metanames of the Python package to their modules by parsing the sources, without importing them."
+        spec = importlib.util.find_spec(self.name())
+        lazyIndex = {}
+        if spec is not None and spec.submodule_search_locations is not None:
+            self._indexModules(spec.submodule_search_locations, f"{self.name()}.", lazyIndex)
+        self._set('ss_lazyIndex', lazyIndex)
+        context = self.getValue('context')
+        if context.notNil(): context.reindexMetaclasses()     # lookups are rescanned on demand, not loaded here
+        return self
+
+    def _indexModules(self, paths, prefix, lazyIndex):
+        for finder, name, isPkg in pkgutil.iter_modules(paths):
+            path = Path(finder.path) / name
+            if isPkg:
+                self._indexModules([str(path)], f"{prefix}{name}.", lazyIndex)
+                path = path / "__init__.py"
+            else:
+                path = path.with_suffix(".py")
+            for metaname in self._classMetanames(path):
+                lazyIndex.setdefault(metaname, []).append(f"{prefix}{name}")
+        return lazyIndex
+
+    classPattern = re.compile(r"class\s+(\w+)\s*\(")
+    metasPattern = re.compile(r"(\s+)ss_metas\s*=\s*['\"]([^'\"]*)['\"]")
+
+    def _classMetanames(self, path):
+        "Metanames of top level classes in the Python source @path, from ss_metas if given. Scanned, not parsed."
+        try:
+            source = path.read_text()
+        except (OSError, ValueError):
+            return []
+        metanames, indent = [], ''
+        for line in source.splitlines():
+            match = self.classPattern.match(line)
+            if match:
+                metanames.append(match.group(1))
+                indent = None                   # class body indent, from its first line
+                continue
+            if not line.strip() or line.lstrip().startswith('#'): continue
+            leading = line[:len(line) - len(line.lstrip())]
+            if indent is None: indent = leading
+            if not leading: indent = ''         # top level code closes the class
+            match = self.metasPattern.match(line)
+            if match and indent and match.group(1) == indent:     # class level only, not in method bodies
+                metanames[-1] = match.group(2).split(',')[0].strip()
+        return metanames
+
+    def _loadModule(self, moduleName):
+        "Import and initialize the SObjects of a lazily indexed module."
+        with Package.loadLock: return self._loadModuleLocked(moduleName)
+
+    def _loadModuleLocked(self, moduleName):
+        lazyIndex = self._get('ss_lazyIndex', {})
+        metanames = [name for name, modules in lazyIndex.items() if moduleName in modules]
+        if not metanames: return self       # loaded by another thread meanwhile
+        for metaname in metanames:
+            lazyIndex[metaname].remove(moduleName)
+            if not lazyIndex[metaname]: del lazyIndex[metaname]
+        module = sys.modules.get(moduleName)
+        if module is None:
+            with profiling('module', moduleName): module = importlib.import_module(moduleName)
+        sClasses = [pyClass for name, pyClass in inspect.getmembers(module, inspect.isclass)
+                    if pyClass.__module__ == module.__name__ and issubclass(pyClass, SObject)]
+        self.importSObjects(sClasses)
+        metaclasses = [self.metaclasses()[self._metaname(sClass)] for sClass in sClasses]
+        self.importMethods(metaclasses)
+        Metaclass.invalidateHolders()
+        self.initClasses(metaclasses)
+        context = self.getValue('context')
+        if context.notNil(): context.reindexMetaclasses(metanames)   # drop misses of non SObject classes
+        return self
+
     def newInstance(self, metaname):
         "Create an sobject."
         metaclass = self.metaclassByName(metaname)
@@ -891,6 +1235,7 @@ class Package(SObject):
         return instance
 
     def isEmpty(self):
+        if self._get('ss_lazyIndex', {}): return false_
         if not self.hasKey('metaclasses'): return true_
         return self.metaclasses().isEmpty()
 
@@ -919,18 +1264,19 @@ class Package(SObject):
                     break
         res = self.setAndValidatePath(pkgpath)
         if not res:
-            self.log(f"Validation failed for path '{pkgpath}', probably __init__.py not found.", Logger.LevelInfo)
+            self.log("Validation failed for path '{}', probably __init__.py not found.", Logger.LevelInfo, pkgpath)
         return res
 
     def _loadSObjects(self):
         self.importSObjects()
-        self.importMethods()
-        self.initClasses()
+        with profiling('importMethods', self.name()): self.importMethods()
+        Metaclass.invalidateHolders()
+        with profiling('initClasses', self.name()): self.initClasses()
         return self
 
     def loadSObjects(self):
         "Load the metaclasses from SObjects defined in this package."
-        self.log(f"Loading SObjects from '{self.name()}'", Logger.LevelInfo)
+        self.log("Loading SObjects from '{}'", Logger.LevelInfo, self.name())
         if self.path().isEmpty(): return self
         pkgName = self.name()
         initFile = self._initPath(self.path())
@@ -943,14 +1289,19 @@ class Package(SObject):
 
     def unloadSObjects(self):
         "Unload the metaclasses from this package, and SObject found from sys.modules, leaving this package object empty."
-        self.log(f"Unloading SObjects from '{self.name()}'", Logger.LevelInfo)
+        self.log("Unloading SObjects from '{}'", Logger.LevelInfo, self.name())
+        metanames = self.metaclassNames()
         self.metaclasses(Map())
+        self._set('ss_lazyIndex', {})
+        context = self.getValue('context')
+        if context.notNil(): context.reindexMetaclasses(metanames)
+        Metaclass.invalidateHolders()
         # self.getContext().removePackage(self.name())
 
         ssmodules = [key for key in sys.modules.keys() if key.startswith(self.name())]
         for ss in ssmodules:
             if ss in sys.modules:
-                self.log(f"sys.modules['{ss}'] deleted.", Logger.LevelInfo)
+                self.log("sys.modules['{}'] deleted.", Logger.LevelInfo, ss)
                 del sys.modules[ss]
         return self
 
@@ -961,7 +1312,7 @@ class Package(SObject):
 
     def refreshSources(self, forced=false_):
         "Generate the .py sources from updated .ss sources."
-        self.log(f"Refreshing SmallScript package '{self.name()}'.", Logger.LevelInfo)
+        self.log("Refreshing SmallScript package '{}'.", Logger.LevelInfo, self.name())
         ssnames = self.listFilenames("*.ss")
         for name in ssnames:
             sspath = Path(self.path()) / f"{name}.ss"
@@ -971,11 +1322,11 @@ class Package(SObject):
                 pymtime = pypath.stat().st_mtime
                 if ssmtime < pymtime and not forced:   # ss has not been modified since last compilation.
                     return self
-            self.log(f"Generate {name}.py by running {name}.ss.", Logger.LevelInfo)
+            self.log("Generate {0}.py by running {0}.ss.", Logger.LevelInfo, name)
             closure = self.getContext().newInstance('Closure')
             txt = self.readFile(sspath)
             closure.compile(txt)
-            scope = self.getContext().createScope().setValue('package', self)
+            scope = self.getContext().newScope(globals()).setValue('package', self)
             res = closure(scope)
             txt = res.asString()
             self.writeFile(pypath, txt)
@@ -983,7 +1334,7 @@ class Package(SObject):
 
     def load(self, forced=false_):
         "Load SObjects from sources. Regenerate py sources if necessary."
-        self.log(f"Loading SmallScript package '{self.name()}'.", Logger.LevelInfo)
+        self.log("Loading SmallScript package '{}'.", Logger.LevelInfo, self.name())
         self.unloadSObjects();
         self.refreshSources(forced);
         return self.loadSObjects()
@@ -1019,8 +1370,7 @@ class Package(SObject):
             try:
                 output = path.read_text()
             except Exception as e:
-                stackTrace = traceback.format_exc()
-                self.log(f"Read '{path}' error: {stackTrace}", Logger.LevelWarning)
+                self.log(lambda: f"Read '{path}' error: {traceback.format_exc()}", Logger.LevelWarning, path=str(path))
         return String(output)
 
     def writeFile(self, pathname, text):
@@ -1028,8 +1378,7 @@ class Package(SObject):
         try:
             path.write_text(text)
         except Exception as e:
-            stackTrace = traceback.format_exc()
-            self.log(f"Write '{path}' error: {stackTrace}", Logger.LevelWarning)
+            self.log(lambda: f"Write '{path}' error: {traceback.format_exc()}", Logger.LevelWarning, path=str(path))
             return nil
         return self
 
@@ -1038,8 +1387,7 @@ class Package(SObject):
         try:
             path.unlink()
         except Exception as e:
-            stackTrace = traceback.format_exc()
-            self.log(f"Delete '{path}' error: {stackTrace}", Logger.LevelWarning)
+            self.log(lambda: f"Delete '{path}' error: {traceback.format_exc()}", Logger.LevelWarning, path=str(path))
             return nil
         return self
 
@@ -1054,6 +1402,9 @@ class Context(SObject):
     """
     packages = Holder().name('packages').type('Map')
     rootScope = Holder().name('rootScope').type('Scope')
+    scriptCache = Holder().name('scriptCache').type('ScriptCache')
+    codeCache = Holder().name('codeCache').type('CodeCache')
+    scopeFromFrames = Holder().name('scopeFromFrames').type('False_')   # compatibility: Execution looks for @scope in Python frames
     FirstArg = Holder().name('FirstArg').type('String').asClassType()
 
     @Holder().asClassType()
@@ -1062,10 +1413,15 @@ class Context(SObject):
         self.FirstArg('scope')
         return self
 
-    def loadPackage(self, pkgname):
-        "Load metaclasses from a SObject package."
+    def tierThreshold(self, threshold=''): return self._getOrSet('tierThreshold', threshold, 100)  # calls before a tiered closure is compiled
+
+    def loadPackage(self, pkgname, lazy=false_):
+        "Load metaclasses from a SObject package. If @lazy, modules are imported on first lookup of their metaclasses."
         pkg = self.getOrNewPackage(pkgname)
-        if pkg.isEmpty(): pkg._loadSObjects()
+        if pkg.isEmpty():
+            with profiling('package', pkgname):
+                if lazy: pkg.indexSObjects()
+                else: pkg._loadSObjects()
         return pkg
 
     def getOrNewPackage(self, pkgname):
@@ -1077,28 +1433,61 @@ class Context(SObject):
             return pkgs[pkgname]
         pkg = Package().name(pkgname).context(self)
         pkgs[pkg.name()] = pkg
+        self.reindexMetaclasses(pkg.metaclassNames())
         return pkg
 
     def metaclassByName(self, metaname):
         "Find metaclass in last-in-first-out by name. Later package can override earlier package to allow deferred implementation."
-        pkgs = self.getValue('packages', Map())
-        res = nil
-        for pkg in pkgs.values()[::-1]:
-            metaclass = pkg.metaclassByName(metaname)
-            if metaclass.notNil():
-                res = metaclass
-                break
-        return res
+        return self._metaclassEntry(metaname)[0]
 
     def packageByMetaname(self, metaname):
         "Find the containing package for a metaclass name."
-        res = nil
-        for pkg in self.packages().values()[::-1]:
+        return self._metaclassEntry(metaname)[1]
+
+    #### Metaclass index: metaname -> (metaclass, package), including misses as (nil, nil).
+    def _metaclassIndex(self):
+        index = self._get('ss_metaclassIndex', None)
+        if index is None:
+            index = {}
+            self._set('ss_metaclassIndex', index)
+            self._set('ss_metaclassIndexStats', [0, 0])
+        return index
+
+    def _metaclassEntry(self, metaname):
+        index = self._metaclassIndex()
+        entry = index.get(metaname)
+        stats = self._get('ss_metaclassIndexStats', None)
+        if entry is None:
+            stats[1] += 1
+            entry = self._scanPackages(metaname)
+            index[metaname] = entry
+        else:
+            stats[0] += 1
+        return entry
+
+    def _scanPackages(self, metaname):
+        pkgs = self.getValue('packages', Map())
+        for pkg in pkgs.values()[::-1]:
             metaclass = pkg.metaclassByName(metaname)
             if metaclass.notNil():
-                res = pkg
-                break
-        return res
+                return (metaclass, pkg)
+        return (nil, nil)
+
+    def reindexMetaclasses(self, metanames=None):
+        "Refresh the metaclass index for @metanames, or rebuild the whole index if not given."
+        index = self._metaclassIndex()
+        if metanames is None:
+            index.clear()
+            return self
+        for metaname in metanames:
+            index[metaname] = self._scanPackages(metaname)
+        return self
+
+    def metaclassIndexStats(self):
+        "Return hits, misses and size of the metaclass index."
+        index = self._metaclassIndex()
+        hits, misses = self._get('ss_metaclassIndexStats', None)
+        return Map(hits=hits, misses=misses, size=len(index))
 
     def asSObj(self, pyobj):
         "Overriden SObject.asSObj() to injects ssrun() into pyobj"
@@ -1130,13 +1519,48 @@ class Context(SObject):
         return instance
 
     def reset(self):
-        self.setValue('packages', Map())  # Reset all packages
+        with profiling('context', self.name()):
+            self.setValue('packages', Map())  # Reset all packages
+            self.delValue('scriptCache')
+            self.reindexMetaclasses()
+            Metaclass.invalidateHolders()
         return self
 
-    def createScope(self):
+    def profileStartup(self, enable=true_):
+        "Start recording startup costs of package loading into a new StartupProfiler, or stop if not @enable."
+        global _startupProfiler
+        _startupProfiler = StartupProfiler() if enable else None
+        return _startupProfiler if enable else nil
+
+    def startupProfiler(self): return nil if _startupProfiler is None else _startupProfiler
+
+    def instrumentation(self):
+        "Execution hooks e.g. closure enter/exit, interpreted steps and sends, see Instrumentation."
+        instrumentation = self._get('ss_instrumentation', None)
+        if instrumentation is None:
+            from smallscript.Closure import Instrumentation
+            instrumentation = Instrumentation()
+            self._set('ss_instrumentation', instrumentation)
+        return instrumentation
+
+    def snapshot(self, path):
+        "Save the loaded packages to @path, for restore() to skip loading them e.g. in worker processes."
+        from smallscript.Snapshot import ContextSnapshot
+        ContextSnapshot().save(self, path)
+        return self
+
+    def restore(self, path):
+        "Replace the packages by the ones saved in @path by snapshot(). Return nil if not restored."
+        from smallscript.Snapshot import ContextSnapshot
+        with profiling('restore', path):
+            res = ContextSnapshot().load(self, path)
+        return nil if res is nil else self
+
+    def newScope(self, pyglobals=nil, pylocals=nil):
+        "Create a scope under the root scope, optionally looking up names from Python @pyglobals and @pylocals dictionaries."
         from smallscript.core.PythonExt import PyGlobals
         rootScope = self.rootScope()
-        if not rootScope.locals().hasKey('root'):
+        if not rootScope.hasKey('root'):
             rootScope.name('rootScope')
             rootScope['true'] = true_
             rootScope['false'] = false_
@@ -1148,16 +1572,24 @@ class Context(SObject):
         scope = Scope()
         scope.setValue('scope', scope)
         scope.parent(rootScope)
-
-        # Add calling locals & globals into scope object. Looks like they are snapshots.
-        frame = inspect.currentframe()
-        outer_frame = frame.f_back
-        pyscope = PyGlobals().name("pyglobals").locals(outer_frame.f_globals)
-        scope.addScope(pyscope)
-        pyscope = PyGlobals().name("pylocals").locals(outer_frame.f_locals)
-        scope.addScope(pyscope)
+        if pyglobals is not nil:
+            scope.addScope(PyGlobals().name("pyglobals").locals(pyglobals))
+        if pylocals is not nil:
+            scope.addScope(PyGlobals().name("pylocals").locals(pylocals))
         return scope
 
+    def createScope(self):
+        "Create a scope for the calling Python code, with snapshots of its globals and locals."
+        caller = sys._getframe(1)
+        return self.newScope(caller.f_globals, caller.f_locals)
+
+    def scriptCacheStats(self):
+        "Return hits, misses, evictions and size of the interpreted script cache."
+        cache = self.scriptCache()
+        stats = Map(cache.stats())
+        stats['size'] = len(cache.entries())
+        return stats
+
     def interpret(self, smallscript):
         closure = self.newInstance('Closure')
         closure.interpret(smallscript)
@@ -1170,15 +1602,45 @@ class Context(SObject):
         if closure.script().hasError(): return nil
         return closure
 
+    def tiered(self, smallscript, threshold=nil):
+        "Interpret @smallscript first, compile it in the background once called @threshold times."
+        closure = self.interpret(smallscript)
+        if closure is nil: return nil
+        return closure.tiered(threshold)
+
+_classAttrsCache = {}   # Python class -> (holderVersion, class attrs), for sobjects without their own metaclass
+
+def _classAttrs(sobj):
+    "Class attrs of @sobj. The metaclass found by Python class is cached until Metaclass.invalidateHolders()."
+    if 'ss_metaclass' in sobj.__dict__ or 'ss_metaname' in sobj.__dict__: return sobj.metaclass().attrs()
+    cached = _classAttrsCache.get(type(sobj))
+    if cached is None or cached[0] != Metaclass.holderVersion:
+        cached = (Metaclass.holderVersion, sobj.metaclass().attrs())
+        _classAttrsCache[type(sobj)] = cached
+    return cached[1]
+
+class Resolution(list):
+    "Cache of a variable reference for Scope.resolve(), not kept when pickled or copied."
+    def __init__(self): super().__init__((None,))
+    def __reduce__(self): return (Resolution, ())
+
 class Scope(SObject):
     """
     Scope object defines the variable lookup.
     """
+    shapeVersion = 0    # bumped when a parent scope may change its names, expires all resolve() caches.
+    transients = ('ss_activations',)   # block activations under this scope, see Closure.value()
+
     #### Attributes that can't use Holder as Scope overridden major protocols.
-    def locals(self, locals=''): return self._getOrSetDefault('locals', 'Map', locals)
-    def scopes(self, scopes=''): return self._getOrSetDefault('scopes', 'List', scopes)
-    def objs(self, objs=''):  return self._getOrSetDefault('objs', 'List', objs)
-    def parent(self, parent=''):  return self._getOrSet('parent', parent, nil)
+    # locals, scopes and objs reshape a parent scope when they add or remove names, not when they are read.
+    def locals(self, locals=''): return self._names('ss_locals', ScopeLocals, locals)
+    def scopes(self, scopes=''): return self._names('ss_scopes', ScopeList, scopes)
+    def objs(self, objs=''):  return self._names('ss_objs', ScopeList, objs)
+    def parent(self, parent=''):
+        if parent != '':
+            self._reshaped()
+            if isinstance(parent, Scope): parent._set('ss_isParent', True)
+        return self._getOrSet('parent', parent, nil)
     def context(self, context=''): return self._getOrSet('context', context, nil)
 
     #### Add scopes, objs, and locals
@@ -1202,7 +1664,7 @@ class Scope(SObject):
 
     def hasKey(self, attname):
         # if super().hasKey('masquerade'): return super().hasKey(attname)
-        return self.locals().hasKey(attname)
+        return attname in self._get('ss_locals', ())
 
     def delValue(self, attname):
         # if super().hasKey('masquerade'): return super().delValue(attname)
@@ -1217,6 +1679,10 @@ class Scope(SObject):
         # return self.locals().getValue(attname, default)
 
     def setValue(self, attname, value):
+        locals = self._get('ss_locals', None)
+        if locals is not None and attname in locals:    # e.g. params of a reused block activation
+            dict.__setitem__(locals, attname, self.asSObj(value))
+            return self
         ref = self.lookup(attname)
         if ref == undefined:
             self.locals().setValue(attname, self.asSObj(value))
@@ -1236,28 +1702,83 @@ class Scope(SObject):
 
     def lookup(self, key, default=undefined):
         "Return a sobject contains the @key from self, scopes and parent scope."
-        # if self.hasKey(key): return self
-        if self.locals().hasKey(key): return self.locals()
-        classAttrs = self.metaclass().attrs()
+        obj, defined = self._walk(key, None)
+        return default if obj is None else obj
+
+    def resolve(self, key, resolution):
+        """
+        lookup() @key for a variable reference that keeps its @resolution from the parent scope. It is reused until
+        the parent scopes are reshaped, the sobjects passed by are checked again as their attributes are dynamic.
+        """
+        obj = self._definer(key, None)
+        if obj is not None: return obj
+        parent = self._get('ss_parent', nil)
+        if not isinstance(parent, Scope): return self.lookup(key)
+        cached = resolution[0]
+        if cached is not None and cached[0] is parent and cached[1] == Scope.shapeVersion \
+                and cached[2] == Metaclass.holderVersion and cached[4].hasKey(key):
+            for guard in cached[3]:
+                if guard.hasKey(key): break
+            else:
+                return cached[4]
+        guards = {}
+        obj, defined = parent._walk(key, guards)
+        if defined:
+            resolution[0] = (parent, Scope.shapeVersion, Metaclass.holderVersion, tuple(guards.values()), obj)
+            return obj
+        if obj is not None: return obj
+        for scope in self._get('ss_scopes', ()):
+            if scope.hasKey(key): return scope
+        return undefined
+
+    def _walk(self, key, guards):
+        "Lookup @key, return (sobject, defined) where defined is True if found in locals, class attrs or objs."
+        levels = []
+        scope = self
+        while isinstance(scope, Scope):
+            obj = scope._definer(key, guards)
+            if obj is not None: return obj, True
+            levels.append(scope)
+            scope = scope._get('ss_parent', nil)
+        for scope in reversed(levels):      # scopes are searched after all the parents, from the root
+            for pyscope in scope._get('ss_scopes', ()):
+                if pyscope.hasKey(key): return pyscope, False
+            if scope is scope.getContext().rootScope():
+                # If this is a rootScope(), try to find it as Metaclass name.
+                pkg = scope.getContext().packageByMetaname(key)
+                if pkg.notNil(): return pkg.metaclasses(), False
+        return None, False
+
+    def _definer(self, key, guards):
+        "Return the sobject of this scope level contains @key: locals, class attrs or objs. Add the others to @guards."
+        locals = self._get('ss_locals', None)
+        if locals is not None and key in locals: return locals
+        classAttrs = _classAttrs(self)
         if classAttrs.hasKey(key): return classAttrs
-        for obj in self.objs():
+        if guards is not None: guards[id(classAttrs)] = classAttrs
+        for obj in self._get('ss_objs', ()):
             if obj.hasKey(key): return obj
-            classAttrs = obj.metaclass().attrs()
+            classAttrs = _classAttrs(obj)
             if classAttrs.hasKey(key): return classAttrs
-        obj = self.parent()
-        while obj.notNil():
-            # if obj.hasKey(key): return obj
-            # if obj.locals().hasKey(key): return obj
-            obj1 = obj.lookup(key, undefined)
-            if obj1 != undefined: return obj1
-            obj = obj.parent()
-        for scope in self.scopes():
-            if scope.hasKey(key): return scope
-        if self == self.getContext().rootScope():
-            # If this is a rootScope(), try to find it as Metaclass name.
-            pkg = self.getContext().packageByMetaname(key)
-            if pkg.notNil(): return pkg.metaclasses()
-        return default
+            if guards is not None:
+                guards[id(obj)] = obj
+                guards[id(classAttrs)] = classAttrs
+        return None
+
+    def _reshaped(self):
+        "Expire resolve() caches if this scope is a parent, its names may change."
+        if self._get('ss_isParent', False): Scope.shapeVersion += 1
+        return self
+
+    def _names(self, keyname, defaultType, value):
+        if value != '':
+            self._reshaped()
+            return self._set(keyname, value)
+        names = self._get(keyname, None)
+        if names is None:
+            names = defaultType()._set('ss_scope', self)
+            self._set(keyname, names)
+        return names
 
     #### Helpers
     def info(self, offset=0):
@@ -1278,7 +1799,45 @@ class Scope(SObject):
         output = buffer.getvalue()
         return String(output)
 
+class ScopeLocals(Map):
+    "Locals of a Scope, adding or removing a name reshapes the scope i.e. expires resolve() caches if it is a parent."
+    def _reshape(self):
+        scope = self._get('ss_scope', None)
+        if scope is not None: scope._reshaped()
+
+    def __setitem__(self, key, value):
+        if key not in self: self._reshape()
+        dict.__setitem__(self, key, value)
+
+    def setdefault(self, key, default=None):
+        if key not in self: self._reshape()
+        return dict.setdefault(self, key, default)
+
+    def __delitem__(self, key): self._reshape(); dict.__delitem__(self, key)
+    def pop(self, *args): self._reshape(); return dict.pop(self, *args)
+    def popitem(self): self._reshape(); return dict.popitem(self)
+    def clear(self): self._reshape(); dict.clear(self)
+    def update(self, *args, **kwargs): self._reshape(); dict.update(self, *args, **kwargs)
+    def __ior__(self, other): self.update(other); return self
+
+class ScopeList(List):
+    "Scopes or objs of a Scope, changing them reshapes the scope i.e. expires resolve() caches if it is a parent."
+    def _reshape(self):
+        scope = self._get('ss_scope', None)
+        if scope is not None: scope._reshaped()
+
+    def append(self, obj): self._reshape(); return super().append(obj)
+    def insert(self, index, obj): self._reshape(); list.insert(self, index, obj)
+    def extend(self, objs): self._reshape(); list.extend(self, objs)
+    def remove(self, obj): self._reshape(); list.remove(self, obj)
+    def pop(self, *args): self._reshape(); return list.pop(self, *args)
+    def clear(self): self._reshape(); list.clear(self)
+    def __setitem__(self, index, obj): self._reshape(); list.__setitem__(self, index, obj)
+    def __delitem__(self, index): self._reshape(); list.__delitem__(self, index)
+    def __iadd__(self, objs): self.extend(objs); return self
+
 class Number(Primitive):
+    "Lazy SObject wrapper of an Integer or Float, its arithmetic answers the canonical Integer or Float."
     def value(self, value=''):
         if value != '' and not isinstance(value, SObject):
             if isinstance(value, int):
@@ -1308,96 +1867,52 @@ class Number(Primitive):
 
     def __floordiv__(self, val):
         if isinstance(val, Number): val = val.value()
-        if isinstance(val, Float):
-            res = val // self.value()
-        else:
-            res = self.value() // val
-        return res
+        return self.value() // val
 
     def __add__(self, val):
         if isinstance(val, Number): val = val.value()
-        if isinstance(val, Float):
-            res = val + self.value()
-        else:
-            res = self.value() + val
-        return res
+        return self.value() + val
 
-    def __radd__(self, val): return self.__add__(val)
-    def __rsub__(self, val): return self.__sub__(val)
-    def __rmul__(self, val): return self.__mul__(val)
-    def __rtruediv__(self, val): return self.__truediv__(val)
+    def __radd__(self, val): return val + self.value()
+    def __rsub__(self, val): return val - self.value()
+    def __rmul__(self, val): return val * self.value()
+    def __rtruediv__(self, val): return val / self.value()
 
     def __mul__(self, val):
         if isinstance(val, Number): val = val.value()
-        if isinstance(val, Float):
-            res = val * self.value()
-        else:
-            res = self.value() * val
-        return res
+        return self.value() * val
 
     def __truediv__(self, val):
         if isinstance(val, Number): val = val.value()
-        if isinstance(val, Float):
-            res = val / self.value()
-        else:
-            res = self.value() / val
-        return res
+        return self.value() / val
 
     def __eq__(self, val):
         if isinstance(val, Number): val = val.value()
-        if isinstance(val, Float):
-            res = val == self.value()
-        else:
-            res = self.value() == val
-        return res
+        return self.value() == val
 
     def __gt__(self, val):
         if isinstance(val, Number): val = val.value()
-        if isinstance(val, Float):
-            res = val <= self.value()
-        else:
-            res = self.value() > val
-        return res
+        return self.value() > val
 
     def __lt__(self, val):
         if isinstance(val, Number): val = val.value()
-        if isinstance(val, Float):
-            res = val >= self.value()
-        else:
-            res = self.value() < val
-        return res
+        return self.value() < val
 
     def __ge__(self, val):
         if isinstance(val, Number): val = val.value()
-        if isinstance(val, Float):
-            res = val < self.value()
-        else:
-            res = self.value() >= val
-        return res
+        return self.value() >= val
 
     def __le__(self, val):
         if isinstance(val, Number): val = val.value()
-        if isinstance(val, Float):
-            res = val > self.value()
-        else:
-            res = self.value() <= val
-        return res
+        return self.value() <= val
 
     def __mod__(self, val):
         if isinstance(val, Number): val = val.value()
-        if isinstance(val, Float):
-            res = val % self.value()
-        else:
-            res = self.value() % val
-        return res
+        return self.value() % val
 
     def __sub__(self, val):
         if isinstance(val, Number): val = val.value()
-        if isinstance(val, Float):
-            res = val - self.value()
-        else:
-            res = self.value() - val
-        return res
+        return self.value() - val
 
     def fromString(self, string):
         number = Number()
@@ -1417,135 +1932,199 @@ class Number(Primitive):
     def toString(self): return String(self.value())
     def __repr__(self): return self.toString()
 
+def asNumeric(res):
+    "Canonical Integer or Float of a Python arithmetic result, other results e.g. NotImplemented as they are."
+    rtype = type(res)
+    if rtype is int: return Integer(res)
+    if rtype is float: return Float(res)
+    return res
+
 class Integer(int, Primitive):
+    """Canonical SmallScript integer, arithmetic answers Integer or Float without a Number wrapper."""
     def __new__(cls, number = 0): return super(Integer, cls).__new__(cls, number)
-    def __init__(self, value = 0): SObject.__init__(self)
+    def __init__(self, value = 0): pass
 
     def __floordiv__(self, val):
         if isinstance(val, Number): val = val.value()
-        res = super().__floordiv__(val)
-        return Number().value(res)
+        return asNumeric(int(self) // val)
 
     def __add__(self, val):
         if isinstance(val, Number): val = val.value()
-        res = super().__add__(val)
-        return Number().value(res)
+        return asNumeric(int(self) + val)
 
     def __mul__(self, val):
         if isinstance(val, Number): val = val.value()
-        res = super().__mul__(val)
-        return Number().value(res)
+        return asNumeric(int(self) * val)
 
     def __truediv__(self, val):
         if isinstance(val, Number): val = val.value()
-        res = super().__truediv__(val)
-        return Number().value(res)
+        return asNumeric(int(self) / val)
 
-    def __eq__(self, val):
+    def __mod__(self, val):
         if isinstance(val, Number): val = val.value()
-        res = super().__eq__(val)
-        return res
+        return asNumeric(int(self) % val)
 
-    def __gt__(self, val):
+    def __sub__(self, val):
         if isinstance(val, Number): val = val.value()
-        res = super().__gt__(val)
-        return res
+        return asNumeric(int(self) - val)
 
-    def __lt__(self, val):
+    def __radd__(self, val): return asNumeric(int.__radd__(self, val))
+    def __rsub__(self, val): return asNumeric(int.__rsub__(self, val))
+    def __rmul__(self, val): return asNumeric(int.__rmul__(self, val))
+    def __rtruediv__(self, val): return asNumeric(int.__rtruediv__(self, val))
+    def __neg__(self): return Integer(-int(self))
+
+    def __eq__(self, val):
         if isinstance(val, Number): val = val.value()
-        res = super().__lt__(val)
-        return res
+        return int(self) == val
 
-    def __mod__(self, val):
+    def __gt__(self, val):
         if isinstance(val, Number): val = val.value()
-        res = super().__mod__(val)
-        return Number().value(res)
+        return int(self) > val
 
-    def __sub__(self, val):
+    def __lt__(self, val):
         if isinstance(val, Number): val = val.value()
-        res = super().__sub__(val)
-        return Number().value(res)
+        return int(self) < val
 
-    def __hash__(self): return super().__hash__()
+    def __hash__(self): return int.__hash__(self)
+    def value(self, value=''): return self
     def asSObj(self, pyobj): return Integer(pyobj)
+    def asNumber(self): return self
+    def asFloat(self): return float(self)
+    def asInt(self): return int(self)
+    def toString(self): return String(f"{self}")
     def asString(self): return String(f"{self}")
+    def visit(self, visitor): return visitor.visitNumber(self)
     def describe(self): return String(f"{self} {hex(self)}")
 
 class Float(float, Primitive):
+    """Canonical SmallScript float, arithmetic answers Float without a Number wrapper."""
     def __new__(cls, number = 0): return super(Float, cls).__new__(cls, number)
-    def __init__(self, value = 0): SObject.__init__(self)
+    def __init__(self, value = 0): pass
 
     def __floordiv__(self, val):
         if isinstance(val, Number): val = val.value()
-        res = super().__floordiv__(val)
-        return Number().value(res)
+        return asNumeric(float.__floordiv__(self, val))
 
     def __add__(self, val):
         if isinstance(val, Number): val = val.value()
-        res = super().__add__(val)
-        return Number().value(res)
+        return asNumeric(float.__add__(self, val))
 
     def __mul__(self, val):
         if isinstance(val, Number): val = val.value()
-        res = super().__mul__(val)
-        return Number().value(res)
+        return asNumeric(float.__mul__(self, val))
 
     def __truediv__(self, val):
         if isinstance(val, Number): val = val.value()
-        res = super().__truediv__(val)
-        return Number().value(res)
+        return asNumeric(float.__truediv__(self, val))
 
-    def __eq__(self, val):
+    def __mod__(self, val):
         if isinstance(val, Number): val = val.value()
-        res = super().__eq__(val)
-        return res
+        return asNumeric(float.__mod__(self, val))
 
-    def __gt__(self, val):
+    def __sub__(self, val):
         if isinstance(val, Number): val = val.value()
-        res = super().__gt__(val)
-        return res
+        return asNumeric(float.__sub__(self, val))
 
-    def __lt__(self, val):
+    def __radd__(self, val): return asNumeric(float.__radd__(self, val))
+    def __rsub__(self, val): return asNumeric(float.__rsub__(self, val))
+    def __rmul__(self, val): return asNumeric(float.__rmul__(self, val))
+    def __rtruediv__(self, val): return asNumeric(float.__rtruediv__(self, val))
+    def __neg__(self): return Float(-float(self))
+
+    def __eq__(self, val):
         if isinstance(val, Number): val = val.value()
-        res = super().__lt__(val)
-        return res
+        return float.__eq__(self, val)
 
-    def __mod__(self, val):
+    def __gt__(self, val):
         if isinstance(val, Number): val = val.value()
-        res = super().__mod__(val)
-        return Number().value(res)
+        return float.__gt__(self, val)
 
-    def __sub__(self, val):
+    def __lt__(self, val):
         if isinstance(val, Number): val = val.value()
-        res = super().__sub__(val)
-        return Number().value(res)
+        return float.__lt__(self, val)
 
-    def __hash__(self): return super().__hash__()
+    def __hash__(self): return float.__hash__(self)
 
+    def value(self, value=''): return self
     def asSObj(self, pyobj): return Float(pyobj)
+    def asNumber(self): return self
+    def asFloat(self): return float(self)
+    def asInt(self): return int(self)
+    def toString(self): return String(f"{self}")
     def asString(self): return String(f"{self}")
+    def visit(self, visitor): return visitor.visitNumber(self)
     def describe(self): return f"{self}f"
 
 class Logger(SObject):
+    """
+    Logger of a metaclass. Filtered levels cost a level check, the message and its caller are resolved after it.
+    Logged records are also kept as structured events e.g. for machine consumption, see events().
+    """
     LevelDebug = 0; LevelInfo = 1; LevelWarning = 2; LevelError = 3; LevelCritical = 4
+    pyLevels = (logging.DEBUG, logging.INFO, logging.WARNING, logging.ERROR, logging.CRITICAL)
     level = Holder().name('level').type('Integer')
-
-    def log(self, msg, level=0):
-        frame = inspect.currentframe().f_back.f_back
-        if frame is not None:
-            filename = frame.f_code.co_filename
-            lineno = frame.f_lineno
-            msg = f"{msg} - {filename} line {lineno}"
-
-        if level >= self.level():
-            if level == self.LevelDebug: logger.debug(msg); return self
-            if level == self.LevelInfo: logger.info(msg); return self
-            if level == self.LevelWarning: logger.warning(msg); return self
-            if level == self.LevelError: logger.error(msg); return self
-            if level == self.LevelCritical: logger.critical(msg); return self
+    eventLog = collections.deque(maxlen=1000)   # recent events of all loggers
+
+    def log(self, msg, level=0, *args, **fields):
+        pyLevel = self.pyLevels[level]
+        if not logger.isEnabledFor(pyLevel) or level < self.level(): return self
+        if callable(msg): msg = msg()
+        elif args: msg = msg.format(*args)
+        frame = sys._getframe(2)
+        filename, lineno = frame.f_code.co_filename, frame.f_lineno
+        event = dict(time=time.time(), level=level, msg=str(msg), filename=filename, lineno=lineno, **fields)
+        Logger.eventLog.append(event)
+        logger.log(pyLevel, f"{msg} - {filename} line {lineno}", extra={'ssEvent': event})
         return self
 
-pytypes = Map(str = String, int = Number, float = Number, dict = Map, list = List)
+    @classmethod
+    def events(cls, level=0):
+        "Recent structured events at @level or above, oldest first."
+        return List([Map(event) for event in cls.eventLog if event['level'] >= level])
 
+class StartupProfiler(SObject):
+    """
+    Wall time and allocated memory blocks of startup steps e.g. package loading, module imports, importFrom() and
+    metaInit per metaclass. Times are inclusive, a package load includes its module imports.
+    """
+    def __init__(self):
+        super().__init__()
+        self._set('ss_records', {})
+
+    def records(self): return self._get('ss_records', None)    # (kind, name) -> [calls, seconds, blocks]
+
+    @contextlib.contextmanager
+    def measure(self, kind, name):
+        blocks = sys.getallocatedblocks()
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            elapsed = time.perf_counter() - start
+            record = self.records().setdefault((kind, str(name)), [0, 0.0, 0])
+            record[0] += 1
+            record[1] += elapsed
+            record[2] += sys.getallocatedblocks() - blocks
+
+    def report(self, limit=0):
+        "Report lines sorted by wall time, the slowest first."
+        rows = sorted(self.records().items(), key=lambda item: item[1][1], reverse=True)
+        if limit: rows = rows[:limit]
+        lines = List().append(String(f"{'kind':<14}{'name':<40}{'calls':>6}{'ms':>10}{'blocks':>10}"))
+        for (kind, name), (calls, seconds, blocks) in rows:
+            lines.append(String(f"{kind:<14}{name:<40}{calls:>6}{seconds * 1000:>10.3f}{blocks:>10}"))
+        return lines
+
+def profiling(kind, name):
+    "Measure a startup step if the startup profiler is on."
+    if _startupProfiler is None: return contextlib.nullcontext()
+    return _startupProfiler.measure(kind, name)
+
+pytypes = Map(str = String, int = Integer, float = Float, dict = Map, list = List, ndarray = Vector)
+
+if os.environ.get('SS_PROFILE_STARTUP'): _startupProfiler = StartupProfiler()
 sscontext = Context().name('sscontext').reset()
-sscontext.loadPackage('smallscript') # This global root context is the first Context object got created.
\ No newline at end of file
+if not os.environ.get('SS_CONTEXT_SNAPSHOT') or sscontext.restore(os.environ['SS_CONTEXT_SNAPSHOT']) is nil:
+    sscontext.loadPackage('smallscript') # This global root context is the first Context object got created.
+if os.environ.get('SS_PROFILE_STARTUP'): print("\n".join(_startupProfiler.report()), file=sys.stderr)
@@ -0,0 +1,182 @@
+# coding=utf-8
+# Copyright 2024 Vital Star Foundation. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import types
+import pickle
+import marshal
+import tempfile
+import importlib
+
+from smallscript.SObject import *
+from smallscript.SObject import Metaclass
+
+def _liveHolder(module, qualname, attname, state):
+    "Reconnect to the Holder defined in the live Python class, with its loaded state."
+    holder = vars(_liveClass(module, qualname))[attname]
+    holder.__dict__.update(state)
+    return holder
+
+def _liveClass(module, qualname):
+    obj = importlib.import_module(module)
+    for name in qualname.split('.'): obj = getattr(obj, name)
+    return obj
+
+def _identity(obj): return obj
+
+def _newSObject(sClass): return sClass.__new__(sClass)
+
+def _setState(sobj, state):
+    "Set pickled state directly, as SObject and visitors answer any missing attribute e.g. __setstate__."
+    sobj.__dict__.update(state)
+    return sobj
+
+def _codeFunction(code, name):
+    "Rebuild a compiled closure function from its module code, like CodeCache."
+    namespace = {}
+    exec(marshal.loads(code), namespace)
+    return namespace[name]
+
+class SnapshotPickler(pickle.Pickler):
+    """
+    Pickle packages, keeping singletons and the context by identity and live classes, holders and functions by name.
+    Class holders are shared by contexts, so other contexts, their packages and metaclasses may be reached e.g. through
+    holder methods. The pickler stops there: other contexts are saved as the context, packages and metaclasses as
+    the ones of the same name in the context, nil if none.
+    """
+    def __init__(self, file, context, pycodes):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.context = context
+        self.ids = {id(nil): 'nil', id(true_): 'true', id(false_): 'false', id(undefined): 'undefined', id(context): 'context'}
+        self.holders = {}       # id(holder) -> (module, qualname, attname)
+        self.pyfuncs = {}       # id(pyfunc) -> (module, qualname, attname) of its holder
+        self.pycodes = pycodes  # id(pyfunc) -> (marshalled module code, function name) of compiled closures
+        self.owned = set()      # id() of the packages and metaclasses of context
+        for package in context.packages().values():
+            self.owned.add(id(package))
+            for metaclass in package.metaclasses().values():
+                self.owned.add(id(metaclass))
+                self._indexClass(type(metaclass.factory()))
+
+    def _indexClass(self, sClass):
+        for attname, item in vars(sClass).items():
+            if isinstance(item, Holder):
+                self.holders[id(item)] = (sClass.__module__, sClass.__qualname__, attname)
+                if item.pyfunc() is not nil:
+                    self.pyfuncs[id(item.pyfunc())] = (sClass.__module__, sClass.__qualname__, attname)
+        return self
+
+    def persistent_id(self, obj):
+        if id(obj) in self.ids: return self.ids[id(obj)]
+        if id(obj) in self.pyfuncs: return ('pyfunc',) + self.pyfuncs[id(obj)]
+        if isinstance(obj, types.FunctionType) and id(obj) not in self.pycodes: return self._holderFunction(obj)
+        if isinstance(obj, Context): return 'context'
+        return None
+
+    def _holderFunction(self, func):
+        "Holder method by reference, also when stale after its module was reloaded e.g. by another context."
+        owner, _, attname = func.__qualname__.rpartition('.')
+        if not owner or '<locals>' in owner: return None
+        try:
+            holder = vars(_liveClass(func.__module__, owner)).get(attname)
+        except Exception:
+            return None
+        if not isinstance(holder, Holder) or holder.pyfunc() is nil: return None
+        return ('pyfunc', func.__module__, owner, attname)
+
+    def _ownedPeer(self, obj):
+        "Package or metaclass of the same name in the context, for @obj owned by another context."
+        if isinstance(obj, Package):
+            return self.context.packages().get(obj.name(), nil)
+        package = obj.getValue('package')
+        if not isinstance(package, Package): return nil
+        peer = self.context.packages().get(package.name(), nil)
+        return nil if peer is nil else peer.metaclasses().get(obj.name(), nil)
+
+    def reducer_override(self, obj):
+        if isinstance(obj, (Package, Metaclass)) and id(obj) not in self.owned:
+            return (_identity, (self._ownedPeer(obj),))
+        if isinstance(obj, Holder) and id(obj) in self.holders:
+            state = {key: value for key, value in obj.__dict__.items() if key != 'ss_pyfunc'}
+            return (_liveHolder, self.holders[id(obj)] + (state,))
+        if id(obj) in self.pycodes:
+            return (_codeFunction, self.pycodes[id(obj)])
+        if isinstance(obj, types.CodeType):
+            return (marshal.loads, (marshal.dumps(obj),))
+        if isinstance(obj, SObject) and not isinstance(obj, (list, dict, str, int, float)):
+            transients = getattr(type(obj), 'transients', ())
+            attrs = {key: value for key, value in obj.__dict__.items() if key not in transients} if transients else obj.__dict__
+            return (_newSObject, (type(obj),), attrs, None, None, _setState)
+        return NotImplemented
+
+class SnapshotUnpickler(pickle.Unpickler):
+    def __init__(self, file, context):
+        super().__init__(file)
+        self.objs = {'nil': nil, 'true': true_, 'false': false_, 'undefined': undefined, 'context': context}
+
+    def persistent_load(self, pid):
+        if isinstance(pid, tuple):
+            module, qualname, attname = pid[1:]
+            return vars(_liveClass(module, qualname))[attname].pyfunc()
+        return self.objs[pid]
+
+class ContextSnapshot(SObject):
+    """
+    Loaded packages of a Context in one file: metaclasses, holders, class attributes and compiled closure code.
+    Python classes, their holders and methods are reconnected by qualified name when restored.
+    """
+    def header(self):
+        from smallscript import __version__
+        return f"smallscript snapshot {__version__} {importlib.util.MAGIC_NUMBER.hex()}"
+
+    def save(self, context, path):
+        "Write the packages of @context to @path atomically."
+        buffer = io.BytesIO()
+        pickle.dump(self.header(), buffer, protocol=pickle.HIGHEST_PROTOCOL)
+        SnapshotPickler(buffer, context, self._pycodes(context)).dump(context.packages())
+        filepath = Path(path)
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=filepath.parent, suffix='.tmp', delete=False) as tmpfile:
+            tmpfile.write(buffer.getvalue())
+            tmpfile.flush()
+            os.fsync(tmpfile.fileno())
+        os.replace(tmpfile.name, filepath)
+        return self
+
+    def load(self, context, path):
+        "Replace the packages of @context by the ones saved in @path. Return nil if it is missing or unusable."
+        try:
+            buffer = io.BytesIO(Path(path).read_bytes())
+            header = pickle.load(buffer)
+            if header != self.header(): raise ValueError(f"unexpected header '{header}'")
+            packages = SnapshotUnpickler(buffer, context).load()
+        except Exception as e:
+            logger.warning(f"Snapshot '{path}' not restored: {e}")    # metaclasses may not be loaded yet
+            return nil
+        context.packages(packages)
+        context.reindexMetaclasses()
+        Metaclass.invalidateHolders()
+        return self
+
+    def _pycodes(self, context):
+        "Compiled closures run functions exec'ed from their pycode, they are saved as code."
+        pycodes = {}
+        for package in context.packages().values():
+            for metaclass in package.metaclasses().values():
+                for holder in metaclass.holders().values():
+                    method = holder.method()
+                    if method is nil or method.pycode() is nil or method.pyfunc() is nil: continue
+                    pycodes[id(method.pyfunc())] = (marshal.dumps(method.pycode()), method.pyfunc().__name__)
+        return pycodes
@@ -17,6 +17,9 @@ from smallscript.SObject import *
 from smallscript.core.PythonExt import ObjAdapter
 from smallscript.core.PythonExt import RuleContextVisitor
 from antlr4 import RuleContext
+import types
+import operator
+import weakref
 
 
 class StepVisitor(SObject):
@@ -33,13 +36,37 @@ class Step(SObject):
     isElement = Holder().name('isElement').type('False_') # Is an element of a list
     children = Holder().name('children').type('Map')
     compileRes = Holder().name('compileRes')
-    runtimeRes = Holder().name('runtimeRes')
+    runtimeRes = Holder().name('runtimeRes')   # interpreted value, runtime results are kept in the execution frame.
+    transients = ('ss_ruleCxt',)               # ANTLR parse tree is only needed to interpret, not saved in snapshots
 
     def visit(self, visitor): return visitor.visitStep(self)
+    def instrIndex(self, index=''): return self._getOrSet('instrIndex', index, nil)   # position in instructions
+
+    def result(self, frame):
+        "Runtime result of this step from the execution @frame, or its interpreted value if it is not an instruction."
+        index = self._get('ss_instrIndex', nil)
+        if index is nil: return self.runtimeRes()
+        return frame[index]
+
+    def sendCache(self):
+        "Inline cache of the message send at this step, created on first send."
+        cache = self._get('ss_sendCache', nil)
+        if cache is nil:
+            cache = SendCache()
+            self._set('ss_sendCache', cache)
+        return cache
+
     def keyname(self):
         return self.name() if self.hasKey('name') or self.ruleName().isNil() else self.ruleName()
     def getStep(self, name, default=nil): return self.children().getValue(name, default)
     def isFinal(self): return self.runtimeRes().notNil()
+    def isConstant(self): return self._get('ss_instrIndex', nil) is nil and self.isFinal()   # literal or folded
+    def fold(self): return nil      # constant result computed at interpretation time, see Interpreter.optimize()
+    def isPure(self): return not self.isRuntime()   # running it has no side effect
+
+    @staticmethod
+    def isLiteralValue(value):
+        return isinstance(value, (Number, int, float, str)) and not isinstance(value, bool)
     def isEmpty(self): return true_ if self.children().isNil() else self.children().isEmpty()
     def isRuntime(self): return false_
 
@@ -84,7 +111,7 @@ class Step(SObject):
                 parentStep.addStep(self.ruleName(), self)
         if self.isRuntime():
             if interpreter.toDebug(): print(f"  {self.ruleName()} add to instructions")
-            interpreter.instructions().append(self)
+            interpreter.addInstruction(self)
         return self
 
     def interpret(self, interpreter):
@@ -103,8 +130,8 @@ class Step(SObject):
         interpreter.currentStep(currentStep)
         return self
 
-    def run(self, scope):
-        "Subclass responsibility"
+    def run(self, scope, frame):
+        "Subclass responsibility. Return the result to be kept in @frame, steps are not modified at runtime."
         return nil
 
     def describe(self):
@@ -134,6 +161,7 @@ class ClosureStep(Step):
         closureInterpreter = Interpreter().currentStep(self).closure(interpreter.closure())
         if interpreter.toDebug(): closureInterpreter.toDebug(true_)
         super().interpret(closureInterpreter)
+        closureInterpreter.optimize(self)
 
         # Create closure object for this closure.
         closure = interpreter.closure().createEmpty()
@@ -153,6 +181,9 @@ class ClosureStep(Step):
         self.runtimeRes(closure)
 
         if interpreter.toDebug():
+            print("Optimizations:")
+            for optimization in closureInterpreter.optimizations():
+                print(f"  {optimization}")
             print("Instruction List:")
             for instruction in closure.interpreter().instructions():
                 print(f"  {instruction}")
@@ -181,17 +212,38 @@ class RuntimeStep(Step):
     def __init__(self): self.toKeep(true_)
     def isRuntime(self): return true_
 
-    def run(self, scope):
+    def run(self, scope, frame):
         res = self.compileRes()
-        self.runtimeRes(res)
+        return res
+
+    def link(self, linker):
+        "Linked record (opcode, operands, constant) of this step, see Interpreter.link(). Run the step by default."
+        return (RuntimeStep.runStep, (), self)
+
+    @staticmethod
+    def runStep(scope, frame, operands, step): return step.run(scope, frame)
+    @staticmethod
+    def runConstant(scope, frame, operands, constant): return constant
+
+    @staticmethod
+    def runSends(scope, frame, operands, groups):
+        "Send the message @groups e.g. unarytail, bintail or kwmsg in turn, a failed send ends its group with nil."
+        res = frame[operands[0]]
+        for group in groups:
+            for send, msg in group:
+                res = send(scope, frame, res, msg)
+                if res is _missing:
+                    res = nil
+                    break
         return res
 
 class BlockStep(RuntimeStep):
     def visit(self, step): return step.visitBlock(self)
+    def isPure(self): return true_
+    def link(self, linker): return (RuntimeStep.runConstant, (), self.compileRes().closure())
 
-    def run(self, scope):
+    def run(self, scope, frame):
         res = self.compileRes().closure()
-        self.runtimeRes(res)
         return res
 
 class PrimitiveStep(RuntimeStep):
@@ -207,16 +259,15 @@ class PrimitiveStep(RuntimeStep):
 
         return self
 
-    def run(self, scope):
+    def run(self, scope, frame):
         pmap = self.compileRes()
         primkey = self.getStep('primkey').compileRes()[:-1]
         exprLst = pmap[primkey]
         resLst = List()
         for expr in exprLst:
-            resLst.append(expr.runtimeRes())
+            resLst.append(expr.result(frame))
         func = getattr(self, primkey, self.print)    # printf is the default function.
         res = func(*resLst)
-        self.runtimeRes(res)
         return res
 
     def noQuote(self, strings):
@@ -261,6 +312,73 @@ class PrimitiveStep(RuntimeStep):
         res = output.text()
         return res
 
+_missing = object()
+
+class SendCache(SObject):
+    """
+    Polymorphic inline cache of a send site. Maps the receiver's Python type, and its metaclass for SObject,
+    to an invoker(receiver, *args) resolved for the message. Entries are stamped by Metaclass.holderVersion.
+    A receiver holding the selector in its instance attributes e.g. a method set on the instance takes the slow path.
+    """
+    maxEntries = 8      # megamorphic beyond this, new receiver types are resolved on every send.
+
+    def entries(self):
+        entries = self._get('ss_entries', None)
+        if entries is None:
+            entries = {}
+            self._set('ss_entries', entries)
+        return entries
+
+    @staticmethod
+    def receiverKey(receiver):
+        if isinstance(receiver, SObject):
+            return (type(receiver), receiver._get('ss_metaclass', None), receiver._get('ss_metaname', None))
+        return type(receiver)
+
+    def lookup(self, receiver, resolve, *selector):
+        "Return the invoker for @receiver, resolved by @resolve(receiver, *selector) on a miss. nil for the uncached slow path."
+        attrs = getattr(receiver, '__dict__', None)
+        if attrs:
+            for name in selector:
+                if name in attrs: return nil     # shadowed by an instance attribute
+        entries = self.entries()
+        version = Metaclass.holderVersion
+        key = self.receiverKey(receiver)
+        entry = entries.get(key, _missing)
+        if entry is not _missing and entry[0] == version:
+            return entry[1]
+        invoker = resolve(receiver, *selector)
+        if key in entries or len(entries) < self.maxEntries:
+            entries[key] = (version, invoker)
+        return invoker
+
+    @staticmethod
+    def typeAttr(klass, name):
+        for cls in klass.__mro__:
+            if name in cls.__dict__: return cls.__dict__[name]
+        return _missing
+
+    @staticmethod
+    def holderInvoker(holder):
+        def invoke(receiver, *args): return holder.__get__(receiver)(*args)
+        return invoke
+
+    @classmethod
+    def resolveAttr(cls, receiver, name):
+        "Resolve the same method as getattr(receiver, name) followed by metaclass holder lookup."
+        if isinstance(receiver, (type, types.ModuleType)): return nil   # attributes are per object
+        attr = cls.typeAttr(type(receiver), name)
+        if inspect.isfunction(attr) or isinstance(attr, (types.MethodDescriptorType, types.WrapperDescriptorType)):
+            return attr
+        if isinstance(attr, Holder):
+            return cls.holderInvoker(attr)
+        if attr is _missing and isinstance(receiver, SObject):
+            metaclass = receiver.metaclass()
+            if metaclass.notNil():
+                holder = metaclass.resolveHolder(name)
+                if holder.notNil(): return cls.holderInvoker(holder)
+        return nil
+
 class UnaryHeadStep(RuntimeStep):
     def visit(self, step): return step.visitUnaryHead(self)
 
@@ -270,39 +388,91 @@ class UnaryHeadStep(RuntimeStep):
         else:
             parentStep.addStep(self.ruleName(), self)
             if interpreter.toDebug(): print(f"  {self.ruleName()} add to instructions")
-            interpreter.instructions().append(self)
+            interpreter.addInstruction(self)
         return self
 
-    def invoke(self, scope, obj, unarytail):   # obj can be Python obj
-        res = obj
+    @staticmethod
+    def send(scope, frame, res, msg):
+        "Send unary @msg i.e. (op, sendCache) to @res. Return _missing if @res doesn't understand it."
+        op, cache = msg
+        invoker = cache.lookup(res, SendCache.resolveAttr, op)
+        if invoker is not nil:
+            try:
+                return invoker(res, scope) if op == "value" else invoker(res)
+            except TypeError:
+                if UnaryHeadStep._takesArgs(invoker, 2 if op == "value" else 1): return _missing
+                raise
+        method = getattr(res, op, nil)  # Holder.valueFunc
+        if method is nil and isinstance(res, SObject):
+            holder = res.metaclass().holderByName(op)
+            if holder.notNil():
+                method = holder.__get__(res)
+        if method is nil: return _missing
+        try:
+            if op == "value":           # value() should only be called from within ss.
+                return method(scope)
+            return method()
+        except TypeError:
+            if UnaryHeadStep._takesArgs(method, 1 if op == "value" else 0): return _missing
+            raise
+
+    @staticmethod
+    def _takesArgs(method, nArgs):
+        "Whether @method requires more than @nArgs arguments i.e. a keyword method like do: sent as unary do."
+        try:
+            nParam, nDefault = KwHeadStep._arity(inspect.signature(method))
+        except (TypeError, ValueError):
+            return False
+        return nParam - nDefault > nArgs
+
+    @staticmethod
+    def linkTail(unarytail, linker):
+        sends = []
         while unarytail.notNil():
-            if unarytail.ruleName() == "unarytail":
-                unarymsg = unarytail.getStep('unarymsg')
-            else:
-                unarymsg = unarytail
+            unarymsg = unarytail.getStep('unarymsg') if unarytail.ruleName() == "unarytail" else unarytail
             op = unarymsg.compileRes()
             if op.notNil():             # op.isNil() for case like "7;"
-                method = getattr(res, op, nil)  # Holder.valueFunc
-                if method is nil and isinstance(res, SObject):
-                    holder = res.metaclass().holderByName(op)
-                    if holder.notNil():
-                        method = holder.__get__(res)
-                if method is nil: return nil
-                if op == "value":           # value() should only be called from within ss.
-                    res = method(scope)
-                else:
-                    res = method()
+                sends.append((UnaryHeadStep.send, (op, unarymsg.sendCache())))
             unarytail = unarytail.getStep('unarytail')
+        return tuple(sends)
+
+    def invoke(self, scope, obj, unarytail, frame):   # obj can be Python obj
+        res = obj
+        for send, msg in self.linkTail(unarytail, nil):
+            res = send(scope, frame, res, msg)
+            if res is _missing: return nil
         return res
 
-    def run(self, scope):
+    def link(self, linker):
+        operand = linker.operand(self.getStep('operand'))
+        unarytail = self.getStep('unarytail')
+        groups = (self.linkTail(unarytail, linker),) if unarytail.notNil() else ()
+        return (RuntimeStep.runSends, (operand,), groups)
+
+    pureOps = {'len', 'asString', 'asNumber', 'toString'}
+
+    def fold(self):
         operand = self.getStep('operand')
-        obj = operand.runtimeRes()
+        if not operand.isConstant(): return nil
+        unarytail = self.getStep('unarytail')
+        tail = unarytail
+        while tail.notNil():
+            unarymsg = tail.getStep('unarymsg') if tail.ruleName() == "unarytail" else tail
+            if unarymsg.compileRes() not in self.pureOps: return nil
+            tail = tail.getStep('unarytail')
+        try:
+            res = self.invoke(nil, operand.runtimeRes(), unarytail, nil)
+        except Exception:
+            return nil      # leave the error to runtime
+        return res if self.isLiteralValue(res) else nil
+
+    def run(self, scope, frame):
+        operand = self.getStep('operand')
+        obj = operand.result(frame)
         unarytail = self.getStep('unarytail')
         res = obj
         if unarytail.notNil():
-            res = self.invoke(scope, obj, unarytail)
-        self.runtimeRes(res)
+            res = self.invoke(scope, obj, unarytail, frame)
         return res
 
 class BinHeadStep(RuntimeStep):
@@ -316,7 +486,7 @@ class BinHeadStep(RuntimeStep):
         else:
             parentStep.addStep(self.ruleName(), self)
             if interpreter.toDebug(): print(f"  {self.ruleName()} add to instructions")
-            interpreter.instructions().append(self)
+            interpreter.addInstruction(self)
         return self
 
     @Holder().asClassType()
@@ -331,85 +501,239 @@ class BinHeadStep(RuntimeStep):
             setValue('&', '__and__').setValue('-', '__sub__').setValue('?', '__question__'). \
             setValue('>=', '__ge__').setValue('<=', '__le__').setValue('^', '__xor__')
 
-    def invoke(self, scope, obj, bintail):   # obj can be Python obj
+    def _resolveBinop(self, receiver, binop):
+        invoker = SendCache.resolveAttr(receiver, binop)
         operators = self.operators()
-        res = obj
+        if invoker is nil and binop in operators:
+            invoker = SendCache.resolveAttr(receiver, operators[binop])
+        return invoker
+
+    @staticmethod
+    def send(scope, frame, res, msg):
+        "Send binary @msg i.e. (binop, argument index, sendCache, step) to @res. Return _missing if not understood."
+        binop, argIndex, cache, step = msg
+        arg = frame[argIndex] if isinstance(argIndex, int) else argIndex.result(frame)
+        invoker = cache.lookup(res, step._resolveBinop, binop)
+        if invoker is not nil:
+            value = invoker(res, arg)
+            return value if value is not NotImplemented else step._reflected(res, binop, arg)
+        method = getattr(res, binop, nil)
+        if method is nil:
+            operators = step.operators()
+            method = getattr(res, operators[binop], nil) if binop in operators else nil
+            if method is nil: return _missing
+        value = method(arg)
+        return value if value is not NotImplemented else step._reflected(res, binop, arg)
+
+    reflectedOps = {'+': operator.add, '-': operator.sub, '*': operator.mul, '/': operator.truediv,
+                    '\\': operator.floordiv, '%': operator.mod, '=': operator.eq, '<': operator.lt, '>': operator.gt,
+                    '<=': operator.le, '>=': operator.ge}
+
+    def _reflected(self, receiver, binop, arg):
+        "Python operator for a method answering NotImplemented e.g. Integer <= Vector runs Vector >= Integer."
+        func = self.reflectedOps.get(binop)
+        if func is None: return NotImplemented
+        try:
+            return func(receiver, arg)
+        except TypeError:
+            return _missing
+
+    def linkTail(self, bintail, linker):
+        "Binary sends of @bintail, arguments are frame indices when linked or steps otherwise."
+        sends = []
         while bintail.notNil():
-            if bintail.ruleName() == 'bintail':
-                binmsg = bintail.getStep('binmsg')
-            else:
-                binmsg = bintail
+            binmsg = bintail.getStep('binmsg') if bintail.ruleName() == 'bintail' else bintail
             binop = binmsg.getStep('binop').compileRes()
-            unaryhead = binmsg.getStep('unaryhead').runtimeRes()
-            method = getattr(res, binop, nil)
-            if method is nil:
-                if binop in operators:
-                    binop = operators[binop]
-                method = getattr(res, binop, nil)
-                if method is nil: return nil
-            res = method(unaryhead)
+            argStep = binmsg.getStep('unaryhead')
+            arg = argStep if linker is nil else linker.operand(argStep)
+            sends.append((BinHeadStep.send, (binop, arg, binmsg.sendCache(), self)))
             bintail = bintail.getStep('bintail')
+        return tuple(sends)
+
+    def invoke(self, scope, obj, bintail, frame):   # obj can be Python obj
+        res = obj
+        for send, msg in self.linkTail(bintail, nil):
+            res = send(scope, frame, res, msg)
+            if res is _missing: return nil
         return res
 
-    def run(self, scope):
+    def link(self, linker):
+        unaryhead = linker.operand(self.getStep('unaryhead'))
+        bintail = self.getStep('bintail')
+        groups = (self.linkTail(bintail, linker),) if bintail.notNil() else ()
+        return (RuntimeStep.runSends, (unaryhead,), groups)
+
+    pureOps = {'+', '-', '*', '/', '\\', '%', '<', '>', '<=', '>=', '=', ','}
+
+    def fold(self):
+        def isLiteral(step): return step.isConstant() and self.isLiteralValue(step.runtimeRes())
+
         unaryhead = self.getStep('unaryhead')
-        obj = unaryhead.runtimeRes()
+        if not isLiteral(unaryhead): return nil
+        bintail = self.getStep('bintail')
+        tail = bintail
+        while tail.notNil():
+            binmsg = tail.getStep('binmsg') if tail.ruleName() == 'bintail' else tail
+            if binmsg.getStep('binop').compileRes() not in self.pureOps: return nil
+            if not isLiteral(binmsg.getStep('unaryhead')): return nil
+            tail = tail.getStep('bintail')
+        try:
+            res = self.invoke(nil, unaryhead.runtimeRes(), bintail, nil)
+        except Exception:
+            return nil
+        return res if self.isLiteralValue(res) else nil
+
+    def run(self, scope, frame):
+        unaryhead = self.getStep('unaryhead')
+        obj = unaryhead.result(frame)
         bintail = self.getStep('bintail')
         res = obj
         if bintail.notNil():
-            res = self.invoke(scope, obj, bintail)
-        self.runtimeRes(res)
+            res = self.invoke(scope, obj, bintail, frame)
         return res
 
 class KwHeadStep(RuntimeStep):
     def visit(self, step): return step.visitKwHead(self)
 
-    def _kwmsg(self, kwmsg):
+    def _kwmsg(self, kwmsg, frame):
         kwpairs = kwmsg.children().head()
         if not isinstance(kwpairs, List):
             kwpairs = List().append(kwpairs)
         kwMap = Map()
         for kwpair in kwpairs:
             ptkey = kwpair.children()['ptkey'].compileRes()[:-1]
-            binhead = kwpair.children()['binhead'].runtimeRes()
+            binhead = kwpair.children()['binhead'].result(frame)
             kwMap[ptkey] = binhead
         return kwMap
 
-    def _methodLookup(self, obj, prefix, fullname, nArgs):
-        "Lookup method in python obj including SObject. Return a matched bound method with fullname and nArgs, or using prefix only."
-        # obj firstname: 'first' lastname: 'last'
-        # match #1: firstname__lastname__(firstname, lastname)      - SObject protocol
-        # match #2: firstname(firstname, lastname)                  - Python protocol
+    _signatures = weakref.WeakKeyDictionary()     # Python type -> {name: (func, nParam, nDefault) or None}
+
+    @staticmethod
+    def _arity(signature, bound=false_):
+        "Return (nParam, nDefault) of a @signature, skipping the first positional parameter when @bound."
+        nParam = nDefault = 0
+        params = list(signature.parameters.values())
+        if bound and params and params[0].kind in (inspect.Parameter.POSITIONAL_ONLY,
+                                                   inspect.Parameter.POSITIONAL_OR_KEYWORD):
+            params = params[1:]
+        for param in params:
+            nParam += 1
+            if param.kind == inspect.Parameter.VAR_POSITIONAL or \
+               param.kind == inspect.Parameter.VAR_KEYWORD or \
+               param.default is not inspect.Parameter.empty :
+                nDefault += 1
+        return nParam, nDefault
+
+    @classmethod
+    def _typeSignature(cls, klass, name):
+        "Signature index entry for instance method @name of Python @klass. nil if it can't be resolved from the type."
+        try:
+            signatures = cls._signatures.setdefault(klass, {})
+        except TypeError:   # type not weak referenceable
+            return nil
+        if name in signatures: return signatures[name]
+        entry = nil
+        func = SendCache.typeAttr(klass, name)
+        if inspect.isfunction(func):
+            try:
+                entry = (func,) + cls._arity(inspect.signature(func), true_)
+            except (TypeError, ValueError):
+                entry = nil
+        signatures[name] = entry
+        return entry
+
+    def _scanMethods(self, obj, prefix, fullname, nArgs):
+        "Lookup matched methods by scanning all attributes of @obj."
         methods = Map()
         for name in dir(obj):
             if not name.startswith(prefix): continue
             item = getattr(obj, name)
             if inspect.ismethod(item) and item.__self__ is obj:
-                signature = inspect.signature(item)
-                nParam = nDefault = 0
-                for argname, param in signature.parameters.items():
-                    nParam += 1
-                    if param.kind == inspect.Parameter.VAR_POSITIONAL or \
-                       param.kind == inspect.Parameter.VAR_KEYWORD or \
-                       param.default is not inspect.Parameter.empty :
-                        nDefault += 1
+                nParam, nDefault = self._arity(inspect.signature(item))
                 if nArgs > nParam or nArgs < nParam - nDefault: continue
-                params = List(signature.parameters.values())
                 methods[name] = (nParam, nDefault, item)
         if fullname in methods: return methods[fullname][2]
         if prefix in methods: return methods[prefix][2]
         return nil
 
-    def invoke(self, scope, obj, kwmsg):   # obj can be Python obj
-        kwMap = self._kwmsg(kwmsg)
+    def _methodLookup(self, obj, prefix, fullname, nArgs):
+        "Lookup method in python obj including SObject. Return a matched bound method with fullname and nArgs, or using prefix only."
+        # obj firstname: 'first' lastname: 'last'
+        # match #1: firstname__lastname__(firstname, lastname)      - SObject protocol
+        # match #2: firstname(firstname, lastname)                  - Python protocol
+        if isinstance(obj, (type, types.ModuleType)):
+            return self._scanMethods(obj, prefix, fullname, nArgs)      # classmethods and module attributes
+        instanceAttrs = getattr(obj, '__dict__', None)
+        klass = type(obj)
+        for name in (fullname, prefix):
+            if instanceAttrs is not None and name in instanceAttrs:
+                return self._scanMethods(obj, prefix, fullname, nArgs)  # shadowed by instance attribute
+            entry = self._typeSignature(klass, name)
+            if entry is nil: continue
+            func, nParam, nDefault = entry
+            if nArgs > nParam or nArgs < nParam - nDefault: continue
+            return types.MethodType(func, obj)
+        return nil
+
+    def _resolveKw(self, receiver, prefix, fullname, nArgs):
+        if isinstance(receiver, SObject):
+            holder = receiver.metaclass().holderByName(fullname)
+            if holder.isNil():
+                holder = receiver.metaclass().holderByName(prefix)
+            if holder.notNil(): return SendCache.holderInvoker(holder)
+        if isinstance(receiver, (type, types.ModuleType)): return nil
+        method = self._methodLookup(receiver, prefix, fullname, nArgs)
+        if method is nil: return nil
+        func = method.__func__
+        klass = type(receiver)
+        if SendCache.typeAttr(klass, fullname) is func or SendCache.typeAttr(klass, prefix) is func:
+            return func
+        return nil
+
+    @staticmethod
+    def send(scope, frame, obj, msg):
+        "Send keyword @msg i.e. (prefix, fullname, argument indices, kwmsg, step) to @obj."
+        prefix, fullname, argIndices, kwmsg, step = msg
+        args = [frame[index] for index in argIndices]
+        return step.sendArgs(obj, prefix, fullname, args, kwmsg)
+
+    def linkMsg(self, kwmsg, linker):
+        kwpairs = kwmsg.children().head()
+        if not isinstance(kwpairs, List):
+            kwpairs = List().append(kwpairs)
+        kwSteps = Map()
+        for kwpair in kwpairs:
+            ptkey = kwpair.children()['ptkey'].compileRes()[:-1]
+            kwSteps[ptkey] = kwpair.children()['binhead']
+        prefix = kwSteps.keys().head()
+        fullname = prefix
+        if kwSteps.len() > 1:
+            fullname = "".join([f"{key}__" for key in kwSteps.keys()])
+        argIndices = tuple(linker.operand(step) for step in kwSteps.values())
+        return ((KwHeadStep.send, (prefix, fullname, argIndices, kwmsg, self)),)
+
+    def link(self, linker):
+        unaryhead = linker.operand(self.getStep('unaryhead'))
+        kwmsg = self.getStep('kwmsg')
+        groups = (self.linkMsg(kwmsg, linker),) if kwmsg.notNil() else ()
+        return (RuntimeStep.runSends, (unaryhead,), groups)
+
+    def invoke(self, scope, obj, kwmsg, frame):   # obj can be Python obj
+        kwMap = self._kwmsg(kwmsg, frame)
         prefix = kwMap.keys().head()
         fullname = prefix
         if kwMap.len() > 1:
             fullname = "".join([f"{key}__" for key in kwMap.keys()])
+        return self.sendArgs(obj, prefix, fullname, kwMap.values(), kwmsg)
 
-        method = nil
+    def sendArgs(self, obj, prefix, fullname, args, kwmsg):
+        invoker = kwmsg.sendCache().lookup(obj, self._resolveKw, prefix, fullname, len(args))
+        if invoker is not nil:
+            return invoker(obj, *args)
+
+        method = res = nil
         # Invoke method through SObject protocol
-        if method is nil and isinstance(obj, SObject):
+        if isinstance(obj, SObject):
             holder = obj.metaclass().holderByName(fullname)
             if holder.notNil():
                 method = holder.__get__(obj)
@@ -421,54 +745,105 @@ class KwHeadStep(RuntimeStep):
 
         # Invoke method through Python protocol
         if method is nil:
-            res = nil
-            nArgs = kwMap.len()
-            method = self._methodLookup(obj, prefix, fullname, nArgs)
+            method = self._methodLookup(obj, prefix, fullname, len(args))
 
         if method is not nil:
-            res = method(*kwMap.values())
+            res = method(*args)
         return res
 
-    def run(self, scope):
+    def run(self, scope, frame):
         unaryhead = self.getStep('unaryhead')
-        obj = unaryhead.runtimeRes()
+        obj = unaryhead.result(frame)
         kwmsg = self.getStep('kwmsg')
         res = obj
         if kwmsg.notNil():
-            res = self.invoke(scope, obj, kwmsg)
-        self.runtimeRes(res)
+            res = self.invoke(scope, obj, kwmsg, frame)
+        return res
+
+class SendSite(SObject):
+    """
+    Message group of guarded compiled code, see PythonCoder.guarded(). It is sent like RuntimeStep.runSends()
+    sends a group, so a failed unary or binary send ends the group with nil instead of raising.
+    """
+    def __init__(self): self._set('ss_group', ())
+
+    def unary(self, *ops):
+        "Group of unary sends of @ops."
+        return self._set('ss_group', tuple((UnaryHeadStep.send, (op, SendCache())) for op in ops))
+
+    def binary(self, *binops):
+        "Group of binary sends of @binops, each taking its argument in turn."
+        step = BinHeadStep()
+        return self._set('ss_group', tuple((BinHeadStep.send, (binop, index, SendCache(), step))
+                                           for index, binop in enumerate(binops)))
+
+    def keyword(self, prefix, fullname, nArgs):
+        "Keyword send of @fullname or @prefix taking @nArgs arguments."
+        return self._set('ss_group', ((KwHeadStep.send, (prefix, fullname, tuple(range(nArgs)), self, KwHeadStep())),))
+
+    def sendCache(self):
+        "Inline cache of the keyword send, as KwHeadStep.sendArgs() takes it from its kwmsg."
+        cache = self._get('ss_sendCache', nil)
+        if cache is nil:
+            cache = SendCache()
+            self._set('ss_sendCache', cache)
+        return cache
+
+    def send(self, scope, res, *args):
+        "Send the group to @res with @args, answer nil if a send is not understood."
+        for send, msg in self._get('ss_group', ()):
+            res = send(scope, args, res, msg)
+            if res is _missing: return nil
         return res
 
 class ChainStep(RuntimeStep):
     def visit(self, step): return step.visitChain(self)
 
-    def invoke(self, scope, obj, msg):
+    def invoke(self, scope, obj, msg, frame):
         res = obj
         tails = msg.children().values()
         for tail in tails:
             ruleName = tail.ruleName()
             if ruleName == 'kwmsg':
-                res = KwHeadStep().invoke(scope, res, tail)
+                res = KwHeadStep().invoke(scope, res, tail, frame)
             elif ruleName == 'bintail':
-                res = BinHeadStep().invoke(scope, res, tail)
+                res = BinHeadStep().invoke(scope, res, tail, frame)
             elif ruleName == 'unarytail':
-                res = UnaryHeadStep().invoke(scope, res, tail)
+                res = UnaryHeadStep().invoke(scope, res, tail, frame)
         return res
 
-    def run(self, scope):
+    def run(self, scope, frame):
         head = self.getStep('kwhead')
         if head.isNil():
            head = self.getStep('binhead')
-        obj = head.runtimeRes()
+        obj = head.result(frame)
         res = obj
         msgs = self.getStep('msg')
         if not isinstance(msgs, List):
             msgs = List().append(msgs)
         for msg in msgs:
-            res = self.invoke(scope, res, msg)
-        self.runtimeRes(res)
+            res = self.invoke(scope, res, msg, frame)
         return res
 
+    def link(self, linker):
+        head = self.getStep('kwhead')
+        if head.isNil():
+           head = self.getStep('binhead')
+        msgs = self.getStep('msg')
+        if not isinstance(msgs, List):
+            msgs = List().append(msgs)
+        groups = []
+        for msg in msgs:
+            for tail in msg.children().values():
+                ruleName = tail.ruleName()
+                if ruleName == 'kwmsg':
+                    groups.append(KwHeadStep().linkMsg(tail, linker))
+                elif ruleName == 'bintail':
+                    groups.append(BinHeadStep().linkTail(tail, linker))
+                elif ruleName == 'unarytail':
+                    groups.append(UnaryHeadStep.linkTail(tail, linker))
+        return (RuntimeStep.runSends, (linker.operand(head),), tuple(groups))
+
 class ArrayStep(RuntimeStep):  # Serving both dynarr & litarr
     def visit(self, step): return step.visitArray(self)
 
@@ -495,12 +870,15 @@ class ArrayStep(RuntimeStep):  # Serving both dynarr & litarr
         self.runtimeRes(list)
         return self
 
-    def run(self, scope):
+    def fold(self): return self.compileRes() if self.getStep('litarrcnt').notNil() else nil
+    def isPure(self): return true_     # dynarr elements are instructions of their own
+
+    def run(self, scope, frame):
         def toList(steps):
             list = List()
             for step in steps:
                 if isinstance(step, Step):
-                    list.append(step.runtimeRes())
+                    list.append(step.result(frame))
                 else:
                     subList = toList(step)
                     list.append(subList)
@@ -509,38 +887,55 @@ class ArrayStep(RuntimeStep):  # Serving both dynarr & litarr
         steps = self.getStep('litarrcnt') # litarr
         if steps.notNil():
             res = self.compileRes()
-            self.runtimeRes(res)
             return res
         steps = self.getStep('operand') # dynarr
         if steps.notNil():
             res = toList(steps)
-            self.runtimeRes(res)
             return res
 
 class AssignStep(RuntimeStep):
     def visit(self, step): return step.visitAssign(self)
 
-    def run(self, scope):
+    @staticmethod
+    def runLinked(scope, frame, operands, name):
+        refObj = frame[operands[0]]
+        res = frame[operands[1]]
+        if not isinstance(refObj, PrimitiveStep):
+            refObj.setValue(name, res)
+        return res
+
+    def link(self, linker):
+        ref = self.getStep('ref')
+        operands = (linker.operand(ref), linker.operand(self.getStep('expr')))
+        return (AssignStep.runLinked, operands, ref.name())
+
+    def run(self, scope, frame):
         ref = self.getStep('ref')
-        refObj = ref.runtimeRes()
-        res = self.getStep('expr').runtimeRes()
+        refObj = ref.result(frame)
+        res = self.getStep('expr').result(frame)
         if not isinstance(refObj, PrimitiveStep):
             refObj.setValue(ref.name(), res)
-        self.runtimeRes(res)
         return res
 
 class VarStep(RuntimeStep):
     def visit(self, step): return step.visitVar(self)
+    def isPure(self): return self.getStep('ref').isPure()
 
-    def run(self, scope):
+    @staticmethod
+    def runLinked(scope, frame, operands, name): return frame[operands[0]].getValue(name)
+
+    def link(self, linker):
+        ref = self.getStep('ref')
+        if ref.getStep('primitive').notNil(): return super().link(linker)
+        return (VarStep.runLinked, (linker.operand(ref),), ref.name())
+
+    def run(self, scope, frame):
         ref = self.getStep('ref')
-        pStep = refObj = ref.runtimeRes()
+        pStep = refObj = ref.result(frame)
         if isinstance(refObj, PrimitiveStep):
-            res = pStep.run(scope)
-            self.runtimeRes(res)
+            res = pStep.run(scope, frame)
             return res
         res = refObj.getValue(ref.name())
-        self.runtimeRes(res)
         return res
 
     def describe(self):
@@ -553,19 +948,51 @@ class VarStep(RuntimeStep):
 
 class RefStep(RuntimeStep):
     def visit(self, step): return step.visitRef(self)
+    def isPure(self):       # dotted names may run Python properties
+        return self.getStep('primitive').isNil() and '.' not in self.compileRes()
+
+    def interpret(self, interpreter):
+        super().interpret(interpreter)
+        varname = self.compileRes()
+        if varname.notNil():
+            self.name(varname.split('.')[-1])   # attribute name used by VarStep and AssignStep
+        return self
+
+    def resolution(self):
+        "Resolution cache of this reference in Scope.resolve()."
+        resolution = self._get('ss_resolution', None)
+        if resolution is None:
+            resolution = Resolution()
+            self._set('ss_resolution', resolution)
+        return resolution
+
+    @staticmethod
+    def runLinked(scope, frame, operands, names):
+        head, varname, resolution = names
+        obj = scope.resolve(head, resolution)
+        if obj is undefined:
+            obj = scope
+        if varname is not None:
+            obj = ObjAdapter().object(obj).getRef(varname)
+        return obj
 
-    def run(self, scope):
+    def link(self, linker):
+        primitive = self.getStep('primitive')
+        if primitive.notNil(): return (RuntimeStep.runConstant, (), primitive)
+        varname = self.compileRes()
+        head = varname.split('.')[0]
+        return (RefStep.runLinked, (), (head, varname if '.' in varname else None, self.resolution()))
+
+    def run(self, scope, frame):
         primitive = self.getStep('primitive')
         if primitive.notNil():
-            self.runtimeRes(primitive)
             return primitive
         varname = self.compileRes()
         varnames = List(varname.split('.'))
         head = varnames[0]
         last = varnames[-1]
-        self.name(last)
-        obj = scope.lookup(head)
-        if obj == undefined:
+        obj = scope.resolve(head, self.resolution())
+        if obj is undefined:
             obj = scope
             # if @varname was not defined, consider it in local scope. obj can be Python obj
         if varnames.len() > 1:
@@ -575,9 +1002,27 @@ class RefStep(RuntimeStep):
             tail = varname
             obj = ObjAdapter().object(obj)
             obj = obj.getRef(tail)
-        self.runtimeRes(obj)
         return obj
 
+class Linker(SObject):
+    "Resolves step operands to frame indices. Instruction results come first in the frame, then constants."
+    def base(self, base=''): return self._getOrSet('base', base, 0)     # number of instructions
+    def constants(self):
+        constants = self._get('ss_constants', None)
+        if constants is None:
+            constants = []
+            self._set('ss_constants', constants)
+        return constants
+
+    def operand(self, step):
+        index = step._get('ss_instrIndex', nil)
+        if index is not nil: return index
+        constants = self.constants()
+        constants.append(step.runtimeRes())
+        return self.base() + len(constants) - 1
+
+    def frameTemplate(self): return [nil] * self.base() + self.constants()
+
 class TextBuffer(SObject):
     delimiter = Holder().name('delimiter').type('String')
     useDelimiter = Holder().name('useDelimiter').type('True_')
@@ -634,6 +1079,87 @@ class Interpreter(SObject, RuleContextVisitor):
     currentStep = Holder().name('currentStep')
     instructions = Holder().name('instructions').type('List')
     closure = Holder().name('closure')
+    resultStep = Holder().name('resultStep')      # last expression, its result is the closure result
+    optimizations = Holder().name('optimizations').type('List')
+
+    def addInstruction(self, step):
+        instructions = self.instructions()
+        step.instrIndex(instructions.len())
+        instructions.append(step)
+        return self
+
+    def newFrame(self):
+        "Create an execution frame holding the result of each instruction for one closure invocation."
+        return [nil] * self.instructions().len()
+
+    def result(self, frame, default=nil):
+        "Closure result from @frame, or @default if the result step is unknown."
+        resultStep = self.resultStep()
+        return default if resultStep.isNil() else resultStep.result(frame)
+
+    def link(self):
+        "Return (records, frame template, result index) linking the instructions for Closure._runSteps."
+        linked = self._get('ss_linked', nil)
+        if linked is nil:
+            linker = Linker().base(self.instructions().len())
+            records = tuple(step.link(linker) for step in self.instructions())
+            resultStep = self.resultStep()
+            resultIndex = None if resultStep.isNil() else linker.operand(resultStep)
+            linked = (records, linker.frameTemplate(), resultIndex)
+            self._set('ss_linked', linked)
+        return linked
+
+    def optimize(self, closureStep):
+        "Fold constant sends and drop unused pure expressions of @closureStep, then renumber the instructions."
+        optimizations = self.optimizations()
+        instructions = self.instructions()
+        for step in instructions:       # operands are added before the steps using them
+            value = step.fold()
+            if value is nil: continue
+            optimizations.append(f"fold {step.describe()} => {value}")
+            step._del('ss_instrIndex')
+            step.runtimeRes(value)
+
+        exprs = closureStep.getStep('exprs')
+        if exprs.notNil():
+            self._dropUnused(exprs, closureStep.flatten(exprs))
+
+        if optimizations.notEmpty():
+            remaining = List([step for step in instructions if step._get('ss_instrIndex', nil) is not nil])
+            for index, step in enumerate(remaining):
+                step.instrIndex(index)
+            self.instructions(remaining)
+        return self
+
+    def _dropUnused(self, exprs, exprList):
+        "Drop pure expressions whose results are discarded i.e. all but the last one."
+        kept = List()
+        for expr in exprList[:-1]:
+            subSteps = self._instructionsOf(expr)
+            if all(step.isPure() for step in subSteps):
+                self.optimizations().append(f"drop {expr.describe()}")
+                for step in subSteps: step._del('ss_instrIndex')
+            else:
+                kept.append(expr)
+        last = exprList[-1]
+        if kept.len() < exprList.len() - 1:
+            kept.append(last)
+            children = Map().setValue('expr', kept.head())
+            if kept.len() > 1: children.setValue('exprlst', List(kept[1:]))
+            exprs.children(children)
+        if last.isRuntime() or not self._instructionsOf(last):
+            self.resultStep(last)
+        return self
+
+    def _instructionsOf(self, step):
+        "Instructions in @step including itself, not including nested closures."
+        steps = List()
+        if step._get('ss_instrIndex', nil) is not nil: steps.append(step)
+        if isinstance(step, BlockStep): return steps
+        for child in step.children().values():
+            for childStep in (child if isinstance(child, List) else [child]):
+                if isinstance(childStep, Step): steps.extend(self._instructionsOf(childStep))
+        return steps
 
     def visitWs(self, cxt): return nil
     def visitTerminal(self, tnode): return nil
@@ -701,22 +1227,19 @@ class Interpreter(SObject, RuleContextVisitor):
     def visitSsFloat(self, cxt):
         step = Step().retrieve(cxt).interpret(self)
         f = Float(step.compileRes())
-        number = Number().value(f)
-        step.runtimeRes(number)
+        step.runtimeRes(f)
         return step
 
     def visitSsHex(self, cxt):
         step = Step().retrieve(cxt).interpret(self)
         n = Integer(int(step.compileRes(), 16))
-        number = Number().value(n)
-        step.runtimeRes(number)
+        step.runtimeRes(n)
         return step
 
     def visitSsInt(self, cxt):
         step = Step().retrieve(cxt).interpret(self)
         n = Integer(step.compileRes())
-        number = Number().value(n)
-        step.runtimeRes(number)
+        step.runtimeRes(n)
         return step
 
     def visitNum(self, cxt): return Step().retrieve(cxt).interpret(self)
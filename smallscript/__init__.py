@@ -13,8 +13,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+__version__ = '0.3.4'    # keep it before the imports below, it is read while loading smallscript package.
+
 from .SObject import sscontext, nil, undefined, true_, false_
-from .SObject import SObject, Holder, Package, Scope, String, True_, False_, List, Map, Float, Integer, Number, Logger
+from .SObject import SObject, Holder, Package, Scope, String, True_, False_, List, Map, Vector, Float, Integer, Number, Logger
 import os
 import logging
 
@@ -34,7 +36,7 @@ logger.addHandler(handler)
 
 __all__ = [ # Classes
             'SObject', 'Holder', 'Package', 'Scope', 'String', 'True_', 'False_',
-            'List', 'Map', 'Float', 'Integer', 'Number', 'Logger',
+            'List', 'Map', 'Vector', 'Float', 'Integer', 'Number', 'Logger',
 
             # Singletons
            'sscontext', 'nil', 'undefined', 'true_', 'false_']
\ No newline at end of file
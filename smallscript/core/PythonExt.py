@@ -14,7 +14,8 @@
 # limitations under the License.
 
 from smallscript.SObject import *
-from smallscript.antlr.SmallScriptVisitor import SmallScriptVisitor
+with profiling('module', 'smallscript.antlr.SmallScriptVisitor'):
+    from smallscript.antlr.SmallScriptVisitor import SmallScriptVisitor
 
 class ObjAdapter(SObject):
     "Make SObject follows Python dot notation for attribute access. Not yet supports method access."
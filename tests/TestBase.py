@@ -103,22 +103,24 @@ class DebugClosure(Closure):
 
     def _runSteps(self, scope, *params):
         instructions = self.interpreter().instructions()
+        frame = self.interpreter().newFrame()
         res = nil
-        for instruction in instructions:
+        for index, instruction in enumerate(instructions):
             if self.toDebug():
                 stepName = instruction.toString()
                 print(stepName)
                 msgheads = {'unaryhead', 'binhead', 'kwhead', 'chainhead'}
                 if instruction.ruleName() in msgheads:
                     dummy = 1                           # specific steps bpt
-                res = instruction.run(scope)            # all steps bpt
+                res = instruction.run(scope, frame)     # all steps bpt
                 print(f"res = [{res}]")
                 dummy = 1
             else:
-                res = instruction.run(scope)
+                res = instruction.run(scope, frame)
+            frame[index] = res
         if self.toDebug():
             dummy = 1                                   # stepping ended
-        return res
+        return self.interpreter().result(frame, res)
 
 class TestSObj1(SObject):
     var1 = Holder().name('var1').type('String')
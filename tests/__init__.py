@@ -0,0 +1,9 @@
+
+import os
+import atexit
+import shutil
+import tempfile
+
+# Tests use their own opt-in code cache, removed when they end.
+os.environ['SS_CACHE_DIR'] = tempfile.mkdtemp(prefix='smallscript-tests-')
+atexit.register(shutil.rmtree, os.environ['SS_CACHE_DIR'], True)
@@ -89,11 +89,11 @@ class Test_SObject(SmallScriptTest):
         self.assertEqual('Map', obj.metaname())
         self.assertEqual({'a':1,'b':2,'c':3}, obj)
         obj = sscontext.asSObj(123)
-        self.assertEqual('Number', obj.metaname())
-        self.assertEqual('Integer', obj.value().metaname())
+        self.assertEqual('Integer', obj.metaname())
+        self.assertTrue(obj.value() is obj)
         obj = sscontext.asSObj(0.123)
-        self.assertEqual('Number', obj.metaname())
-        self.assertEqual('Float', obj.value().metaname())
+        self.assertEqual('Float', obj.metaname())
+        self.assertTrue(sscontext.asSObj(obj) is obj)
         obj = sscontext.asSObj(None)
         self.assertEqual(nil, obj)
 
@@ -176,5 +176,175 @@ class Test_SObject(SmallScriptTest):
         attr11 = tobj.getAsNumber('attr11')
         self.assertEqual(Float, attr11.__class__)
 
+    @skipUnless('TESTALL' in env, "disabled")
+    def test250_resolved_holders(self):
+        # Metaclass caches resolved holders including those inherited from parents.
+        pkg = sscontext.loadPackage('tests')
+        meta = sscontext.metaclassByName('TestSObj12')
+        holder = meta.holderByName('attr11')
+        self.assertEqual('attr11', holder.name())
+        self.assertTrue(holder is meta.holderByName('attr11'))
+        self.assertTrue(holder is meta.resolveHolder('attr11__attr12__'))   # partial name
+        self.assertTrue(meta.resolveHolder('attr99__attr12__').isNil())
+
+        # addAttr() expires the cached holders, including the negative ones.
+        version = Metaclass.holderVersion
+        self.assertTrue(meta.holderByName('attr99').isNil())
+        meta.addAttr('attr99', 'String')
+        self.assertTrue(version < Metaclass.holderVersion)
+        self.assertEqual('attr99', meta.holderByName('attr99').name())
+        self.assertEqual('attr99', meta.resolveHolder('attr99__attr12__').name())
+        tobj = TestSObj12()
+        self.assertEqual('', tobj.attr99())
+        del meta.holders()['attr99']
+        Metaclass.invalidateHolders()
+        self.assertTrue(meta.holderByName('attr99').isNil())
+
+    @skipUnless('TESTALL' in env, "disabled")
+    def test270_lazy_logging(self):
+        # Messages are built only for enabled levels, and logged ones are kept as structured events.
+        tobj = TestSObj1()
+        self.assertTrue(tobj.logger() is tobj.logger())
+        self.assertTrue(tobj.logger() is tobj.metaclass().attrs().getValue('logger'))
+        built = []
+        def message():
+            built.append(1)
+            return "built"
+        tobj.log(message, Logger.LevelDebug)
+        tobj.log("{} {}", Logger.LevelDebug, object(), object())
+        self.assertEqual([], built)
+        with self.assertLogs('smallscript', level='ERROR') as logs:
+            tobj.log("fail to {}", Logger.LevelError, 'load', pkg='tests')
+            tobj.log(message, Logger.LevelCritical)
+        self.assertEqual([1], built)
+        self.assertTrue(logs.output[0].startswith('ERROR:smallscript:fail to load - '))
+        event = Logger.events(Logger.LevelError)[-2]
+        self.assertEqual(('fail to load', 'tests', Logger.LevelError), (event['msg'], event['pkg'], event['level']))
+        self.assertTrue(event['filename'].endswith('test01_sobject.py'))
+        self.assertEqual('built', Logger.events()[-1]['msg'])
+
+    @skipUnless('TESTALL' in env, "disabled")
+    def test280_unboxed_numbers(self):
+        # Integer and Float are the canonical values, arithmetic does not wrap them in Number.
+        res = Integer(3) + 4
+        self.assertEqual((7, 'Integer'), (res, res.metaname()))
+        res = Integer(3) + Float(0.5)
+        self.assertEqual((3.5, 'Float'), (res, res.metaname()))
+        res = 2 - Integer(5)
+        self.assertEqual((-3, 'Integer'), (res, res.metaname()))
+        res = Integer(7) / 2
+        self.assertEqual((3.5, 'Float'), (res, res.metaname()))
+        res = Float(1.5) * Number(2)
+        self.assertEqual((3.0, 'Float'), (res, res.metaname()))
+        res = Number(5) - Float(1.0)
+        self.assertEqual((4.0, 'Float'), (res, res.metaname()))
+        self.assertTrue(Number(1) < Float(1.5) and not Number(1) > Float(1.0))
+        self.assertEqual('Integer', String('12').asNumber().metaname())
+        self.assertEqual('Float', String('1.25').asNumber().metaname())
+        self.assertEqual(Integer, type(Closure().interpret("1 + 2 * 3")()))
+
+    @skipUnless('TESTALL' in env, "disabled")
+    def test290_vector(self):
+        # Vector wraps a NumPy array, binary messages and arithmetic blocks run once on the whole array.
+        import numpy
+        scope = sscontext.createScope()
+        scope['col'] = numpy.arange(10)
+        scope['x'] = 3
+        self.assertEqual('Vector', scope['col'].metaname())
+        res = Closure().interpret("col * x - 1")(scope)
+        self.assertEqual('Vector', res.metaname())
+        self.assertEqual([-1, 2, 5, 8, 11, 14, 17, 20, 23, 26], res.asList())
+        self.assertEqual([2, 1, 0], list(Closure().interpret("2 - col")(scope))[:3])
+        self.assertEqual([1, 4, 7], Closure().interpret("col collect: [:e | e * x + 1]")(scope).asList()[:3])
+        self.assertEqual([5, 6, 7, 8, 9], Closure().interpret("col select: [:e | e>=5]")(scope).asList())
+        self.assertEqual(45, Closure().interpret("col inject: 0 into: [:a :e | a + e]")(scope))
+        self.assertEqual(-35, Closure().interpret("col inject: 10 into: [:a :e | a - e]")(scope))
+
+        # Blocks with other messages run per element.
+        block = Closure().interpret("[:e | e asString]")()
+        self.assertFalse(block.isArithmetic())
+        self.assertEqual(['0', '1'], Vector([0, 1]).collect(block).asList())
+        self.assertEqual([0, 2, 4], Closure().interpret("col select: [:e | e % 2 = 0]")(scope).asList()[:3])
+        block = Closure().interpret("[:a :e | a * e + 1]")()
+        self.assertTrue(block.isArithmetic() and block.foldOp().isNil())
+        self.assertEqual(10, Vector([1, 2, 3]).inject__into__(0, block))
+        self.assertEqual('+', Closure().interpret("[:a :e | a + e]")().foldOp())
+        self.assertEqual((45, 4.5, 'Integer'), (scope['col'].sum(), scope['col'].mean(), scope['col'].at(3).metaname()))
+
+        # Scalars on the left, equality and division by zero like Integer.
+        self.assertEqual([0, 1, 1, 3], list(Closure().interpret("7 % (col + 1)")(scope))[:4])
+        self.assertEqual([7, 3, 2, 1], list(Closure().interpret("7 \\ (col + 1)")(scope))[:4])
+        self.assertEqual([6.0, 3.0, 2.0], list(Closure().interpret("6 / (col + 1)")(scope))[:3])
+        self.assertEqual([False, False, True, True], list(Closure().interpret("2<=col")(scope))[:4])
+        self.assertEqual([True, True, True, False], list(Closure().interpret("2>=col")(scope))[:4])
+        self.assertEqual([2], Closure().interpret("col select: [:e | e = 2]")(scope).asList())
+        self.assertEqual([False, False, True], list(Closure().interpret("col = 2")(scope))[:3])
+        self.assertEqual([False, False, True], list(Closure().interpret("2 = col")(scope))[:3])
+        self.assertTrue(scope['col'] != '' and not scope['col'] == nil)
+        for ss in ["col / 0", "col \\ 0", "col % 0", "1 / col", "7 % col", "col inject: 1 into: [:a :e | a / e]"]:
+            with self.assertRaises(ZeroDivisionError, msg=ss): Closure().interpret(ss)(scope)
+
+        # Python callables run per element, compiled arithmetic blocks run once on the array as interpreted ones.
+        self.assertEqual([0, 2, 4], Vector([0, 1, 2]).collect(lambda e: e * 2).asList())
+        self.assertEqual([1, 2], Vector([0, 1, 2]).select(lambda e: e >= 1).asList())
+        self.assertEqual(3, Vector([0, 1, 2]).inject__into__(0, lambda a, e: a + e))
+        block = Closure().compile("[:a :e | a + e]")()
+        self.assertTrue(block.pyfunc() is not nil and block.isArithmetic())
+        self.assertEqual('+', block.foldOp())
+        self.assertTrue(Closure().compile("[:e | e * x + 1]")().isArithmetic())
+        self.assertFalse(Closure().compile("[:e | e asString]")().isArithmetic())
+        for ss in ["col collect: [:e | e * x + 1]", "col select: [:e | e>=5]", "col inject: 0 into: [:a :e | a + e]"]:
+            expected = Closure().interpret(ss)(scope)
+            res = Closure().compile(ss)(scope)
+            self.assertEqual(list(expected) if isinstance(expected, Vector) else expected,
+                             list(res) if isinstance(res, Vector) else res, ss)
+
+    @skipUnless('TESTALL' in env, "disabled")
+    def test300_collections(self):
+        # Collection protocol of List and Map, in interpreted and compiled closures.
+        scope = sscontext.createScope()
+        scripts = {"#(1 2 3 4) collect: [:e | e * 10]": [10, 20, 30, 40],
+                   "#(1 2 3 4) select: [:e | e>=3]": [3, 4],
+                   "#(1 2 3 4) reject: [:e | e>=3]": [1, 2],
+                   "#(1 2 3 4) detect: [:e | e>=3]": 3,
+                   "#(1 2 3 4) inject: 0 into: [:a :e | a + e]": 10,
+                   "| s | s := 0; #(1 2 3) do: [:e | s := s + e]; s": 6,
+                   "#(1 2 3 4) lazyCollect: [:e | e * 10] | lazySelect: [:e | e>=20] | collect: [:e | e + 1]": [21, 31, 41]}
+        for ss, expected in scripts.items():
+            self.assertEqual(expected, Closure().interpret(ss)(scope), ss)
+            self.assertEqual(expected, Closure().compile(ss)(scope), ss)
+        self.assertEqual(nil, List([1, 2]).detect(lambda e: e > 5))
+
+        map = Map(a=1, b=2, c=3)
+        self.assertEqual({'a': 2, 'b': 4, 'c': 6}, map.collect(lambda v: v * 2))
+        self.assertEqual({'b': 2, 'c': 3}, map.select(lambda v: v > 1))
+        self.assertEqual(6, map.inject__into__(0, lambda acc, v: acc + v))
+        keys = []
+        map.keysAndValuesDo(lambda k, v: keys.append(k))
+        self.assertEqual(['a', 'b', 'c'], keys)
+
+        # Only true selects, nil and other objects do not; keyword selectors sent as unary answer nil.
+        scope['items'] = List([1, 2, 3])
+        scope['m'] = Map(a=1, b=2)
+        for ss, expected in {"items select: [:e | e foo]": [], "items reject: [:e | e foo]": [1, 2, 3],
+                             "items detect: [:e | e foo]": nil, "m select: [:e | nil]": {},
+                             "items lazySelect: [:e | e foo] | asList": [], "m do": nil, "m collect": nil,
+                             "m select": nil, "items inject": nil}.items():
+            self.assertEqual(expected, Closure().interpret(ss)(scope), ss)
+
+        # Lazy stages run per element on demand, without intermediate lists.
+        calls = []
+        def square(e):
+            calls.append(e)
+            return e * e
+        stream = List(range(1000)).lazyCollect(square).lazySelect(lambda e: e % 2 == 1)
+        self.assertEqual('Stream', stream.metaname())
+        self.assertEqual([], calls)
+        self.assertEqual([1, 9], stream.first(2))
+        self.assertEqual([0, 1, 2, 3], calls)
+        self.assertEqual(500, len(stream.asList()))     # streamed again from its source
+        once = Stream(e for e in range(3)).lazyCollect(square)
+        self.assertEqual(([0, 1, 4], []), (once.asList(), once.asList()))
+
 if __name__ == '__main__':
     unittest.main()
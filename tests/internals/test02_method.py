@@ -205,5 +205,25 @@ class Test_Closure(SmallScriptTest):
         closure.name('testName')
         self.assertEqual("testClosure__arg1__arg2__", closure.ssSignature("testClosure"))
 
+    @skipUnless('TESTALL' in env, "disabled")
+    def test740_scope_propagation(self):
+        # A method invoked within a closure runs in a child of the closure scope, without looking into Python frames.
+        cxt = Context().name('test740_scope_propagation')
+        cxt.loadPackage('smallscript')
+        meta = cxt.getOrNewPackage('tmppkg').createMetaclass('ScopeMeta')
+        meta.parentNames(['SObject'])
+        meta.addMethod('peek', Closure().interpret("outerVar"))
+        tobj = cxt.newInstance('ScopeMeta')
+
+        scope = sscontext.createScope()
+        scope['outerVar'] = 42
+        scope['tobj'] = tobj
+        self.assertEqual(42, Closure().interpret("tobj peek")(scope))
+        self.assertEqual(nil, tobj.peek())          # not called from a closure
+
+        # Compatibility mode finds the local variable @scope from the calling Python frames.
+        cxt.scopeFromFrames(true_)
+        self.assertEqual(42, tobj.peek())
+
 if __name__ == '__main__':
     unittest.main()
@@ -212,5 +212,228 @@ class Test_Interpreter1(SmallScriptTest):
         res = Closure().interpret(ss)(scope)
         self.assertEqual('global value', scope['global1'])
 
+    @skipUnless('TESTALL' in env, "disabled")
+    def test800_script_cache(self):
+        # Closures interpreted from the same smallscript share the parsed and interpreted IR.
+        scope = sscontext.createScope()
+        ss = ":a :b | a + b * 3"
+        closure1 = Closure().interpret(ss)
+        stats = sscontext.scriptCacheStats()
+        closure2 = Closure().interpret(ss)
+        self.assertEqual(stats['hits'] + 1, sscontext.scriptCacheStats()['hits'])
+        self.assertTrue(closure1 is not closure2)
+        self.assertTrue(closure1.interpreter() is closure2.interpreter())
+        self.assertEqual(['a', 'b'], closure2.params())
+        self.assertEqual(9, closure1(scope, 1, 2))
+        self.assertEqual(15, closure2(scope, 2, 3))
+
+        # Params and tempvars are not shared, changing them in one closure doesn't affect the others.
+        self.assertTrue(closure1.params() is not closure2.params())
+        closure2.params().append('c')
+        self.assertEqual(['a', 'b'], closure1.params())
+        self.assertEqual(['a', 'b'], Closure().interpret(ss).params())
+
+        # Reinterpreting a closure doesn't change the shared IR.
+        closure2.interpret("7")
+        self.assertEqual(9, closure1(scope, 1, 2))
+        self.assertEqual(7, closure2(scope))
+
+        # Bounded by maxSize, least recently used one is evicted.
+        cache = sscontext.scriptCache()
+        maxSize = cache.maxSize()
+        cache.maxSize(2)
+        Closure().interpret("1 + 1")
+        stats = sscontext.scriptCacheStats()
+        Closure().interpret("1 + 2"); Closure().interpret("1 + 1"); Closure().interpret("1 + 3")
+        self.assertEqual(stats['evictions'] + 2, sscontext.scriptCacheStats()['evictions'])
+        self.assertEqual(stats['hits'] + 1, sscontext.scriptCacheStats()['hits'])
+        self.assertEqual(2, sscontext.scriptCacheStats()['size'])
+        cache.maxSize(maxSize)
+
+    @skipUnless('TESTALL' in env, "disabled")
+    def test810_reentrant(self):
+        # Runtime results are kept per invocation, so the same closure can be reentered and run across threads.
+        class Countdown:
+            def __init__(self, closure): self.closure = closure
+            def value(self, n):
+                if n <= 0: return 0
+                return self.closure(sscontext.createScope(), n - 1, self)
+
+        closure = Closure().interpret(":n :f | n + (f value: n)")
+        self.assertEqual(10, Countdown(closure).value(5))   # 4 + 3 + 2 + 1 + 0
+
+        from concurrent.futures import ThreadPoolExecutor
+        closure = Closure().interpret(":a :b | a + b * 2")
+        def run(n): return [closure(sscontext.createScope(), n, i) for i in range(50)]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(run, range(8)))
+        for n, res in enumerate(results):
+            self.assertEqual([(n + i) * 2 for i in range(50)], res)
+
+    @skipUnless('TESTALL' in env, "disabled")
+    def test820_send_cache(self):
+        # Send sites cache the resolved method per receiver type, expired when metaclasses change.
+        cxt = Context().name('test820_send_cache')
+        cxt.loadPackage('smallscript')
+        meta = cxt.getOrNewPackage('tmppkg').createMetaclass('SendMeta')
+        meta.parentNames(['SObject'])
+        meta.addMethod('calc', Closure().interpret(":a | a + 1"))
+        tobj = cxt.newInstance('SendMeta')
+        scope = sscontext.createScope()
+        scope['tobj'] = tobj
+        closure = Closure().interpret("(tobj calc: 10) + (tobj calc: 20)")
+        self.assertEqual(32, closure(scope))
+        kwStep = closure.interpreter().instructions()[2].getStep('kwmsg')
+        self.assertEqual(1, len(kwStep.sendCache().entries()))
+        self.assertEqual(32, closure(scope))
+
+        meta.addMethod('calc', Closure().interpret(":a | a * 2"))
+        self.assertEqual(60, closure(scope))
+        scope['n'] = 3
+        scope['s'] = '3'
+        self.assertEqual(7, Closure().interpret("n + 4")(scope))     # Python receivers are cached by type
+        self.assertEqual('34', Closure().interpret("s + '4'")(scope))
+
+    @skipUnless('TESTALL' in env, "disabled")
+    def test830_constant_folding(self):
+        # Literal sends are folded and unused pure expressions dropped at interpretation.
+        scope = sscontext.createScope()
+        closure = Closure().interpret("3 + 4 * 2")
+        self.assertEqual(0, closure.interpreter().instructions().len())
+        self.assertEqual(14, closure(scope))                        # left to right as the interpreter
+        closure = Closure().interpret("#(1 2 3) len + 1")
+        self.assertEqual(0, closure.interpreter().instructions().len())
+        self.assertEqual(4, closure(scope))
+
+        closure = Closure().interpret(":a | | t | t := a; 'abc' len; a; [:e | e]; tobj attr11: 5; t + 'ab' len")
+        interpreter = closure.interpreter()
+        self.assertEqual(3, len([opt for opt in interpreter.optimizations() if opt.startswith('drop')]))
+        scope['tobj'] = tobj = TestSObj14()
+        self.assertEqual(9, closure(scope, 7))
+        self.assertEqual(5, tobj.attr11())                          # side effect is kept
+        self.assertEqual(14, Closure().interpret("x := 3 + 4; 1; x * 2")(scope))
+        self.assertTrue("_ = 3\n" in Closure().compile("'abc' len").pysource())
+        self.assertEqual(3, Closure().compile("'abc' len")(scope))  # folded in compiled mode as well
+        closure = Closure().interpret("3 / 0")
+        self.assertEqual(1, closure.interpreter().instructions().len())     # errors are left to runtime
+        self.assertRaises(ZeroDivisionError, closure, scope)
+
+    @skipUnless('TESTALL' in env, "disabled")
+    def test840_linked_instructions(self):
+        # Interpreted closures run linked records, with the same results as running the steps.
+        scope = sscontext.createScope()
+        scope['tobj'] = TestSObj14()
+        scope['num'] = 7
+        scripts = ["num + 2 - 3 * 4", "num asString len", "tobj attr11: num; tobj attr11",
+                   "tobj method14: num add: 3", "num + 1 | * 2 | asString | len",
+                   ":a | | t | t := a + num; t * a", "num xyz; num + 1 | xyz | + 2"]
+        for ss in scripts:
+            closure = Closure().interpret(ss)
+            interpreter = closure.interpreter()
+            records, template, resultIndex = interpreter.link()
+            self.assertTrue(records is interpreter.link()[0])            # linked once
+            self.assertEqual(interpreter.instructions().len(), len(records))
+            res = closure(scope, 5)                                       # binds params in scope
+            frame = interpreter.newFrame()
+            for index, instruction in enumerate(interpreter.instructions()):
+                frame[index] = instruction.run(scope, frame)
+            self.assertEqual(interpreter.result(frame, frame[-1]), res, ss)
+        self.assertEqual(15, Closure().interpret(":a | | t | t := a + num; [:e | t + e] value: 3")(scope, 5))
+        records, template, resultIndex = Closure().interpret("num + 2").interpreter().link()
+        self.assertEqual([nil, nil, nil, 2], template)     # constants follow instruction results
+
+    @skipUnless('TESTALL' in env, "disabled")
+    def test850_block_activation(self):
+        # Blocks called by value reuse one activation scope per parent scope, unless reentered or it got new names.
+        block = Closure().interpret("[:e | | t | t := e * 2]")()
+        self.assertEqual([2, 4, 6], [block.value(n) for n in (1, 2, 3)])
+        scope = vars(block)['ss_activations'][id(block)][1]     # no running scope, the block keeps it
+        self.assertEqual(8, block.value(4))
+        self.assertTrue(vars(block)['ss_activations'][id(block)][1] is scope)
+        self.assertEqual([6, 2], list(map(block, [3, 1])))      # as a Python callable
+
+        # Parent scope is the running scope, so outer variables are found.
+        outer = sscontext.createScope()
+        outer['k'] = 10
+        self.assertEqual([11, 12], Closure().interpret("#(1 2) collect: [:e | e + k]")(outer))
+
+        # Each parent scope keeps its own activation, the block keeps none of them.
+        callers = [sscontext.createScope(), sscontext.createScope()]
+        for caller in callers:
+            caller['block'] = block = Closure().interpret("[:e | e * 2]")() if caller is callers[0] else block
+            caller['k'] = 1
+            self.assertEqual(2, Closure().interpret("block value: k")(caller))
+        activations = [vars(caller)['ss_activations'][id(block)][1] for caller in callers]
+        self.assertTrue(activations[0] is not activations[1] and 'ss_activations' not in vars(block))
+        self.assertTrue(all(activation.parent() is caller for activation, caller in zip(activations, callers)))
+
+        # Only the running scope is dropped as an argument, another scope is a value like any other.
+        other = sscontext.createScope()
+        self.assertTrue(Closure().interpret("[:s | s]")().value(other, 5) is other)
+
+        # Names defined beyond params and tempvars are not kept for the next call.
+        leaky = Closure().interpret("[:e | x := e]")()
+        leaky.value(1)
+        self.assertFalse(vars(leaky).get('ss_activations'))
+
+        # A reentrant call gets its own activation, so its params are not overwritten.
+        class Countdown:
+            def value(self, n): return 0 if n <= 0 else block.value(n - 1, self)
+        block = Closure().interpret("[:n :f | n + (f value: n)]")()
+        self.assertEqual(10, block.value(4, Countdown()))     # 4 + 3 + 2 + 1 + 0
+
+    @skipUnless('TESTALL' in env, "disabled")
+    def test860_scope_resolution(self):
+        # References keep their resolution from the parent scope, until a parent scope is reshaped.
+        outer = sscontext.createScope()
+        outer['num'] = 7
+        scopes = [outer]
+        for _ in range(8): scopes.append(scopes[-1].createScope())
+        leaf = scopes[-1]
+        closure = Closure().interpret("num + 1")
+        self.assertEqual([8, 8], [closure(leaf), closure(leaf)])
+        resolution = Resolution()
+        self.assertTrue(leaf.resolve('num', resolution) is outer.locals())
+        self.assertTrue(resolution[0] is not None)
+        self.assertTrue(leaf.resolve('num', resolution) is leaf.lookup('num'))
+
+        scopes[4]['num'] = 3                        # assigns the outer variable
+        self.assertEqual(4, closure(leaf))
+        scopes[6].locals()['num'] = 5               # shadowed by a new name in a parent
+        self.assertEqual(6, closure(leaf))
+        scopes[6].delValue('num')
+        self.assertEqual(4, closure(leaf))
+        leaf.locals()['num'] = 1                    # in the running scope itself
+        self.assertEqual(2, closure(leaf))
+        self.assertTrue(leaf.resolve('xyz', Resolution()) is undefined)
+
+        # Attributes of objs are dynamic, they are checked again.
+        sscontext.loadPackage('tests')
+        outer['attr11'] = 'outer'
+        tobj = TestSObj14()
+        scopes[3].addObj(tobj)
+        closure = Closure().interpret("attr11")
+        self.assertEqual('outer', closure(leaf))
+        tobj.attr11('tobj')
+        self.assertEqual('tobj', closure(leaf))
+
+        # Reading locals, scopes and objs does not reshape, changing names through saved ones does.
+        outer['val'] = 4
+        closure = Closure().interpret("val + 1")
+        locals, objs = scopes[5].locals(), scopes[5].objs()
+        self.assertEqual(5, closure(leaf))
+        version = Scope.shapeVersion
+        for scope in scopes: scope.locals(), scope.scopes(), scope.objs()
+        outer.locals()['val'] = 2                       # assigns an existing name
+        self.assertEqual(version, Scope.shapeVersion)
+        self.assertEqual(3, closure(leaf))
+        locals['val'] = 9                               # new name through a saved locals Map
+        self.assertEqual(10, closure(leaf))
+        del locals['val']
+        self.assertEqual(3, closure(leaf))
+        objs.append(Map(val=20))                        # new obj through a saved objs List
+        self.assertEqual(21, closure(leaf))
+        self.assertTrue(Scope.shapeVersion > version)
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,4 +1,5 @@
 import unittest
+import tempfile
 from unittest import skip, skipUnless
 from tests.TestBase import SmallScriptTest
 
@@ -236,5 +237,138 @@ class Test_Compiler1(SmallScriptTest):
         res = closure(scope)
         self.assertEqual('global value', scope['global1'])
 
+    @skipUnless('TESTALL' in env, "disabled")
+    def test800_code_cache(self):
+        # Compiled closures are cached on disk, warm compile doesn't parse or compile again.
+        codeCache = sscontext.codeCache()
+        path, enabled = codeCache.path(), codeCache.enabled()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            codeCache.path(tmpdir).enabled(true_)
+            scope = sscontext.createScope()
+            ss = ":a :b | | c | c := a + b; [c * 2] value"
+            closure = Closure().name('cached').compile(ss)
+            self.assertEqual(10, closure(scope, 2, 3))
+            key = codeCache.keyFor(closure, ss)
+            self.assertTrue(codeCache.filepath(key).exists())
+
+            # Optimize mode and closure type are part of the key, as they generate different code.
+            self.assertNotEqual(key, codeCache.keyFor(Closure().name('cached').optimize(true_), ss))
+            self.assertNotEqual(key, codeCache.keyFor(DebugClosure().name('cached'), ss))
+            self.assertTrue(codeCache.codegenRevision() in codeCache.header())
+
+            stats = Map(codeCache.stats())
+            closure = Closure().name('cached').compile(ss)
+            self.assertEqual(stats['hits'] + 1, codeCache.stats()['hits'])
+            self.assertTrue(closure.interpreter().currentStep().isNil())   # not interpreted
+            self.assertEqual(['a', 'b'], closure.params())
+            self.assertEqual(['c'], closure.tempvars())
+            self.assertEqual(14, closure(scope, 3, 4))
+            self.assertTrue('def cached(scope, a, b):' in closure.toPython())
+
+            # Corrupted cache file is removed and recompiled.
+            codeCache.filepath(key).write_bytes(b'corrupted')
+            loglevel = codeCache.loglevel()
+            codeCache.loglevel(4)       # suppress the corrupted cache warning
+            closure = Closure().name('cached').compile(ss)
+            codeCache.loglevel(loglevel)
+            self.assertEqual(stats['errors'] + 1, codeCache.stats()['errors'])
+            self.assertEqual(14, closure(scope, 3, 4))
+            codeCache.clear()
+            self.assertTrue(not codeCache.filepath(key).exists())
+        codeCache.path(path).enabled(enabled)
+
+    @skipUnless('TESTALL' in env, "disabled")
+    def test810_optimize(self):
+        # Optimized closures keep params and tempvars in Python locals unless a nested block captures them.
+        ss = ":a :b | | t u | t := a + b; u := #(1 2 3); t * 2 + u len"
+        closure = Closure().optimize(true_).compile(ss)
+        pysource = closure.pysource()
+        self.assertTrue("t = a + b" in pysource)
+        self.assertTrue("scope['a']" not in pysource and "scope['t']" not in pysource)
+        self.assertTrue("_const0 = lambda: List([1, 2, 3])" in pysource)   # literal array is hoisted as a factory
+        scope = sscontext.createScope()
+        self.assertEqual(13, closure(scope, 2, 3))
+        self.assertEqual(13, closure(scope, 2, 3))
+        self.assertTrue('t' not in scope.locals())
+
+        # Each use takes a new literal array, optimize doesn't change results when it is modified.
+        ss = ":n | | u | u := #(1 2); u append: 3; u len"
+        closure, optimized = Closure().compile(ss), Closure().optimize(true_).compile(ss)
+        self.assertEqual([3, 3, 3], [closure(scope, 1) for i in range(3)])
+        self.assertEqual([3, 3, 3], [optimized(scope, 1) for i in range(3)])
+
+        ss = ":n | | acc t | acc := 0; t := n * 2; [:e | acc := acc + e + n] value: t; acc"
+        closure = Closure().optimize(true_).compile(ss)
+        pysource = closure.pysource()
+        self.assertTrue("scope.locals()['n'] = n" in pysource)     # captured by the block
+        self.assertTrue("t = n * 2" not in pysource)
+        self.assertTrue("t = scope['n'] * 2" in pysource)
+        scope = sscontext.createScope()
+        self.assertEqual(Closure().compile(ss)(scope, 3), closure(scope, 3))
+        self.assertEqual(9, closure(scope, 3))
+
+        # Named source e.g. of a package method keeps the hoisted constants in its body.
+        closure = Closure().optimize(true_).compile(":a :b | | t u | t := a + b; u := #(1 2 3); t * 2 + u len")
+        named = closure.toNamedPython("  ", "optimized")
+        self.assertTrue(named.startswith("def optimized(scope, a, b):\n"))
+        self.assertEqual(1, named.count("def "))
+        namespace = {}
+        exec(named, namespace)
+        self.assertEqual(13, namespace['optimized'](sscontext.createScope(), 2, 3))
+
+    @skipUnless('TESTALL' in env, "disabled")
+    def test820_tiered(self):
+        # Tiered closures run interpreted until hot, then switch to a pyfunc compiled in the background.
+        scope = sscontext.createScope()
+        scope['num'] = 7
+        for ss in ["num + 2 - 3", "num + 1 | * 2 | asString | len", ":a | | t | t := a + num; [:e | t + e] value: 3"]:
+            closure = sscontext.tiered(ss, 3)
+            expected = [closure(scope, 5) for i in range(2)]
+            self.assertTrue(closure.pyfunc() is nil and closure.tierCounter().state() == 'interpreted', ss)
+            closure(scope, 5)
+            closure.tierCounter().wait()
+            self.assertEqual('compiled', closure.tierCounter().state(), ss)
+            self.assertTrue(closure.pyfunc() is not nil, ss)
+            self.assertEqual(expected[0], closure(scope, 5), ss)
+            self.assertEqual(3, closure.tierCounter().calls())     # compiled calls are not counted
+
+        # Guarded sends keep the interpreted precedence and Python prefix protocol, primitives stay interpreted.
+        scope['tobj'] = TestSObj14()
+        for ss, state in [("3 + num * 2", 'compiled'), ("tobj method14: num add: 3", 'compiled'),
+                          ("<printf: '\"{}\"'; 'x'>; num", 'ineligible')]:
+            closure = Closure().interpret(ss).tiered(1)
+            expected = closure(scope)
+            closure.tierCounter().wait()
+            self.assertEqual(state, closure.tierCounter().state(), ss)
+            self.assertEqual(expected, closure(scope), ss)
+        self.assertEqual(100, sscontext.tierThreshold())
+
+        # Failed sends answer nil as interpreted, so the compiled closure never reruns its steps.
+        for ss in ["x foo; 5", "x foo: 3; 5", "x + 1 | foo; 5"]:
+            closure = sscontext.tiered(ss, 3)
+            self.assertEqual([5, 5, 5], [closure(scope) for i in range(3)], ss)
+            closure.tierCounter().wait()
+            self.assertEqual('compiled', closure.tierCounter().state(), ss)
+            self.assertEqual([5, 5], [closure(scope), closure(scope)], ss)
+
+        # Side effects run once per call, also on the call switching to the pyfunc.
+        class Counter:
+            def __init__(self): self.count = 0
+            def bump(self): self.count += 1; return self.count
+        counter = Counter()
+        closure = sscontext.tiered(":o | o bump; o xyz; o bump", 2)
+        for i in range(4):
+            self.assertEqual(2 * i + 2, closure(scope, counter))
+            closure.tierCounter().wait()
+        self.assertEqual('compiled', closure.tierCounter().state())
+        self.assertEqual(8, counter.count)
+
+        # Errors raise from the compiled closure as they do from the steps.
+        closure = sscontext.tiered(":a :b | a / b", 1)
+        self.assertEqual(2, closure(scope, 4, 2))
+        closure.tierCounter().wait()
+        self.assertEqual('compiled', closure.tierCounter().state())
+        self.assertRaises(ZeroDivisionError, closure, scope, 4, 0)
+
 if __name__ == '__main__':
     unittest.main()
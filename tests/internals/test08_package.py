@@ -14,6 +14,8 @@
 # limitations under the License.
 
 import unittest
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from unittest import skip, skipUnless
 from tests.TestBase import SmallScriptTest
 
@@ -75,6 +77,137 @@ class Test_Package(SmallScriptTest):
 
         self.assertEqual(1, pkg.listFilePaths("__init*.py").len())
 
+    @skipUnless('TESTALL' in env, "disabled")
+    def test300_metaclass_index(self):
+        # Later package overrides metaclass with the same name from earlier package.
+        cxt = Context().name('test300_metaclass_index')
+        cxt.loadPackage('smallscript')
+        pkg1 = cxt.getOrNewPackage('idxpkg1')
+        pkg2 = cxt.getOrNewPackage('idxpkg2')
+        self.assertTrue(cxt.metaclassByName('IdxMeta').isNil())
+        meta1 = pkg1.createMetaclass('IdxMeta')
+        self.assertEqual(meta1, cxt.metaclassByName('IdxMeta'))
+        meta2 = pkg2.createMetaclass('IdxMeta')
+        self.assertEqual(meta2, cxt.metaclassByName('IdxMeta'))
+        self.assertEqual(pkg2, cxt.packageByMetaname('IdxMeta'))
+        pkg1.createMetaclass('IdxMeta')                 # earlier package doesn't override
+        self.assertEqual(meta2, cxt.metaclassByName('IdxMeta'))
+
+        # Unloading a package exposes metaclass from the earlier package.
+        pkg2.unloadSObjects()
+        self.assertEqual(meta1, cxt.metaclassByName('IdxMeta'))
+        self.assertEqual(pkg1, cxt.packageByMetaname('IdxMeta'))
+
+        stats = cxt.metaclassIndexStats()
+        cxt.metaclassByName('IdxMeta')
+        self.assertEqual(stats['hits'] + 1, cxt.metaclassIndexStats()['hits'])
+        self.assertEqual(stats['misses'], cxt.metaclassIndexStats()['misses'])
+
+        cxt.reset()
+        self.assertTrue(cxt.metaclassByName('IdxMeta').isNil())
+        self.assertEqual(1, cxt.metaclassIndexStats()['size'])
+
+    @skipUnless('TESTALL' in env, "disabled")
+    def test400_lazy_load(self):
+        # Lazy package indexes metanames from sources, a module is loaded on first lookup of its metaclasses.
+        cxt = Context().name('test400_lazy_load')
+        cxt.loadPackage('smallscript')
+        pkg = cxt.loadPackage('tests', true_)
+        self.assertEqual(['tests.TestBase', 'tests.TestSObj14'], pkg.lazyIndex()['TestSObj15'])
+        self.assertTrue(not pkg.hasKey('metaclasses') and not pkg.isEmpty())
+        self.assertTrue('TestSObj15' in pkg.metaclassNames())
+
+        metaclass = cxt.metaclassByName('TestSObj15')
+        self.assertEqual(pkg, cxt.packageByMetaname('TestSObj15'))
+        self.assertTrue('method14' in metaclass.holders())         # later module overrides like eager loading
+        self.assertTrue('TestSObj15' not in pkg.lazyIndex() and 'DebugClosure' not in pkg.lazyIndex())
+        self.assertTrue('Test_Package' in pkg.lazyIndex() and 'Test_Package' not in pkg.metaclasses())
+        self.assertTrue(cxt.metaclassByName('NoSuchMeta').isNil())
+
+    @skipUnless('TESTALL' in env, "disabled")
+    def test410_lazy_load_threads(self):
+        # Concurrent lookups load a lazy module once; only class level ss_metas rename a class.
+        cxt = Context().name('test410_lazy_load_threads')
+        cxt.loadPackage('smallscript')
+        pkg = cxt.loadPackage('tests', true_)
+        loads = []
+        loadModule = pkg._loadModuleLocked
+        pkg._loadModuleLocked = lambda moduleName: loads.append(moduleName) or loadModule(moduleName)
+        try:
+            with ThreadPoolExecutor(4) as executor:
+                metaclasses = list(executor.map(lambda i: cxt.metaclassByName('TestSObj15'), range(8)))
+        finally:
+            del pkg._loadModuleLocked
+        self.assertTrue(all(metaclass is metaclasses[0] and metaclass.notNil() for metaclass in metaclasses))
+        self.assertEqual(['tests.TestBase', 'tests.TestSObj14'], loads)
+
+        with tempfile.NamedTemporaryFile('w', suffix='.py') as file:
+            file.write("class Plain(SObject):\n    def method(self):\n        ss_metas = 'Inner'\n"
+                       "class Named(SObject):\n    ss_metas = 'Outer, Other'\n")
+            file.flush()
+            self.assertEqual(['Plain', 'Outer'], pkg._classMetanames(Path(file.name)))
+
+    @skipUnless('TESTALL' in env, "disabled")
+    def test450_startup_profiler(self):
+        profiler = sscontext.profileStartup()
+        try:
+            cxt = Context().name('test450_startup_profiler').reset()
+            cxt.loadPackage('smallscript')
+        finally:
+            sscontext.profileStartup(false_)
+        self.assertTrue(sscontext.startupProfiler().isNil())
+        records = profiler.records()
+        for key in [('context', 'test450_startup_profiler'), ('package', 'smallscript'), ('importFrom', 'Closure'),
+                    ('importMethods', 'smallscript'), ('initClasses', 'smallscript'), ('metaInit', 'Context')]:
+            self.assertEqual(1, records[key][0], key)
+        self.assertTrue(records[('package', 'smallscript')][1] >= records[('importMethods', 'smallscript')][1])
+        report = profiler.report(3)
+        self.assertEqual(4, report.len())
+        self.assertTrue(report[1].startswith('package') and 'smallscript' in report[1])    # slowest first
+
+    @skipUnless('TESTALL' in env, "disabled")
+    def test470_snapshot(self):
+        # Restored packages reconnect to the live Python classes, metaInit and method wrapping are not rerun.
+        closure = Closure().compile(":a :b | a + b")
+        sscontext.getOrNewPackage('snappkg').createMetaclass('SnapMeta').addMethod('add', closure)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = f"{tmpdir}/context.snapshot"
+            sscontext.snapshot(path)
+            cxt = Context().name('test470_snapshot')
+            self.assertEqual(cxt, cxt.restore(path))
+            self.assertTrue(cxt.restore(f"{tmpdir}/missing.snapshot").isNil())
+        self.assertEqual(sscontext.packages().keys(), cxt.packages().keys())
+        metaclass = cxt.metaclassByName('TestSObj15')
+        self.assertTrue(metaclass is not sscontext.metaclassByName('TestSObj15'))
+        self.assertEqual(cxt, metaclass.context())
+        self.assertTrue(metaclass.holders()['attr11'] is vars(TestSObj14)['attr11'])   # live holder
+        self.assertEqual('value from metaInit', metaclass.attrs().getValue('cattr13'))
+        self.assertTrue(cxt.newInstance('TestSObj15').metaclass() is metaclass)
+        method = cxt.metaclassByName('SnapMeta').holders()['add'].method()
+        self.assertTrue(method.pyfunc() is not closure.pyfunc())                       # rebuilt from code
+        self.assertEqual(5, method(sscontext.createScope(), 2, 3))
+
+    @skipUnless('TESTALL' in env, "disabled")
+    def test480_snapshot_other_contexts(self):
+        # Shared class holders reach other contexts, a snapshot stops at their packages and stale module functions.
+        cxt = Context().name('test480_snapshot_other_contexts')
+        cxt.loadPackage('smallscript')
+        tpkg = cxt.getOrNewPackage('testpkg')
+        tpkg.findPath("not_a_pkg/testpkg")
+        try:
+            tpkg.load()
+            tpkg.load()         # reloaded modules leave stale functions behind
+            with tempfile.TemporaryDirectory() as tmpdir:
+                path = f"{tmpdir}/context.snapshot"
+                sscontext.snapshot(path)
+                restored = Context().name('test480_restored')
+                self.assertEqual(restored, restored.restore(path))
+        finally:
+            tpkg.unloadSObjects()
+        self.assertEqual(sscontext.packages().keys(), restored.packages().keys())
+        method = restored.metaclassByName('Context').holders()['metaInit'].method()
+        self.assertTrue(method.metaclass() is restored.metaclassByName('Closure'))
+
     @skipUnless('TESTALL' in env, "disabled")
     def test510_load(self):
         tpkg = sscontext.getOrNewPackage('testpkg')
@@ -40,6 +40,16 @@ class PyClass2(PyClass):
 class PyClass3(PyClass):
     pass
 
+class PyClass4(PyClass):
+    def first(self, first, last='Doe'): return f"{first} {last}"
+    def first__last__(self, first, last): return f"{last}, {first}"
+    def args(self, *args): return len(args)
+    def pair(self, a, b): return a + b
+    @staticmethod
+    def static(a): return a
+    @classmethod
+    def klass(cls, a): return a
+
 class TDD_PythonExt(SmallScriptTest):
     @classmethod
     def setUpClass(cls):
@@ -456,6 +466,38 @@ class TDD_PythonExt(SmallScriptTest):
         self.assertEqual('hello', res['a'])
 
 
+    @skipUnless('TESTALL' in env, "disabled")
+    def test380_keyword_signatures(self):
+        # Keyword messages to Python objects are resolved through a per-type signature index.
+        scope = sscontext.createScope()
+        pyobj = PyClass4()
+        scope['pyobj'] = pyobj
+        def run(ss): return Closure().interpret(ss)(scope)
+        self.assertEqual('John Doe', run("pyobj first: 'John'"))                    # default arg
+        self.assertEqual('Doe, John', run("pyobj first: 'John' last: 'Doe'"))       # fullname first
+        self.assertEqual('John Smith', run("pyobj first: 'John' middle: 'Smith'"))  # prefix
+        self.assertEqual(1, run("pyobj args: 1"))                                   # var-arg counts as one
+        self.assertEqual(nil, run("pyobj args: 1 b: 2"))
+        self.assertEqual(nil, run("pyobj pair: 1"))                                 # arity mismatch
+        self.assertEqual(nil, run("pyobj static: 1"))                               # not bound to pyobj
+        self.assertEqual(nil, run("pyobj klass: 1"))
+        self.assertEqual(101, run("pyobj addPy11: -10"))                            # inherited
+        entry = KwHeadStep._signatures[PyClass4]['pair']
+        self.assertEqual((PyClass4.pair, 2, 0), entry)
+
+        pyobj.pair = pyobj.args                                                     # shadowed by instance
+        self.assertEqual(1, run("pyobj pair: 1"))
+
+        # A warmed send site still finds a method shadowed by an instance attribute.
+        class Shadowed:
+            def pair(self, *args): return 'class'
+            def other(self, *args): return 'instance'
+        a, b = Shadowed(), Shadowed()
+        b.pair = b.other
+        for ss in [":o | o pair: 1", ":o | o pair"]:
+            closure = Closure().interpret(ss)
+            self.assertEqual(['class', 'class', 'instance'], [closure(scope, a), closure(scope, a), closure(scope, b)], ss)
+
     @skipUnless('TESTALL' in env, "disabled")
     def test490_next(self):
         scope = sscontext.createScope()
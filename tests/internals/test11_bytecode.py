@@ -0,0 +1,75 @@
+# coding=utf-8
+# Copyright 2024 Vital Star Foundation. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from unittest import skip, skipUnless
+from tests.TestBase import SmallScriptTest
+
+from os import environ as env
+env['TESTALL'] = '1'
+
+from smallscript.SObject import *
+from smallscript.Closure import Closure
+from smallscript.Bytecode import Bytecode
+from tests.TestSObj14 import TestSObj14
+
+class Test_Bytecode(SmallScriptTest):
+    #### Same SmallScript running on the bytecode VM instead of the Step interpreter, with the same results.
+
+    @classmethod
+    def setUpClass(cls):
+        pkg = sscontext.loadPackage('tests')
+
+    @skipUnless('TESTALL' in env, "disabled")
+    def test100_assemble(self):
+        closure = Closure().assemble("num + 1 | * 2 | asString | len")
+        self.assertTrue(isinstance(closure.bytecode(), Bytecode))
+        listing = closure.bytecode().disassemble()
+        self.assertEqual(['0 load num', '1 push 1', '2 binary +', '3 push 2', '4 binary *',
+                          '5 unary asString', '6 unary len', '7 return'], [line.strip() for line in listing])
+        self.assertTrue(closure.bytecode() is Closure().assemble("num + 1 | * 2 | asString | len").bytecode())
+
+        # Primitives have no bytecode, the closure keeps running its steps.
+        closure = Closure().assemble("<printf: '\"{}\"'; 'x'>; 3")
+        self.assertTrue(closure.bytecode().isNil())
+        self.assertEqual(3, closure())
+
+        # More constants or send sites than array('H') arguments hold keep running steps too.
+        maxArg = Bytecode.maxArg
+        Bytecode.maxArg = 3
+        try:
+            closure = Closure().assemble(":a | a + 1; a + 2; a + 3; a + 4")
+        finally:
+            Bytecode.maxArg = maxArg
+        self.assertTrue(closure.bytecode().isNil())
+        self.assertEqual(9, closure(sscontext.createScope(), 5))
+
+    @skipUnless('TESTALL' in env, "disabled")
+    def test200_run(self):
+        scope = sscontext.createScope()
+        scope['num'] = 7
+        scope['tobj'] = TestSObj14()
+        scripts = ["num + 2 - 3 * 4", "num asString len", "tobj attr11: num; tobj attr11",
+                   "tobj method14: num add: 3", "num + 1 | * 2 | asString | len", "#{num 1 #{2 num}}",
+                   ":a | | t | t := a + num; [:e | t + e] value: 3", "num xyz; num + 1 | xyz | + 2",
+                   "num xyz + 2", "tobj.attr11 := 5; tobj.attr11", "'abc' len; #(1 2 3)"]
+        for ss in scripts:
+            expected = Closure().interpret(ss)(scope, 5)
+            closure = Closure().assemble(ss)
+            self.assertTrue(closure.bytecode().notNil(), ss)
+            self.assertEqual(expected, closure(scope, 5), ss)
+
+if __name__ == '__main__':
+    unittest.main()
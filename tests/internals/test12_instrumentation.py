@@ -0,0 +1,113 @@
+# coding=utf-8
+# Copyright 2024 Vital Star Foundation. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from unittest import skip, skipUnless
+from tests.TestBase import SmallScriptTest
+
+from os import environ as env
+env['TESTALL'] = '1'
+
+from smallscript.SObject import *
+from smallscript.Closure import Closure, Instrumentation, SamplingProfiler
+from tests.TestSObj14 import TestSObj14
+
+class Test_Instrumentation(SmallScriptTest):
+    #### Hooks on closure enter/exit, interpreted steps and sends, and the sampling profiler built on them.
+
+    @classmethod
+    def setUpClass(cls):
+        pkg = sscontext.loadPackage('tests')
+
+    def setUp(self):
+        self.scope = sscontext.createScope()
+        self.scope['num'] = 7
+        self.scope['tobj'] = TestSObj14()
+
+    @skipUnless('TESTALL' in env, "disabled")
+    def test100_hooks(self):
+        events = List()
+        def onEnter(closure, scope, params): events.append(('enter', closure.smallscript()))
+        def onExit(closure, res, seconds): events.append(('exit', res))
+        def onStep(closure, step, res): events.append(('step', step.ruleName(), res))
+        def onSend(receiver, selector, seconds): events.append(('send', receiver, selector))
+        hooks = (('enter', onEnter), ('exit', onExit), ('step', onStep), ('send', onSend))
+        instrumentation = sscontext.instrumentation()
+        for event, hook in hooks: instrumentation.addHook(event, hook)
+        try:
+            self.assertEqual({instrumentation}, Instrumentation.active)
+            self.assertEqual(18, Closure().interpret("num + 2 | * 2")(self.scope))
+            self.assertEqual([('enter', "num + 2 | * 2"), ('step', 'var', 7), ('send', 'Integer', '+'),
+                              ('step', 'binhead', 9), ('send', 'Integer', '*'), ('step', 'chain', 18), ('exit', 18)],
+                             [event for event in events if event[1] != 'ref'])
+
+            events.clear()      # bytecode closures run their steps to call the step hooks
+            self.assertEqual(5, Closure().assemble("tobj method14: num add: -2")(self.scope))
+            self.assertTrue(('send', 'TestSObj15', 'method14__add__') in events)
+
+            events.clear()      # compiled closures only call enter and exit hooks
+            self.assertEqual(14, Closure().compile("num * 2")(self.scope))
+            self.assertEqual([('enter', "num * 2"), ('exit', 14)], events)
+        finally:
+            for event, hook in hooks: instrumentation.removeHook(event, hook)
+        self.assertEqual(set(), Instrumentation.active)
+        events.clear()
+        Closure().interpret("num + 2")(self.scope)
+        self.assertEqual([], events)
+
+    @skipUnless('TESTALL' in env, "disabled")
+    def test200_sampling_profiler(self):
+        closure = Closure().interpret("num + 2 | asString len")
+        profiler = SamplingProfiler().rate(2).start()
+        try:
+            for i in range(10): closure(self.scope)
+        finally:
+            profiler.stop()
+        self.assertEqual(set(), Instrumentation.active)
+        selectors = profiler.selectors()
+        self.assertEqual({'Integer>>+', 'Integer>>asString', 'String>>len'}, set(selectors.keys()))
+        self.assertEqual(30, sum(record[0] for record in selectors.values()))      # sampled and scaled
+        self.assertEqual(["closure 'num + 2 | asString len'"], list(profiler.closures().keys()))
+        report = profiler.report(2)
+        self.assertEqual(5, report.len())
+        self.assertTrue(report[0].startswith('selector') and report[3].startswith('closure'))
+
+    @skipUnless('TESTALL' in env, "disabled")
+    def test300_contexts(self):
+        # Hooks see the closures of their own context, removing the hooks of a context leaves the others active.
+        other = Context().name('test300_contexts')
+        other.loadPackage('smallscript')
+        events = List()
+        def onEnter(closure, scope, params): events.append(('sscontext', closure.smallscript()))
+        def onOtherEnter(closure, scope, params): events.append(('other', closure.smallscript()))
+        sscontext.instrumentation().addHook('enter', onEnter)
+        try:
+            other.instrumentation().addHook('enter', onOtherEnter)
+            self.assertEqual(2, len(Instrumentation.active))
+            Closure().interpret("num + 2")(self.scope)
+            other.newInstance('Closure').interpret("num + 3")(self.scope)
+            self.assertEqual([('sscontext', "num + 2"), ('other', "num + 3")], events)
+
+            other.instrumentation().removeHook('enter', onOtherEnter)
+            events.clear()
+            Closure().interpret("num + 4")(self.scope)
+            other.newInstance('Closure').interpret("num + 5")(self.scope)
+            self.assertEqual([('sscontext', "num + 4")], events)
+        finally:
+            sscontext.instrumentation().removeHook('enter', onEnter)
+        self.assertEqual(set(), Instrumentation.active)
+
+if __name__ == '__main__':
+    unittest.main()